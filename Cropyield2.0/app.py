@@ -1,121 +1,250 @@
-from flask import Flask, render_template, request, jsonify, session, send_file, redirect
-import pandas as pd
-import numpy as np
+from flask import Blueprint, Flask, Response, current_app, g, render_template, request, jsonify, session, redirect, stream_with_context
 import os
 import json
-from sklearn.model_selection import train_test_split
-from sklearn.preprocessing import LabelEncoder
-from sklearn.linear_model import LinearRegression
-from sklearn.ensemble import RandomForestRegressor, GradientBoostingRegressor
-from sklearn.metrics import r2_score, mean_absolute_error, mean_squared_error
-from xgboost import XGBRegressor
-from lightgbm import LGBMRegressor
-from catboost import CatBoostRegressor
-import joblib
-from database import db
+import time
+from database import db, prediction_writer
+from model_registry import ModelRegistry, model_slug, parse_compress
+from cache import ChartCache, LRUCache
+from jobs import JobManager, JobCancelled, JobConflict
+from serving import MicroBatcher, Overloaded, WorkPool, pool_collector
+from schema import FORM_FIELDS, CATEGORICAL_COLUMNS, MODEL_NAMES
 from functools import wraps
+import metrics
 import io
+import csv
 import base64
-import matplotlib
-matplotlib.use('Agg')
-import matplotlib.pyplot as plt
-import seaborn as sns
+import itertools
+import shutil
+import tempfile
+import threading
+import hashlib
 
-app = Flask(__name__)
-app.secret_key = 'your-secret-key-change-this-in-production'
+# pandas, the model libraries, matplotlib and the dataset itself are only
+# imported/loaded inside the views that need them (see dataset.py,
+# inference.py, training.py, charts.py). Workers serving only the auth and
+# history routes never pay for them.
 
-DATASET_PATH = "crop_yield_dataset.csv"
-MODELS_PATH = "trained_models.pkl"
+MODELS_PATH = "trained_models"
+STREAM_CHUNK_ROWS = 50000
+HISTORY_PAGE_SIZE = 50
+CHART_CACHE_DIR = os.environ.get("CHART_CACHE_DIR", "chart_cache")
+EDA_CHARTS = ["crop_yield", "soil_yield", "correlation"]
+# "compiled" scores small batches with the NumPy export of the ensemble
+# (compiled_ensemble.py) instead of each library's predict()
+INFERENCE_BACKEND = os.environ.get("INFERENCE_BACKEND", "native")
+# Comma-separated model names this worker predicts with (default: all).
+# Models are loaded on first use, so the others are never read from disk.
+SERVED_MODELS = [name.strip() for name in os.environ.get("SERVED_MODELS", "").split(",") if name.strip()]
+# CPU-bound work runs on bounded pools (serving.py). INFERENCE_WORKERS threads
+# score predictions; single /predict calls arriving within
+# PREDICT_BATCH_WAIT_MS of each other share one call per model. Charts render
+# in CHART_WORKERS processes (0 renders in the request thread). Past the
+# queue limits requests get a 429, and after QUEUE_TIMEOUT seconds queued a 503.
+INFERENCE_WORKERS = int(os.environ.get("INFERENCE_WORKERS", "2"))
+INFERENCE_QUEUE = int(os.environ.get("INFERENCE_QUEUE", "256"))
+PREDICT_BATCH_MAX = int(os.environ.get("PREDICT_BATCH_MAX", "64"))
+PREDICT_BATCH_WAIT_MS = float(os.environ.get("PREDICT_BATCH_WAIT_MS", "2"))
+CHART_WORKERS = int(os.environ.get("CHART_WORKERS", "1"))
+CHART_QUEUE = int(os.environ.get("CHART_QUEUE", "16"))
+QUEUE_TIMEOUT = float(os.environ.get("QUEUE_TIMEOUT", "10"))
+
+registry = ModelRegistry(
+    MODELS_PATH,
+    compress=parse_compress(os.environ.get("MODEL_COMPRESS")),
+    mmap=os.environ.get("MODEL_MMAP") == "1",
+    legacy_path="trained_models.pkl"
+)
+jobs = JobManager("training_jobs", f"{MODELS_PATH}.lock")
+chart_cache = ChartCache(maxsize=64, directory=CHART_CACHE_DIR or None)
+prediction_cache = LRUCache(maxsize=4096, ttl=600)
+_render_lock = threading.Lock()
+metrics.registry.register_collector(metrics.cache_collector('prediction', prediction_cache))
+metrics.registry.register_collector(metrics.cache_collector('chart', chart_cache))
+
+def load_dataset():
+    from dataset import load_dataset
+    return load_dataset()
+
+def normalize_inputs(data):
+    """Canonical form of a /predict request, used as the memoization key"""
+    params = {}
+    for field, column in FORM_FIELDS.items():
+        if column in CATEGORICAL_COLUMNS:
+            params[field] = str(data[field]).strip()
+        else:
+            params[field] = float(data[field])
+    return params
+
+def prediction_token(params, model_version):
+    key = json.dumps([model_version, [params[field] for field in FORM_FIELDS]])
+    return hashlib.sha1(key.encode()).hexdigest()
 
 # =====================================================
-# DATASET GENERATION
+# MODEL TRAINING
 # =====================================================
-def generate_dataset(n=500):
-    np.random.seed(42)
-    data = pd.DataFrame({
-        "Farm_Area": np.random.uniform(1, 50, n),
-        "Fertilizer_Used": np.random.uniform(50, 500, n),
-        "Pesticide_Used": np.random.uniform(5, 50, n),
-        "Water_Usage": np.random.uniform(1000, 10000, n),
-        "Crop_Type": np.random.choice(["Wheat", "Rice", "Cotton"], n),
-        "Irrigation_Type": np.random.choice(["Drip", "Manual", "Flood"], n),
-        "Soil_Type": np.random.choice(["Loamy", "Sandy", "Clay"], n),
-        "Season": np.random.choice(["Kharif", "Rabi", "Zaid"], n)
-    })
+def train_models(test_size=0.2, parallel=True, progress=None, should_stop=None, incremental=False,
+                 tuning=None):
+    """Train the models and publish them; returns the new ModelSnapshot.
+
+    With `incremental`, rows appended to the dataset since the last run are
+    folded into the current models where possible (see training.retrain).
+    With `tuning` (keyword arguments for tuning.tune), settings are searched
+    first and the models refitted with the best ones.
+    """
+    from training import recorded_params, retrain
     
-    base = (
-        0.1 * data["Farm_Area"]
-        + 0.015 * data["Fertilizer_Used"]
-        + 0.0005 * data["Water_Usage"]
-        - 0.05 * data["Pesticide_Used"]
-    )
+    # Settings found by an earlier search carry over to later refits
+    previous = registry.get()
+    data = load_dataset()
+    params, search = None, None
+    if tuning is not None:
+        from tuning import tune
+        search = tune(data, test_size=test_size, parallel=parallel, progress=progress,
+                      should_stop=should_stop, **tuning)
+        params = recorded_params(previous)
+        params.update({name: result['params'] for name, result in search.items()})
     
-    data["Yield"] = (
-        base
-        + data["Crop_Type"].map({"Wheat": 2.5, "Rice": 3.0, "Cotton": 2.0})
-        + data["Irrigation_Type"].map({"Drip": 1.5, "Manual": 1.0, "Flood": 0.8})
-        + data["Soil_Type"].map({"Loamy": 1.4, "Clay": 1.1, "Sandy": 0.9})
-        + np.random.normal(0, 1, n)
+    artifact = retrain(
+        data, previous, test_size, incremental=incremental, parallel=parallel,
+        progress=progress, should_stop=should_stop, params=params
     )
+    if artifact is None:
+        # Nothing was appended since the last run
+        return previous
+    if search is not None:
+        artifact['training'].update(reason='hyperparameter search', tuning=search)
     
-    data.to_csv(DATASET_PATH, index=False)
-    return data
-
-# Load dataset
-if not os.path.exists(DATASET_PATH):
-    df = generate_dataset()
-else:
-    df = pd.read_csv(DATASET_PATH)
-
-df_raw = df.copy()
-for col in ["Farm_Area", "Fertilizer_Used", "Pesticide_Used", "Water_Usage", "Yield"]:
-    df_raw[col] = pd.to_numeric(df_raw[col], errors="coerce")
-df_raw.dropna(inplace=True)
-
-# Encoding
-encoders = {}
-for col in ["Crop_Type", "Irrigation_Type", "Soil_Type", "Season"]:
-    le = LabelEncoder()
-    df[col] = le.fit_transform(df[col])
-    encoders[col] = le
-
-X = df.drop("Yield", axis=1)
-y = df["Yield"]
+    # Save models and swap them into the in-memory registry
+    return registry.publish(artifact)
 
-# =====================================================
-# MODEL TRAINING
-# =====================================================
-def train_models(test_size=0.2):
-    X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=test_size, random_state=42)
+def inference_engine(snapshot):
+    """The compiled engine for `snapshot` if that backend is enabled, else None"""
+    # The engine covers the whole ensemble, so it's off when serving a subset
+    if INFERENCE_BACKEND != 'compiled' or SERVED_MODELS:
+        return None
+    return snapshot.compiled()
+
+def served_results(snapshot):
+    """The models this worker predicts with"""
+    if not SERVED_MODELS:
+        return snapshot.results
+    return {name: snapshot.results[name] for name in SERVED_MODELS if name in snapshot.results}
+
+def score_predictions(snapshot, rows):
+    """Score a micro-batch of normalized /predict inputs with one call per model"""
+    import pandas as pd
+    from inference import encode_features, predict_frame
     
-    models = {
-        "Linear Regression": LinearRegression(),
-        "Random Forest": RandomForestRegressor(n_estimators=100, random_state=42),
-        "Gradient Boosting": GradientBoostingRegressor(random_state=42),
-        "XGBoost": XGBRegressor(n_estimators=100, learning_rate=0.1, max_depth=5, random_state=42),
-        "LightGBM": LGBMRegressor(n_estimators=100, learning_rate=0.1, random_state=42),
-        "CatBoost": CatBoostRegressor(iterations=100, learning_rate=0.1, depth=5, verbose=False, random_state=42)
-    }
+    frame = pd.DataFrame([{column: params[field] for field, column in FORM_FIELDS.items()} for params in rows])
+    try:
+        features = encode_features(frame, load_dataset(), snapshot.classes)
+    except ValueError as e:
+        if len(rows) == 1:
+            return [e]
+        # A bad row (e.g. an unknown category) only fails its own request
+        return [score_predictions(snapshot, [params])[0] for params in rows]
+    batch = predict_frame(served_results(snapshot), features, inference_engine(snapshot))
+    return [{name: float(values[i]) for name, values in batch.items()} for i in range(len(rows))]
+
+def score_frame(snapshot, frame):
+    """Encode and score a /predict-batch upload; returns (rows, predictions)"""
+    from inference import encode_features, predict_frame
     
-    results = {}
-    for name, model in models.items():
-        model.fit(X_train, y_train)
-        preds = model.predict(X_test)
-        results[name] = {
-            "model": model,
-            "r2": float(r2_score(y_test, preds)),
-            "mae": float(mean_absolute_error(y_test, preds)),
-            "rmse": float(np.sqrt(mean_squared_error(y_test, preds)))
-        }
+    features = encode_features(frame, load_dataset(), snapshot.classes)
+    return len(features), predict_frame(served_results(snapshot), features, inference_engine(snapshot))
+
+def score_sweep(snapshot, base, axes, mode):
+    """A /what-if surface; returns (source, {model: array shaped like the axes})"""
+    from whatif import what_if
+    
+    return what_if(snapshot, served_results(snapshot), load_dataset(), base, axes, mode,
+                   inference_engine(snapshot))
+
+inference_pool = WorkPool('inference', INFERENCE_WORKERS, INFERENCE_QUEUE, QUEUE_TIMEOUT)
+predict_batcher = MicroBatcher('predict', score_predictions, INFERENCE_WORKERS, PREDICT_BATCH_MAX,
+                               PREDICT_BATCH_WAIT_MS / 1000, INFERENCE_QUEUE, QUEUE_TIMEOUT)
+chart_pool = WorkPool('charts', CHART_WORKERS, CHART_QUEUE, QUEUE_TIMEOUT, processes=True, niceness=10)
+metrics.registry.register_collector(pool_collector(inference_pool, predict_batcher, chart_pool))
+
+def encode_cursor(key):
+    """Opaque page token for a (created_at, id) history key"""
+    if key is None:
+        return None
+    return base64.urlsafe_b64encode(json.dumps(key).encode()).decode()
+
+def decode_cursor(token):
+    if not token:
+        return None
+    try:
+        created_at, row_id = json.loads(base64.urlsafe_b64decode(token.encode()))
+        return (str(created_at), int(row_id))
+    except Exception:
+        raise ValueError('Invalid cursor')
+
+def model_metrics(results):
+    """Strip the fitted estimators so results can be serialized to JSON"""
+    return {
+        name: {key: value for key, value in info.items() if key != 'model'}
+        for name, info in results.items()
+    }
+
+def run_training_job(job, test_size, incremental=False, tuning=None):
+    from model_registry import training_summary
     
-    # Save models
-    joblib.dump({
-        'results': results,
-        'X_test': X_test,
-        'y_test': y_test
-    }, MODELS_PATH)
+    def progress(name, status, info=None):
+        update = {'status': status}
+        if info:
+            update.update(model_metrics({name: info})[name])
+        jobs.update(job, name, **update)
     
-    return results, X_test, y_test
+    kind = job.kind
+    previous = registry.get()
+    start = time.perf_counter()
+    try:
+        snapshot = train_models(
+            test_size,
+            progress=progress,
+            should_stop=lambda: jobs.check_cancelled(job),
+            incremental=incremental,
+            tuning=tuning
+        )
+    except JobCancelled:
+        metrics.inc('crop_training_runs_total', kind=kind, outcome='cancelled')
+        raise
+    except Exception:
+        metrics.inc('crop_training_runs_total', kind=kind, outcome='failed')
+        raise
+    job.info = training_summary(snapshot.training) or {}
+    scores = model_metrics(snapshot.results)
+    if snapshot is previous:
+        job.info = dict(job.info, mode='unchanged', reason='no new rows')
+        for name, info in scores.items():
+            jobs.update(job, name, status='done', **info)
+    else:
+        for name, info in scores.items():
+            if 'fit_seconds' in info:
+                metrics.observe('crop_model_fit_seconds', info['fit_seconds'], model=name,
+                                update=info.get('update', 'refit'))
+    for name, result in (job.info.get('tuning') or {}).items():
+        metrics.inc('crop_tuning_cpu_seconds_total', result['compute_seconds'], model=name)
+    metrics.inc('crop_training_runs_total', kind=kind, outcome=job.info.get('mode', 'full'))
+    metrics.observe('crop_training_seconds', time.perf_counter() - start, kind=kind)
+    return scores
+
+def overloaded(e):
+    """429/503 response for work refused by a saturated pool"""
+    response = jsonify({'success': False, 'message': str(e)})
+    response.status_code = e.status
+    response.headers['Retry-After'] = str(e.retry_after)
+    return response
+
+def server_error(e):
+    """500 response for an unexpected exception, logged and counted by type"""
+    if isinstance(e, Overloaded):
+        return overloaded(e)
+    current_app.logger.exception('Unhandled error in %s', request.endpoint)
+    metrics.inc('crop_errors_total', endpoint=request.endpoint, error=type(e).__name__)
+    return jsonify({'success': False, 'message': str(e)}), 500
 
 # =====================================================
 # DECORATORS
@@ -131,23 +260,43 @@ def login_required(f):
 # =====================================================
 # ROUTES
 # =====================================================
-@app.route('/')
+# Routes are grouped into blueprints so a deployment can run, say, the
+# auth/history routes in small workers and inference in separate ones.
+auth_bp = Blueprint('auth', __name__)
+history_bp = Blueprint('history', __name__)
+data_bp = Blueprint('data', __name__)
+inference_bp = Blueprint('inference', __name__)
+training_bp = Blueprint('training', __name__)
+charts_bp = Blueprint('charts', __name__)
+# Registered in every worker, whatever groups it serves
+metrics_bp = Blueprint('metrics', __name__)
+
+ROUTE_GROUPS = {
+    'auth': auth_bp,
+    'history': history_bp,
+    'data': data_bp,
+    'inference': inference_bp,
+    'training': training_bp,
+    'charts': charts_bp
+}
+
+@auth_bp.route('/')
 def index():
     return render_template('landing.html')
 
-@app.route('/auth')
+@auth_bp.route('/auth')
 def auth():
     if 'user_id' in session:
         return render_template('dashboard.html', username=session.get('username'))
     return render_template('login.html')
 
-@app.route('/dashboard')
+@auth_bp.route('/dashboard')
 def dashboard():
     if 'user_id' not in session:
         return redirect('/')
     return render_template('dashboard.html', username=session.get('username'))
 
-@app.route('/login', methods=['POST'])
+@auth_bp.route('/login', methods=['POST'])
 def login():
     data = request.json
     username = data.get('username')
@@ -160,7 +309,7 @@ def login():
         return jsonify({'success': True, 'username': username})
     return jsonify({'success': False, 'message': 'Invalid credentials'}), 401
 
-@app.route('/register', methods=['POST'])
+@auth_bp.route('/register', methods=['POST'])
 def register():
     data = request.json
     username = data.get('username')
@@ -173,202 +322,516 @@ def register():
     success, message = db.register_user(username, password, email)
     return jsonify({'success': success, 'message': message})
 
-@app.route('/logout')
+@auth_bp.route('/logout')
 def logout():
     session.clear()
     return jsonify({'success': True})
 
-@app.route('/train-models', methods=['POST'])
+@training_bp.route('/train-models', methods=['POST'])
 @login_required
 def train_models_route():
-    data = request.json
+    data = request.json or {}
     test_size = data.get('test_size', 0.2)
+    incremental = bool(data.get('incremental', False))
     
     try:
-        results, X_test, y_test = train_models(test_size)
-        
-        # Convert models to serializable format
-        eval_data = {
-            name: {'r2': info['r2'], 'mae': info['mae'], 'rmse': info['rmse']}
-            for name, info in results.items()
+        job = jobs.submit(
+            'update' if incremental else 'train', MODEL_NAMES,
+            lambda job: run_training_job(job, test_size, incremental)
+        )
+        return jsonify({'success': True, 'job_id': job.id, 'status': job.to_dict()}), 202
+    except JobConflict as e:
+        return jsonify({'success': False, 'message': str(e), 'job_id': e.job_id}), 409
+    except Exception as e:
+        return server_error(e)
+
+@training_bp.route('/tune-models', methods=['POST'])
+@login_required
+def tune_models_route():
+    from tuning import TUNABLE_MODELS
+    
+    data = request.json or {}
+    test_size = data.get('test_size', 0.2)
+    try:
+        names = data.get('models') or TUNABLE_MODELS
+        unknown = [name for name in names if name not in TUNABLE_MODELS]
+        if unknown:
+            raise ValueError(f"Cannot tune: {', '.join(map(str, unknown))}")
+        tuning = {
+            'names': names,
+            'candidates': int(data.get('candidates', 8)),
+            'folds': int(data.get('folds', 3)),
+            'eta': int(data.get('eta', 3))
         }
+        if not 1 <= tuning['candidates'] <= 64 or not 2 <= tuning['folds'] <= 10 or tuning['eta'] < 2:
+            raise ValueError('candidates must be 1-64, folds 2-10 and eta at least 2')
+    except (TypeError, ValueError) as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+    
+    try:
+        job = jobs.submit('tune', MODEL_NAMES, lambda job: run_training_job(job, test_size, tuning=tuning))
+        return jsonify({'success': True, 'job_id': job.id, 'status': job.to_dict()}), 202
+    except JobConflict as e:
+        return jsonify({'success': False, 'message': str(e), 'job_id': e.job_id}), 409
+    except Exception as e:
+        return server_error(e)
+
+@training_bp.route('/train-status/<job_id>')
+@login_required
+def train_status(job_id):
+    state = jobs.get(job_id)
+    if state is None:
+        return jsonify({'success': False, 'message': 'Unknown job'}), 404
+    return jsonify({'success': True, 'status': state})
+
+@training_bp.route('/train-cancel/<job_id>', methods=['POST'])
+@login_required
+def train_cancel(job_id):
+    state = jobs.cancel(job_id)
+    if state is None:
+        return jsonify({'success': False, 'message': 'Unknown job'}), 404
+    return jsonify({'success': True, 'status': state})
+
+@inference_bp.route('/model-status')
+@login_required
+def model_status():
+    return jsonify({
+        'success': True,
+        'status': registry.status(),
+        'backend': INFERENCE_BACKEND,
+        'served_models': SERVED_MODELS or None,
+        'prediction_cache': prediction_cache.stats(),
+        'pools': {pool.name: pool.stats() for pool in (inference_pool, predict_batcher, chart_pool)}
+    })
+
+@inference_bp.route('/predict', methods=['POST'])
+@login_required
+def predict():
+    try:
+        with metrics.span('json_parse'):
+            data = request.json
+        
+        # Load models
+        snapshot = registry.get()
+        if snapshot is None:
+            return jsonify({'success': False, 'message': 'Models not trained yet'}), 400
+        
+        # Results are memoized per (inputs, model version), so saving a
+        # prediction the user has already seen commits the cached numbers
+        # instead of running all six models again
+        if all(field in data for field in FORM_FIELDS):
+            params = normalize_inputs(data)
+            token = prediction_token(params, snapshot.tag)
+        else:
+            params = None
+            token = data.get('prediction_token')
+        
+        cached = prediction_cache.get(token)
+        if cached is None and params is None:
+            return jsonify({'success': False, 'message': 'Prediction expired, please predict again'}), 400
+        if cached is None:
+            # Scored together with any other /predict calls arriving meanwhile
+            cached = {
+                'token': token,
+                'params': params,
+                'predictions': predict_batcher.submit(snapshot, params)
+            }
+            prediction_cache.put(token, cached)
+        
+        # Save to database if requested
+        if data.get('save', False):
+            prediction_writer.submit(session['user_id'], cached['params'], cached['predictions'])
         
         return jsonify({
             'success': True,
-            'results': eval_data
+            'predictions': cached['predictions'],
+            'prediction_token': cached['token']
         })
+    except ValueError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
     except Exception as e:
-        return jsonify({'success': False, 'message': str(e)}), 500
+        return server_error(e)
 
-@app.route('/predict', methods=['POST'])
+@inference_bp.route('/predict-batch', methods=['POST'])
 @login_required
-def predict():
+def predict_batch():
+    import pandas as pd
+    
     try:
-        data = request.json
-        
-        # Load models
-        if not os.path.exists(MODELS_PATH):
+        snapshot = registry.get()
+        if snapshot is None:
             return jsonify({'success': False, 'message': 'Models not trained yet'}), 400
         
-        saved_data = joblib.load(MODELS_PATH)
-        results = saved_data['results']
+        with metrics.span('json_parse'):
+            if 'file' in request.files:
+                frame = pd.read_csv(request.files['file'])
+            else:
+                rows = request.get_json(silent=True)
+                if not isinstance(rows, list):
+                    return jsonify({'success': False, 'message': 'Expected a JSON array or a CSV file upload'}), 400
+                frame = pd.DataFrame(rows)
         
-        # Prepare input
-        input_df = pd.DataFrame([{
-            "Farm_Area": float(data['farm_area']),
-            "Fertilizer_Used": float(data['fertilizer']),
-            "Pesticide_Used": float(data['pesticide']),
-            "Water_Usage": float(data['water']),
-            "Crop_Type": encoders["Crop_Type"].transform([data['crop']])[0],
-            "Irrigation_Type": encoders["Irrigation_Type"].transform([data['irrigation']])[0],
-            "Soil_Type": encoders["Soil_Type"].transform([data['soil']])[0],
-            "Season": encoders["Season"].transform([data['season']])[0]
-        }])
+        if frame.empty:
+            return jsonify({'success': False, 'message': 'No rows to score'}), 400
         
-        input_df = input_df[X.columns].astype(X.dtypes)
+        start = time.perf_counter()
+        rows, predictions = inference_pool.run(score_frame, snapshot, frame)
+        elapsed = time.perf_counter() - start
         
-        # Make predictions
-        predictions = {}
-        for name, info in results.items():
-            pred = info['model'].predict(input_df)
-            predictions[name] = float(pred[0])
+        return jsonify({
+            'success': True,
+            'rows': rows,
+            'predictions': {name: values.tolist() for name, values in predictions.items()},
+            'elapsed_seconds': round(elapsed, 4),
+            'rows_per_sec': round(rows / elapsed, 1) if elapsed > 0 else None
+        })
+    except ValueError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+    except Exception as e:
+        return server_error(e)
+
+@inference_bp.route('/what-if', methods=['POST'])
+@login_required
+def what_if_route():
+    """Predictions over one or two numeric inputs, the others held at `base`.
+    
+    Body: {"base": {...form fields...}, "axes": [{"field": "fertilizer",
+    "min": 50, "max": 500, "steps": 100}, ...], "mode": "grid" | "exact"}
+    """
+    from whatif import parse_axes
+    
+    try:
+        snapshot = registry.get()
+        if snapshot is None:
+            return jsonify({'success': False, 'message': 'Models not trained yet'}), 400
         
-        avg_pred = np.mean(list(predictions.values()))
-        predictions['average'] = float(avg_pred)
+        data = request.get_json(silent=True) or {}
+        mode = data.get('mode', 'grid')
+        if mode not in ('grid', 'exact'):
+            return jsonify({'success': False, 'message': 'mode must be "grid" or "exact"'}), 400
+        try:
+            base = normalize_inputs(data.get('base') or {})
+        except KeyError as e:
+            return jsonify({'success': False, 'message': f'Missing field: {e.args[0]}'}), 400
+        except TypeError:
+            return jsonify({'success': False, 'message': 'base must be an object of form fields'}), 400
+        axes = parse_axes(data.get('axes'))
         
-        # Save to database if requested
-        if data.get('save', False):
-            db.save_prediction(
-                session['user_id'],
-                {
-                    'farm_area': data['farm_area'],
-                    'fertilizer': data['fertilizer'],
-                    'pesticide': data['pesticide'],
-                    'water': data['water'],
-                    'crop': data['crop'],
-                    'irrigation': data['irrigation'],
-                    'soil': data['soil'],
-                    'season': data['season']
-                },
-                predictions
-            )
+        start = time.perf_counter()
+        source, surface = inference_pool.run(score_sweep, snapshot, base, axes, mode)
+        elapsed = time.perf_counter() - start
+        metrics.inc('crop_whatif_total', source=source)
         
         return jsonify({
             'success': True,
-            'predictions': predictions
+            'source': source,
+            'axes': [{'field': field, 'values': values.tolist()} for field, values in axes],
+            'surface': {name: values.tolist() for name, values in surface.items()},
+            'points': int(surface['average'].size),
+            'elapsed_seconds': round(elapsed, 4)
         })
+    except ValueError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
     except Exception as e:
-        return jsonify({'success': False, 'message': str(e)}), 500
+        return server_error(e)
+
+@inference_bp.route('/predict-stream', methods=['POST'])
+@login_required
+def predict_stream():
+    import pandas as pd
+    from inference import score_chunks
+    
+    snapshot = registry.get()
+    if snapshot is None:
+        return jsonify({'success': False, 'message': 'Models not trained yet'}), 400
+    
+    fmt = request.args.get('format', 'csv')
+    if fmt not in ('csv', 'ndjson'):
+        return jsonify({'success': False, 'message': 'format must be csv or ndjson'}), 400
+    chunk_rows = request.args.get('chunk_size', STREAM_CHUNK_ROWS, type=int)
+    
+    # A raw text/csv body is read straight from the socket. Uploaded files are
+    # copied to a temp file we own, because Flask closes request.files once
+    # the view returns, before the streamed response is consumed.
+    if 'file' in request.files:
+        source = tempfile.TemporaryFile()
+        shutil.copyfileobj(request.files['file'].stream, source)
+        source.seek(0)
+    else:
+        source = request.stream
+    
+    # Read and score the first chunk eagerly so empty or malformed input and
+    # schema errors still get a 400 (pandas' parser errors are ValueErrors)
+    try:
+        try:
+            reader = pd.read_csv(source, chunksize=max(1, chunk_rows))
+            first = next(reader, None)
+        except pd.errors.EmptyDataError:
+            first = None
+        if first is None:
+            source.close()
+            return jsonify({'success': False, 'message': 'No rows to score'}), 400
+        scored = score_chunks(served_results(snapshot), load_dataset(), itertools.chain([first], reader), fmt,
+                              inference_engine(snapshot), snapshot.classes)
+        # Each chunk is scored on the inference pool; only the first one
+        # can still be turned away
+        first_out = inference_pool.run(next, scored)
+    except ValueError as e:
+        source.close()
+        return jsonify({'success': False, 'message': str(e)}), 400
+    except Overloaded as e:
+        source.close()
+        return overloaded(e)
+    except BaseException:
+        source.close()
+        raise
+    
+    def generate():
+        try:
+            yield first_out
+            while (text := inference_pool.run(next, scored, None, admit=False)) is not None:
+                yield text
+        finally:
+            source.close()
+    
+    mimetype = 'application/x-ndjson' if fmt == 'ndjson' else 'text/csv'
+    return Response(stream_with_context(generate()), mimetype=mimetype)
 
-@app.route('/get-predictions')
+@history_bp.route('/get-predictions')
 @login_required
 def get_predictions():
-    history = db.get_user_predictions(session['user_id'])
-    return jsonify({'success': True, 'predictions': history})
+    prediction_writer.flush()
+    limit = min(max(request.args.get('limit', HISTORY_PAGE_SIZE, type=int), 1), 500)
+    try:
+        after = decode_cursor(request.args.get('cursor'))
+    except ValueError:
+        return jsonify({'success': False, 'message': 'Invalid cursor'}), 400
+    
+    history, next_key = db.get_user_predictions_page(session['user_id'], limit, after)
+    return jsonify({
+        'success': True,
+        'predictions': history,
+        'next_cursor': encode_cursor(next_key)
+    })
 
-@app.route('/get-dataset')
+@history_bp.route('/download-predictions')
+@login_required
+def download_predictions():
+    prediction_writer.flush()
+    user_id = session['user_id']
+    if not db.get_user_predictions_page(user_id, limit=1)[0]:
+        return jsonify({'success': False, 'message': 'No predictions found'}), 404
+    
+    def generate():
+        # Rows go from SQLite to the socket one keyset page at a time
+        buf = io.StringIO()
+        writer = csv.writer(buf)
+        batches = db.iter_user_predictions(user_id)
+        writer.writerow(next(batches))
+        for batch in batches:
+            writer.writerows(batch)
+            yield buf.getvalue()
+            buf.seek(0)
+            buf.truncate()
+    
+    return Response(
+        stream_with_context(generate()),
+        mimetype='text/csv',
+        headers={'Content-Disposition': f'attachment; filename={session["username"]}_predictions.csv'}
+    )
+
+@data_bp.route('/get-dataset')
 def get_dataset():
-    data = df_raw.head(100).to_dict('records')
+    data = load_dataset().df_raw.head(100).to_dict('records')
     return jsonify({'success': True, 'data': data})
 
-@app.route('/download-dataset')
+@data_bp.route('/dataset/query')
+def query_dataset():
+    from dataset_query import dataset_query, parse_query
+    query = dataset_query(load_dataset())
+    try:
+        spec = parse_query(request.args, query.columns)
+    except ValueError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+    return jsonify({'success': True, **query.run(spec)})
+
+@data_bp.route('/download-dataset')
 def download_dataset():
-    return send_file(
-        DATASET_PATH,
+    # Exported from the column store, so appended rows are included
+    return Response(
+        stream_with_context(load_dataset().iter_csv()),
         mimetype='text/csv',
-        as_attachment=True,
-        download_name='crop_yield_dataset.csv'
+        headers={'Content-Disposition': 'attachment; filename=crop_yield_dataset.csv'}
     )
 
-@app.route('/download-predictions')
-@login_required
-def download_predictions():
-    history = db.get_user_predictions(session['user_id'])
-    if history:
-        df = pd.DataFrame(history)
-        output = io.BytesIO()
-        df.to_csv(output, index=False)
-        output.seek(0)
-        return send_file(
-            output,
-            mimetype='text/csv',
-            as_attachment=True,
-            download_name=f'{session["username"]}_predictions.csv'
-        )
-    return jsonify({'success': False, 'message': 'No predictions found'}), 404
-
-@app.route('/get-evaluation-charts')
+@charts_bp.route('/get-evaluation-charts')
 @login_required
 def get_evaluation_charts():
     try:
-        if not os.path.exists(MODELS_PATH):
+        snapshot = registry.get()
+        if snapshot is None:
             return jsonify({'success': False, 'message': 'Models not trained yet'}), 400
         
-        saved_data = joblib.load(MODELS_PATH)
-        results = saved_data['results']
-        X_test = saved_data['X_test']
-        y_test = saved_data['y_test']
-        
-        charts = {}
-        for name, info in results.items():
-            model = info['model']
-            y_pred = model.predict(X_test)
-            r2 = info['r2']
-            
-            fig, ax = plt.subplots(figsize=(6, 6))
-            ax.scatter(y_test, y_pred, alpha=0.6, s=50, color='steelblue')
-            ax.plot([y_test.min(), y_test.max()], [y_test.min(), y_test.max()], "r--", lw=2)
-            ax.set_xlabel("Actual Yield")
-            ax.set_ylabel("Predicted Yield")
-            ax.set_title(f"{name} - R²={r2:.3f}")
-            
-            charts[name] = fig_to_base64(fig)
-            plt.close(fig)
-        
+        charts = {
+            name: f'/charts/eval/{model_slug(name)}.png?v={snapshot.tag}'
+            for name in snapshot.results
+        }
         return jsonify({'success': True, 'charts': charts})
     except Exception as e:
-        return jsonify({'success': False, 'message': str(e)}), 500
+        return server_error(e)
 
 # NEW SEPARATE ROUTE FOR EDA
-@app.route('/get-charts')
+@charts_bp.route('/get-charts')
 @login_required
 def get_eda_charts():
-    try:
-        charts = {}
-        # Chart 1: Crop Type vs Yield
-        fig, ax = plt.subplots(figsize=(8, 5))
-        sns.barplot(data=df_raw, x="Crop_Type", y="Yield", ax=ax)
-        ax.set_title("Yield by Crop Type")
-        charts['crop_yield'] = fig_to_base64(fig)
-        plt.close(fig)
-        
-        # Chart 2: Soil Type vs Yield
-        fig, ax = plt.subplots(figsize=(8, 5))
-        sns.boxplot(data=df_raw, x="Soil_Type", y="Yield", ax=ax)
-        ax.set_title("Yield Distribution by Soil Type")
-        charts['soil_yield'] = fig_to_base64(fig)
-        plt.close(fig)
-        
-        # Chart 3: Correlation Heatmap
-        fig, ax = plt.subplots(figsize=(8, 6))
-        sns.heatmap(
-            df_raw[["Farm_Area", "Fertilizer_Used", "Pesticide_Used", "Water_Usage", "Yield"]].corr(),
-            annot=True, cmap="coolwarm", ax=ax
-        )
-        ax.set_title("Feature Correlation")
-        charts['correlation'] = fig_to_base64(fig)
-        plt.close(fig)
-        
-        return jsonify({'success': True, 'charts': charts})
-    except Exception as e:
-        return jsonify({'success': False, 'message': str(e)}), 500
+    version = load_dataset().version
+    charts = {name: f'/charts/eda/{name}.png?v={version}' for name in EDA_CHARTS}
+    return jsonify({'success': True, 'charts': charts})
+
+@charts_bp.route('/charts/eda/<name>.png')
+@login_required
+def eda_chart(name):
+    if name not in EDA_CHARTS:
+        return jsonify({'success': False, 'message': 'Unknown chart'}), 404
+    version = load_dataset().version
+    return chart_response(f'eda-{version}-{name}', 'eda', name, version)
+
+@charts_bp.route('/charts/eval/<slug>.png')
+@login_required
+def evaluation_chart(slug):
+    snapshot = registry.get()
+    if snapshot is None:
+        return jsonify({'success': False, 'message': 'Models not trained yet'}), 400
+    names = {model_slug(name): name for name in snapshot.results}
+    if slug not in names:
+        return jsonify({'success': False, 'message': 'Unknown model'}), 404
+    key = f'eval-{load_dataset().version}-{snapshot.tag}-{slug}'
+    return chart_response(key, 'eval', names[slug], snapshot.tag)
+
+def render_chart(kind, name, version):
+    """PNG of an EDA or evaluation chart; runs in a chart worker process.
 
-def fig_to_base64(fig):
-    buf = io.BytesIO()
-    fig.savefig(buf, format='png', bbox_inches='tight')
-    buf.seek(0)
-    img_str = base64.b64encode(buf.read()).decode()
-    return f'data:image/png;base64,{img_str}'
+    `version` is the dataset version (EDA) or model tag (evaluation) the
+    chart's cache key was built from. Returns None if the data or models
+    have changed since, rather than render them under the old key.
+    """
+    if kind == 'eda':
+        from charts import render_eda_chart
+        from eda_stats import load_eda_stats
+        data = load_dataset()
+        if data.version != version:
+            return None
+        return render_eda_chart(load_eda_stats(data), name)
+    
+    from charts import render_evaluation_chart
+    snapshot = registry.get(refresh=True)
+    if snapshot is None or snapshot.tag != version:
+        return None
+    return render_evaluation_chart(snapshot, name)
+
+def chart_response(key, kind, name, version):
+    """Serve a cached PNG, rendering it on a miss.
+
+    Keys embed the dataset and model versions, so the key doubles as a
+    strong ETag and the image can be cached by the browser.
+    """
+    if key in request.if_none_match:
+        response = Response(status=304)
+    else:
+        png = chart_cache.get(key)
+        if png is None:
+            with metrics.span('figure_render', chart=name if kind == 'eda' else 'evaluation'):
+                if CHART_WORKERS:
+                    png = chart_pool.run(render_chart, kind, name, version)
+                else:
+                    # pyplot keeps global figure state, so render one chart at a time
+                    with _render_lock:
+                        png = render_chart(kind, name, version)
+            if png is None:
+                return jsonify({'success': False, 'message': 'The data or models have changed, reload the charts'}), 409
+            chart_cache.put(key, png)
+        response = Response(png, mimetype='image/png')
+    response.set_etag(key)
+    response.cache_control.private = True
+    response.cache_control.max_age = 86400
+    return response
+
+# =====================================================
+# METRICS & PROFILING
+# =====================================================
+@metrics_bp.route('/metrics')
+def metrics_endpoint():
+    return Response(metrics.registry.render(), mimetype='text/plain; version=0.0.4')
+
+@metrics_bp.route('/profiler/start', methods=['POST'])
+def profiler_start():
+    if not metrics.PROFILER_ENABLED:
+        return jsonify({'success': False, 'message': 'Profiler disabled (set CROP_PROFILER=1)'}), 404
+    interval = request.args.get('interval', type=float)
+    if not metrics.profiler.start(interval):
+        return jsonify({'success': False, 'message': 'Profiler already running'}), 409
+    return jsonify({'success': True, 'interval': metrics.profiler.interval})
+
+@metrics_bp.route('/profiler/stop', methods=['POST'])
+def profiler_stop():
+    if not metrics.PROFILER_ENABLED:
+        return jsonify({'success': False, 'message': 'Profiler disabled (set CROP_PROFILER=1)'}), 404
+    # Collapsed stacks, ready for flamegraph.pl or speedscope
+    return Response(metrics.profiler.stop(), mimetype='text/plain')
+
+def start_request_timer():
+    if metrics.ENABLED:
+        g.request_start = time.perf_counter()
+
+def record_request(response):
+    # Streamed responses are timed to their first byte, not their last
+    start = g.get('request_start')
+    if start is not None:
+        endpoint = request.endpoint or 'unmatched'
+        metrics.observe('crop_request_seconds', time.perf_counter() - start,
+                        endpoint=endpoint, method=request.method)
+        metrics.inc('crop_requests_total', endpoint=endpoint, method=request.method,
+                    status=response.status_code)
+    return response
+
+# =====================================================
+# APPLICATION FACTORY
+# =====================================================
+def create_app(route_groups=None):
+    """Build the Flask app with only the requested route groups.
+
+    `route_groups` defaults to the comma-separated CROP_ROUTE_GROUPS
+    environment variable, or every group when that is unset, e.g.
+    `gunicorn "app:create_app(['auth', 'history'])"`.
+    """
+    if route_groups is None:
+        env_groups = os.environ.get("CROP_ROUTE_GROUPS")
+        route_groups = env_groups.split(",") if env_groups else list(ROUTE_GROUPS)
+    # Blank entries (e.g. a trailing comma) are ignored
+    route_groups = [group.strip() for group in route_groups if group.strip()]
+    for group in route_groups:
+        if group not in ROUTE_GROUPS:
+            raise ValueError(f"Unknown route group {group!r}; expected one of {sorted(ROUTE_GROUPS)}")
+    
+    app = Flask(__name__)
+    app.secret_key = 'your-secret-key-change-this-in-production'
+    for group in route_groups:
+        app.register_blueprint(ROUTE_GROUPS[group])
+    app.register_blueprint(metrics_bp)
+    app.before_request(start_request_timer)
+    app.after_request(record_request)
+    app.register_error_handler(Overloaded, overloaded)
+    return app
+
+app = create_app()
 
 if __name__ == '__main__':
-    app.run(debug=True)
\ No newline at end of file
+    import argparse
+    
+    parser = argparse.ArgumentParser(description="Run the Crop Yield Prediction server")
+    parser.add_argument('--production', action='store_true',
+                        help="No debugger or auto-reloader (put gunicorn in front for real traffic)")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=5000)
+    args = parser.parse_args()
+    app.run(host=args.host, port=args.port, debug=not args.production, threaded=True)
@@ -0,0 +1,79 @@
+"""Compare native per-library predict() with the compiled NumPy ensemble.
+
+Run from the Cropyield2.0 directory:
+
+    python benchmarks/bench_compiled_inference.py [--max-rows 10000] [--json out.json]
+
+Features are encoded up front, so the timings cover only the six models and
+the average. Latency is the median of --repeat runs.
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import registry, train_models
+from compiled_ensemble import compile_ensemble, max_differences
+from dataset import load_dataset
+
+
+def median_ms(fn, repeat):
+    fn()
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--max-rows', type=int, default=10_000)
+    parser.add_argument('--repeat', type=int, default=20)
+    parser.add_argument('--json', help='Write results to this file')
+    args = parser.parse_args()
+
+    snapshot = registry.get()
+    if snapshot is None:
+        train_models()
+        snapshot = registry.get()
+    results = snapshot.results
+
+    data = load_dataset()
+    start = time.perf_counter()
+    engine = compile_ensemble(results, data.X.shape[1])
+    compile_ms = (time.perf_counter() - start) * 1000
+    errors = max_differences(engine, results, data.X)
+    print(f"compiled {engine.n_nodes:,} nodes, depth {engine.depth}, "
+          f"{engine.nbytes() / 1024 / 1024:.2f} MB in {compile_ms:.0f} ms")
+    for name, error in errors.items():
+        print(f"  max |native - compiled| {name:<18} {error:.2e}")
+
+    rows = []
+    n = 1
+    while n <= args.max_rows:
+        features = data.X.sample(n=n, replace=True, random_state=0).reset_index(drop=True)
+        repeat = max(3, args.repeat // max(1, n // 100))
+        per_model = {
+            name: median_ms(lambda model=info['model']: model.predict(features), repeat)
+            for name, info in results.items()
+        }
+        native = median_ms(lambda: [info['model'].predict(features) for info in results.values()], repeat)
+        compiled = median_ms(lambda: engine.predict(features), repeat)
+        rows.append({'rows': n, 'native_ms': native, 'compiled_ms': compiled, 'native_per_model_ms': per_model})
+        print(f"{n:>7} rows  native {native:9.2f} ms  compiled {compiled:9.2f} ms  "
+              f"speedup {native / compiled:6.1f}x")
+        n *= 10
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({'compile_ms': compile_ms, 'max_error': errors, 'latency': rows}, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,148 @@
+"""Concurrent read/write throughput of the SQLite Database layer.
+
+Simulated users save predictions and read their history at the same time
+against a throwaway database, then the sustained insert rate of per-row
+save_prediction is compared with the PredictionWriter write-behind queue.
+Run from the Cropyield2.0 directory:
+
+    python benchmarks/bench_database.py [--users 16] [--seconds 10] [--inserts 20000] [--json out.json]
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database import Database, PredictionWriter
+
+PARAMS = {
+    'farm_area': 10, 'fertilizer': 100, 'pesticide': 10, 'water': 5000,
+    'crop': 'Wheat', 'irrigation': 'Drip', 'soil': 'Loamy', 'season': 'Rabi'
+}
+PREDS = {
+    'Linear Regression': 9.8, 'Random Forest': 9.5, 'Gradient Boosting': 9.9,
+    'XGBoost': 9.7, 'LightGBM': 10.1, 'CatBoost': 9.7, 'average': 9.8
+}
+
+
+def percentile(values, q):
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q / 100 * len(values)))]
+
+
+def summarize(latencies, seconds):
+    return {
+        'ops': len(latencies),
+        'ops_per_sec': round(len(latencies) / seconds, 1),
+        'p50_ms': round(percentile(latencies, 50) * 1000, 3) if latencies else None,
+        'p95_ms': round(percentile(latencies, 95) * 1000, 3) if latencies else None,
+        'p99_ms': round(percentile(latencies, 99) * 1000, 3) if latencies else None
+    }
+
+
+def run(db, users, seconds, write_ratio):
+    user_ids = []
+    for i in range(users):
+        db.register_user(f'bench{i}', 'pw', f'bench{i}@example.com')
+        user_ids.append(db.authenticate_user(f'bench{i}', 'pw')[1])
+
+    writes, reads, errors = [], [], []
+    lock = threading.Lock()
+    stop = time.perf_counter() + seconds
+
+    def user(user_id, seed):
+        rng = random.Random(seed)
+        local_writes, local_reads, local_errors = [], [], 0
+        while time.perf_counter() < stop:
+            start = time.perf_counter()
+            if rng.random() < write_ratio:
+                ok = db.save_prediction(user_id, PARAMS, PREDS)
+                local_writes.append(time.perf_counter() - start)
+                local_errors += not ok
+            else:
+                db.get_user_stats(user_id)
+                db.get_user_predictions(user_id)
+                local_reads.append(time.perf_counter() - start)
+        with lock:
+            writes.extend(local_writes)
+            reads.extend(local_reads)
+            errors.append(local_errors)
+
+    threads = [threading.Thread(target=user, args=(uid, i)) for i, uid in enumerate(user_ids)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    return {
+        'users': users,
+        'seconds': seconds,
+        'writes': summarize(writes, seconds),
+        'reads': summarize(reads, seconds),
+        'failed_writes': sum(errors)
+    }
+
+
+def insert_rate(db, n, writers=4):
+    """Rows/sec for per-row commits vs the write-behind queue"""
+    user_id = db.authenticate_user('bench0', 'pw')[1]
+    per_thread = n // writers
+
+    def timed(save):
+        threads = [
+            threading.Thread(target=lambda: [save() for _ in range(per_thread)])
+            for _ in range(writers)
+        ]
+        start = time.perf_counter()
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        return start
+
+    start = timed(lambda: db.save_prediction(user_id, PARAMS, PREDS))
+    per_row = time.perf_counter() - start
+
+    writer = PredictionWriter(db)
+    start = timed(lambda: writer.submit(user_id, PARAMS, PREDS))
+    writer.flush()
+    write_behind = time.perf_counter() - start
+    writer.close()
+
+    rows = per_thread * writers
+    return {
+        'rows': rows,
+        'per_row_rows_per_sec': round(rows / per_row, 1),
+        'write_behind_rows_per_sec': round(rows / write_behind, 1)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--users', type=int, default=16)
+    parser.add_argument('--seconds', type=float, default=10)
+    parser.add_argument('--write-ratio', type=float, default=0.5)
+    parser.add_argument('--inserts', type=int, default=20000)
+    parser.add_argument('--json', help='Write results to this file')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db = Database(os.path.join(tmp, 'bench.db'))
+        result = run(db, args.users, args.seconds, args.write_ratio)
+        result['inserts'] = insert_rate(db, args.inserts)
+
+    print(json.dumps(result, indent=2))
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(result, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,97 @@
+"""Compare loading the dataset from CSV with opening the memory-mapped column store.
+
+Run from the Cropyield2.0 directory:
+
+    python benchmarks/bench_dataset_load.py [--rows 2000000] [--json out.json]
+
+Each measurement runs in a fresh interpreter and is timed after imports.
+"private MB" is anonymous memory (RssAnon) owned by the process; mapped
+column files show up as shared page cache instead.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+PROBE = r'''
+import json, sys, time
+sys.path.insert(0, {root!r})
+
+def memory():
+    fields = dict(line.split(':', 1) for line in open('/proc/self/status'))
+    return {{key: int(fields[key].split()[0]) / 1024 for key in ('VmRSS', 'RssAnon')}}
+
+import pandas as pd
+from sklearn.preprocessing import LabelEncoder
+from dataset import Dataset
+
+mode, path = {mode!r}, {path!r}
+before = memory()
+start = time.perf_counter()
+if mode == 'csv':
+    # What app.py used to do: parse, keep a raw copy, label-encode
+    df = pd.read_csv(path)
+    df_raw = df.copy()
+    for col in ['Crop_Type', 'Irrigation_Type', 'Soil_Type', 'Season']:
+        df[col] = LabelEncoder().fit_transform(df[col])
+    X, y = df.drop('Yield', axis=1), df['Yield']
+else:
+    data = Dataset(path)
+    X, y = data.X, data.y
+load = time.perf_counter() - start
+start = time.perf_counter()
+float(X['Farm_Area'].mean() + y.mean())
+scan = time.perf_counter() - start
+after = memory()
+print(json.dumps({{'seconds': load, 'scan_seconds': scan,
+                  'rss_mb': after['VmRSS'] - before['VmRSS'],
+                  'private_mb': after['RssAnon'] - before['RssAnon']}}))
+'''
+
+
+def probe(mode, path):
+    out = subprocess.run([sys.executable, '-c', PROBE.format(root=ROOT, mode=mode, path=path)],
+                         capture_output=True, text=True, check=True, cwd=ROOT)
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=2_000_000)
+    parser.add_argument('--json', help='Write results to this file')
+    args = parser.parse_args()
+
+    sys.path.insert(0, ROOT)
+    import pandas as pd
+    from schema import DATASET_PATH
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'dataset.csv')
+        source = pd.read_csv(os.path.join(ROOT, DATASET_PATH))
+        source.sample(n=args.rows, replace=True, random_state=0).to_csv(path, index=False)
+        size_mb = os.path.getsize(path) / 1024 / 1024
+        print(f"{args.rows:,} rows, {size_mb:.0f} MB CSV")
+
+        results = {
+            'rows': args.rows,
+            'csv': probe('csv', path),
+            'import': probe('store', path),
+            'store': probe('store', path)
+        }
+        labels = {'csv': 'read_csv + copies', 'import': 'first load (ingest)', 'store': 'open column store'}
+        for key, label in labels.items():
+            r = results[key]
+            print(f"{label:<20} {r['seconds']:8.3f} s  scan {r['scan_seconds'] * 1000:7.1f} ms  "
+                  f"rss +{r['rss_mb']:7.1f} MB  private +{r['private_mb']:7.1f} MB")
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,99 @@
+"""Time dataset pages served by /dataset/query against serialising the frame.
+
+Run from the Cropyield2.0 directory:
+
+    python benchmarks/bench_dataset_query.py [--rows 1000000] [--json out.json]
+
+Works on a temporary copy of the dataset resampled to --rows rows.
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pandas as pd
+
+from dataset import Dataset
+from dataset_query import DatasetQuery, CategoryIndex, parse_query
+from schema import DATASET_PATH
+
+QUERIES = {
+    'first page': {},
+    'crop filter': {'crop': 'Rice'},
+    'two filters + range': {'crop': 'Rice,Wheat', 'soil': 'Clay', 'water_min': '5000'},
+    'sorted by yield': {'sort': '-yield'},
+    'filter + sort': {'season': 'Rabi', 'sort': 'farm_area'},
+}
+
+
+def frame_page(df, args):
+    """The naive way: boolean masks and sort over the whole frame, then to_dict"""
+    mask = pd.Series(True, index=df.index)
+    for field, column in (('crop', 'Crop_Type'), ('soil', 'Soil_Type'), ('season', 'Season')):
+        if field in args:
+            mask &= df[column].isin(args[field].split(','))
+    if 'water_min' in args:
+        mask &= df['Water_Usage'] >= float(args['water_min'])
+    result = df[mask]
+    if 'sort' in args:
+        column = {'yield': 'Yield', 'farm_area': 'Farm_Area'}[args['sort'].lstrip('-')]
+        result = result.sort_values(column, ascending=not args['sort'].startswith('-'), kind='stable')
+    return json.dumps(result.head(100).to_dict('records'))
+
+
+def timed(fn, repeat=5):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=1_000_000)
+    parser.add_argument('--json', help='Write results to this file')
+    args = parser.parse_args()
+
+    source = pd.read_csv(DATASET_PATH)
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'dataset.csv')
+        source.sample(n=args.rows, replace=True, random_state=0).to_csv(path, index=False)
+        data = Dataset(path)
+
+        start = time.perf_counter()
+        index = CategoryIndex(data)
+        results = {'rows': args.rows, 'index_build_seconds': time.perf_counter() - start}
+
+        for name, params in QUERIES.items():
+            query = DatasetQuery(data, index)
+            spec = parse_query(params, query.columns)
+            start = time.perf_counter()
+            first = query.run(spec)
+            cold = time.perf_counter() - start
+            spec['cursor'] = parse_query({'cursor': first['next_cursor']}, query.columns)['cursor']
+            results[name] = {
+                'frame_seconds': timed(lambda: frame_page(data.df_raw, params)),
+                'query_cold_seconds': cold,
+                'query_next_page_seconds': timed(lambda: json.dumps(query.run(spec)))
+            }
+
+    print(f"{args.rows:,} rows; category index built in {results['index_build_seconds']:.3f} s")
+    for name in QUERIES:
+        r = results[name]
+        print(f"  {name:<22} frame {r['frame_seconds'] * 1000:8.1f} ms   "
+              f"query first page {r['query_cold_seconds'] * 1000:7.1f} ms   "
+              f"next page {r['query_next_page_seconds'] * 1000:6.2f} ms")
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,86 @@
+"""Time EDA charts rendered from the raw rows against the precomputed EdaStats.
+
+Run from the Cropyield2.0 directory:
+
+    python benchmarks/bench_eda.py [--rows 1000000] [--append 10000] [--json out.json]
+
+Works on a temporary copy of the dataset resampled to --rows rows.
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import matplotlib
+matplotlib.use('Agg')
+import matplotlib.pyplot as plt
+import pandas as pd
+import seaborn as sns
+
+from charts import fig_to_png, render_eda_chart
+from dataset import Dataset
+from eda_stats import load_eda_stats
+from schema import DATASET_PATH, NUMERIC_COLUMNS, TARGET
+
+
+def render_from_rows(df_raw, name):
+    """The previous implementation: seaborn over every row"""
+    fig, ax = plt.subplots(figsize=(8, 5))
+    if name == 'crop_yield':
+        sns.barplot(data=df_raw, x="Crop_Type", y="Yield", ax=ax)
+    elif name == 'soil_yield':
+        sns.boxplot(data=df_raw, x="Soil_Type", y="Yield", ax=ax)
+    else:
+        sns.heatmap(df_raw[NUMERIC_COLUMNS + [TARGET]].corr(), annot=True, cmap="coolwarm", ax=ax)
+    return fig_to_png(fig)
+
+
+def timed(fn):
+    start = time.perf_counter()
+    fn()
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=1_000_000)
+    parser.add_argument('--append', type=int, default=10_000)
+    parser.add_argument('--json', help='Write results to this file')
+    args = parser.parse_args()
+
+    source = pd.read_csv(DATASET_PATH)
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'dataset.csv')
+        source.sample(n=args.rows, replace=True, random_state=0).to_csv(path, index=False)
+        data = Dataset(path)
+
+        results = {'rows': args.rows, 'appended': args.append}
+        results['stats_build_seconds'] = timed(lambda: load_eda_stats(data))
+        for name in ('crop_yield', 'soil_yield', 'correlation'):
+            results[name] = {
+                'rows_seconds': timed(lambda: render_from_rows(data.df_raw, name)),
+                'stats_seconds': timed(lambda: render_eda_chart(load_eda_stats(data), name))
+            }
+
+        source.sample(n=args.append, replace=True, random_state=1).to_csv(
+            path, mode='a', header=False, index=False)
+        grown = Dataset(path)
+        results['stats_update_seconds'] = timed(lambda: load_eda_stats(grown))
+
+    print(f"{args.rows:,} rows; stats built in {results['stats_build_seconds']:.3f} s, "
+          f"+{args.append:,} appended rows folded in {results['stats_update_seconds'] * 1000:.1f} ms")
+    for name in ('crop_yield', 'soil_yield', 'correlation'):
+        r = results[name]
+        print(f"  {name:<12} from rows {r['rows_seconds']:7.3f} s   from stats {r['stats_seconds']:7.3f} s")
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,100 @@
+"""Compare the previous in-memory dataset generator with the chunked one.
+
+Run from the Cropyield2.0 directory:
+
+    python benchmarks/bench_generate.py [--rows 5000000] [--workers 4] [--json out.json]
+
+Each run is a fresh interpreter; "peak MB" is its maximum RSS (the largest
+worker process for parallel runs).
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+PROBE = r'''
+import json, os, resource, sys, time
+sys.path.insert(0, {root!r})
+import numpy as np
+import pandas as pd
+from dataset import generate_dataset
+
+def previous(n, path):
+    """What generate_dataset did before: one frame, .map per category, to_csv"""
+    np.random.seed(42)
+    data = pd.DataFrame({{
+        "Farm_Area": np.random.uniform(1, 50, n),
+        "Fertilizer_Used": np.random.uniform(50, 500, n),
+        "Pesticide_Used": np.random.uniform(5, 50, n),
+        "Water_Usage": np.random.uniform(1000, 10000, n),
+        "Crop_Type": np.random.choice(["Wheat", "Rice", "Cotton"], n),
+        "Irrigation_Type": np.random.choice(["Drip", "Manual", "Flood"], n),
+        "Soil_Type": np.random.choice(["Loamy", "Sandy", "Clay"], n),
+        "Season": np.random.choice(["Kharif", "Rabi", "Zaid"], n)
+    }})
+    base = (0.1 * data["Farm_Area"] + 0.015 * data["Fertilizer_Used"]
+            + 0.0005 * data["Water_Usage"] - 0.05 * data["Pesticide_Used"])
+    data["Yield"] = (
+        base
+        + data["Crop_Type"].map({{"Wheat": 2.5, "Rice": 3.0, "Cotton": 2.0}})
+        + data["Irrigation_Type"].map({{"Drip": 1.5, "Manual": 1.0, "Flood": 0.8}})
+        + data["Soil_Type"].map({{"Loamy": 1.4, "Clay": 1.1, "Sandy": 0.9}})
+        + np.random.normal(0, 1, n)
+    )
+    data.to_csv(path, index=False)
+
+if __name__ == '__main__':
+    mode, n, workers, path = {mode!r}, {rows}, {workers}, {path!r}
+    start = time.perf_counter()
+    if mode == 'previous':
+        previous(n, path)
+    else:
+        generate_dataset(n, path, fmt=mode, workers=workers)
+    seconds = time.perf_counter() - start
+    peak = max(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+               resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss) / 1024
+    print(json.dumps({{'seconds': seconds, 'rows_per_sec': n / seconds, 'peak_mb': peak}}))
+'''
+
+
+def probe(mode, rows, workers, path):
+    script = os.path.join(os.path.dirname(path), 'probe.py')
+    with open(script, 'w') as f:
+        f.write(PROBE.format(root=ROOT, mode=mode, rows=rows, workers=workers, path=path))
+    out = subprocess.run([sys.executable, script], capture_output=True, text=True, check=True)
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=5_000_000)
+    parser.add_argument('--workers', type=int, default=os.cpu_count())
+    parser.add_argument('--json', help='Write results to this file')
+    args = parser.parse_args()
+
+    runs = [
+        ('previous (pandas, in memory)', 'previous', 1),
+        ('chunked CSV, 1 process', 'csv', 1),
+        (f'chunked CSV, {args.workers} processes', 'csv', args.workers),
+        ('column store, 1 process', 'columns', 1),
+        (f'column store, {args.workers} processes', 'columns', args.workers),
+    ]
+    results = {'rows': args.rows, 'workers': args.workers, 'runs': {}}
+    with tempfile.TemporaryDirectory() as tmp:
+        for label, mode, workers in runs:
+            r = probe(mode, args.rows, workers, os.path.join(tmp, f'{mode}-{workers}.csv'))
+            results['runs'][label] = r
+            print(f"{label:<30} {r['seconds']:8.2f} s  {r['rows_per_sec']:12,.0f} rows/s  "
+                  f"peak {r['peak_mb']:7.0f} MB")
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
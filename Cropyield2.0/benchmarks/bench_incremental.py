@@ -0,0 +1,80 @@
+"""Time incremental retraining against a full refit as rows are appended.
+
+Run from the Cropyield2.0 directory:
+
+    python benchmarks/bench_incremental.py [--rows 5000] [--append 50 250 500] [--json out.json]
+
+Works on a temporary copy of the dataset, resampled to --rows rows, so the
+real crop_yield_dataset.csv is never modified.
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pandas as pd
+
+from dataset import Dataset
+from model_registry import ModelRegistry
+from schema import DATASET_PATH
+from training import retrain
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=5000)
+    parser.add_argument('--append', type=int, nargs='+', default=[50, 250, 500])
+    parser.add_argument('--json', help='Write results to this file')
+    args = parser.parse_args()
+
+    source = pd.read_csv(DATASET_PATH)
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'dataset.csv')
+        for appended in args.append:
+            source.sample(n=args.rows, replace=True, random_state=0).to_csv(path, index=False)
+            base = ModelRegistry(os.path.join(tmp, 'models')).publish(retrain(Dataset(path)))
+
+            source.sample(n=appended, replace=True, random_state=1).to_csv(
+                path, mode='a', header=False, index=False)
+            grown = Dataset(path)
+
+            start = time.perf_counter()
+            update = retrain(grown, base, incremental=True)
+            incremental = time.perf_counter() - start
+
+            start = time.perf_counter()
+            full = retrain(grown)
+            refit = time.perf_counter() - start
+
+            r2 = {
+                name: {'incremental': round(update['results'][name]['r2'], 4),
+                       'full': round(full['results'][name]['r2'], 4),
+                       'update': update['results'][name]['update']}
+                for name in full['results']
+            }
+            results.append({
+                'rows': args.rows,
+                'appended': appended,
+                'mode': update['training']['mode'],
+                'incremental_seconds': incremental,
+                'full_refit_seconds': refit,
+                'r2': r2
+            })
+            print(f"{args.rows:>7} + {appended:<6} incremental {incremental:7.3f} s  "
+                  f"full refit {refit:7.3f} s  speedup {refit / incremental:5.1f}x")
+            for name, scores in r2.items():
+                print(f"    {name:<18} r2 {scores['incremental']:.4f} ({scores['update']}) "
+                      f"vs {scores['full']:.4f} refit")
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,81 @@
+"""Measure what the instrumentation costs, with metrics enabled and disabled.
+
+Run from the Cropyield2.0 directory:
+
+    python benchmarks/bench_metrics.py [--requests 300] [--json out.json]
+
+Each mode runs in a fresh interpreter with CROP_METRICS set accordingly and
+reports the cost of one span plus /predict latency through the Flask app.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+PROBE = r'''
+import json, os, sys, time
+sys.path.insert(0, {root!r})
+os.chdir({workdir!r})
+import numpy as np
+import metrics
+
+n = 200_000
+start = time.perf_counter()
+for _ in range(n):
+    with metrics.span('bench'):
+        pass
+span_ns = (time.perf_counter() - start) / n * 1e9
+
+import app as A
+client = A.app.test_client()
+client.post('/register', json={{'username': 'bench', 'password': 'bench', 'email': 'b@example.com'}})
+client.post('/login', json={{'username': 'bench', 'password': 'bench'}})
+if A.registry.get() is None:
+    A.train_models(parallel=False)
+body = {{'farm_area': 10, 'fertilizer': 100, 'pesticide': 10, 'water': 5000,
+         'crop': 'Wheat', 'irrigation': 'Drip', 'soil': 'Loamy', 'season': 'Rabi'}}
+samples = []
+for i in range({requests}):
+    start = time.perf_counter()
+    client.post('/predict', json=dict(body, farm_area=1 + i * 0.01))
+    samples.append(time.perf_counter() - start)
+ms = np.asarray(samples[10:]) * 1000
+print(json.dumps({{'span_ns': span_ns, 'predict_p50_ms': float(np.percentile(ms, 50)),
+                  'predict_p99_ms': float(np.percentile(ms, 99))}}))
+'''
+
+
+def probe(enabled, workdir, requests):
+    env = dict(os.environ, CROP_METRICS='1' if enabled else '0', CHART_CACHE_DIR='')
+    out = subprocess.run([sys.executable, '-c', PROBE.format(root=ROOT, workdir=workdir, requests=requests)],
+                         capture_output=True, text=True, check=True, env=env)
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--requests', type=int, default=300)
+    parser.add_argument('--json', help='Write results to this file')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        # The first probe trains the models the second one reuses
+        results = {
+            'disabled': probe(False, tmp, args.requests),
+            'enabled': probe(True, tmp, args.requests)
+        }
+    for mode, r in results.items():
+        print(f"metrics {mode:<8}  span {r['span_ns']:7.0f} ns   "
+              f"/predict p50 {r['predict_p50_ms']:6.2f} ms  p99 {r['predict_p99_ms']:6.2f} ms")
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
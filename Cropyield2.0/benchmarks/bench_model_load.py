@@ -0,0 +1,107 @@
+"""Cold-start cost of the single-file artifact against the lazy artifact directory.
+
+Run from the Cropyield2.0 directory:
+
+    python benchmarks/bench_model_load.py [--rows 20000] [--json out.json]
+
+Models are trained once on a generated dataset in a temporary directory,
+saved in both formats (and with compression), then each case is loaded in
+a fresh interpreter and timed after imports, through the first prediction.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+PROBE = r'''
+import json, os, sys, time
+sys.path.insert(0, {root!r})
+os.chdir({workdir!r})
+
+def rss_mb():
+    fields = dict(line.split(':', 1) for line in open('/proc/self/status'))
+    return int(fields['VmRSS'].split()[0]) / 1024
+
+import joblib, pandas, sklearn, xgboost, lightgbm, catboost
+from model_registry import ModelRegistry
+case, names = {case!r}, {names!r}
+before = rss_mb()
+start = time.perf_counter()
+if case == 'single file':
+    data = joblib.load('legacy.pkl')
+    results, X = data['results'], data['X_test']
+else:
+    snapshot = ModelRegistry({directory!r}, mmap={mmap!r}).get()
+    results, X = snapshot.results, snapshot.X_test
+for name in names:
+    results[name]['model'].predict(X[:1])
+print(json.dumps({{'seconds': time.perf_counter() - start, 'rss_mb': rss_mb() - before}}))
+'''
+
+FAST_MODELS = ['LightGBM', 'XGBoost']
+
+
+def probe(workdir, case, names, directory=None, mmap=False):
+    code = PROBE.format(root=ROOT, workdir=workdir, case=case, names=names, directory=directory, mmap=mmap)
+    out = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True, check=True)
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def directory_size(path):
+    return sum(os.path.getsize(os.path.join(d, f)) for d, _, files in os.walk(path) for f in files)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=20_000)
+    parser.add_argument('--json', help='Write results to this file')
+    args = parser.parse_args()
+
+    sys.path.insert(0, ROOT)
+    with tempfile.TemporaryDirectory() as tmp:
+        os.chdir(tmp)
+        import joblib
+        from dataset import generate_dataset, load_dataset
+        from model_registry import ModelRegistry
+        from training import retrain
+
+        generate_dataset(args.rows)
+        artifact = retrain(load_dataset(), parallel=False)
+        joblib.dump(artifact, 'legacy.pkl')
+        for name, compress in (('plain', 0), ('zlib3', 3), ('lz4', 'lz4')):
+            try:
+                ModelRegistry(name, compress=compress).publish(artifact)
+            except ValueError:  # lz4 not installed
+                pass
+        all_models = list(artifact['results'])
+
+        cases = [
+            ('single file, all models', 'legacy.pkl', probe(tmp, 'single file', all_models)),
+            ('directory, all models', 'plain', probe(tmp, 'directory', all_models, 'plain')),
+            ('directory, LightGBM + XGBoost', 'plain', probe(tmp, 'directory', FAST_MODELS, 'plain')),
+            ('directory + mmap, LightGBM + XGBoost', 'plain',
+             probe(tmp, 'directory', FAST_MODELS, 'plain', mmap=True)),
+            ('zlib:3, LightGBM + XGBoost', 'zlib3', probe(tmp, 'directory', FAST_MODELS, 'zlib3')),
+        ]
+        if os.path.exists('lz4/CURRENT'):
+            cases.append(('lz4, LightGBM + XGBoost', 'lz4', probe(tmp, 'directory', FAST_MODELS, 'lz4')))
+        results = {'rows': args.rows, 'cases': {}}
+        for label, path, r in cases:
+            size = os.path.getsize(path) if os.path.isfile(path) else directory_size(path)
+            r['disk_mb'] = size / 1024 / 1024
+            results['cases'][label] = r
+            print(f"{label:<38} {r['seconds'] * 1000:8.1f} ms  rss +{r['rss_mb']:6.1f} MB  "
+                  f"on disk {r['disk_mb']:6.1f} MB")
+        os.chdir(ROOT)
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,54 @@
+"""Measure /predict-batch scoring throughput for batch sizes from 1 to 1M rows.
+
+Run from the Cropyield2.0 directory:
+
+    python benchmarks/bench_predict_batch.py [--max-rows 1000000] [--json out.json]
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import registry, train_models
+from dataset import load_dataset
+from inference import encode_features, predict_frame
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--max-rows', type=int, default=1_000_000)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--json', help='Write results to this file')
+    args = parser.parse_args()
+
+    snapshot = registry.get()
+    if snapshot is None:
+        train_models()
+        snapshot = registry.get()
+
+    data = load_dataset()
+    source = data.df_raw.drop(columns=['Yield'])
+    results = []
+    n = 1
+    while n <= args.max_rows:
+        frame = source.sample(n=n, replace=True, random_state=0).reset_index(drop=True)
+        timings = []
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            predict_frame(snapshot.results, encode_features(frame, data))
+            timings.append(time.perf_counter() - start)
+        best = min(timings)
+        results.append({'rows': n, 'seconds': best, 'rows_per_sec': n / best})
+        print(f"{n:>9} rows  {best * 1000:10.2f} ms  {n / best:14,.0f} rows/sec")
+        n *= 10
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
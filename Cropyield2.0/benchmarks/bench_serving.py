@@ -0,0 +1,114 @@
+"""/predict latency under concurrent load while charts are being rendered.
+
+Run from the Cropyield2.0 directory:
+
+    python benchmarks/bench_serving.py [--clients 16] [--requests 50] [--json out.json]
+
+Models are trained once in a temporary directory. Each configuration then
+runs in a fresh interpreter: --clients threads send /predict requests with
+distinct inputs while another thread keeps re-rendering an evaluation
+chart, as with the chart work done inline in request threads, on the chart
+process pool, and on the pool with /predict micro-batching.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+CONFIGS = {
+    'inline charts, no batching': {'CHART_WORKERS': '0', 'PREDICT_BATCH_MAX': '1'},
+    'chart pool, no batching': {'CHART_WORKERS': '1', 'PREDICT_BATCH_MAX': '1'},
+    'chart pool + micro-batching': {'CHART_WORKERS': '1'},
+}
+
+PROBE = r'''
+import json, os, sys, threading, time
+sys.path.insert(0, {root!r})
+os.chdir({workdir!r})
+import numpy as np
+
+if __name__ == '__main__':
+    import app as A
+    def client():
+        c = A.app.test_client()
+        c.post('/login', json={{'username': 'bench', 'password': 'bench'}})
+        return c
+    body = {{'farm_area': 10, 'fertilizer': 100, 'pesticide': 10, 'water': 5000,
+             'crop': 'Wheat', 'irrigation': 'Drip', 'soil': 'Loamy', 'season': 'Rabi'}}
+    url = client().get('/get-evaluation-charts').get_json()['charts']['Random Forest']
+    client().get(url)  # start the chart worker and load the model
+
+    stop = threading.Event()
+    charts = []
+    def render_charts():
+        c = client()
+        while not stop.is_set():
+            A.chart_cache.clear()
+            c.get(url)
+            charts.append(1)
+
+    samples, codes = [], []
+    def send(i, c):
+        for j in range({requests}):
+            start = time.perf_counter()
+            codes.append(c.post('/predict', json=dict(body, farm_area=1 + i + j * 0.001)).status_code)
+            samples.append(time.perf_counter() - start)
+
+    clients = [client() for _ in range({clients})]
+    chart_thread = threading.Thread(target=render_charts)
+    chart_thread.start()
+    time.sleep(0.5)
+    start = time.perf_counter()
+    threads = [threading.Thread(target=send, args=(i, c)) for i, c in enumerate(clients)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    seconds = time.perf_counter() - start
+    stop.set()
+    chart_thread.join()
+    ms = np.asarray(samples) * 1000
+    batches = A.metrics.registry.counters.get(('crop_batches_total', (('batcher', 'predict'),)), 0)
+    print(json.dumps({{'predict_p50_ms': float(np.percentile(ms, 50)), 'predict_p99_ms': float(np.percentile(ms, 99)),
+                      'predicts_per_sec': len(samples) / seconds, 'charts_rendered': len(charts),
+                      'model_calls': batches, 'errors': sum(code != 200 for code in codes)}}))
+'''
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=5000)
+    parser.add_argument('--clients', type=int, default=16)
+    parser.add_argument('--requests', type=int, default=50, help='Requests per client')
+    parser.add_argument('--json', help='Write results to this file')
+    args = parser.parse_args()
+
+    results = {'clients': args.clients, 'requests': args.requests, 'configs': {}}
+    with tempfile.TemporaryDirectory() as tmp:
+        setup = (f"import sys, os; sys.path.insert(0, {ROOT!r}); os.chdir({tmp!r})\n"
+                 f"from dataset import generate_dataset; generate_dataset({args.rows})\n"
+                 "import app; app.db.register_user('bench', 'bench', 'b@example.com'); app.train_models(parallel=False)")
+        subprocess.run([sys.executable, '-c', setup], capture_output=True, check=True,
+                       env=dict(os.environ, CHART_CACHE_DIR=''))
+        probe = os.path.join(tmp, 'probe.py')
+        with open(probe, 'w') as f:
+            f.write(PROBE.format(root=ROOT, workdir=tmp, clients=args.clients, requests=args.requests))
+        for label, env in CONFIGS.items():
+            out = subprocess.run([sys.executable, probe], capture_output=True, text=True, check=True,
+                                 env=dict(os.environ, CHART_CACHE_DIR='', **env))
+            r = results['configs'][label] = json.loads(out.stdout.strip().splitlines()[-1])
+            print(f"{label:<30} p50 {r['predict_p50_ms']:7.1f} ms  p99 {r['predict_p99_ms']:7.1f} ms  "
+                  f"{r['predicts_per_sec']:6.1f} req/s  {r['model_calls']:4d} model calls  "
+                  f"{r['charts_rendered']:3d} charts  {r['errors']} errors")
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,113 @@
+"""Import time and per-worker RSS for each route group.
+
+Every group is measured in a fresh interpreter: import the app with only that
+group registered (CROP_ROUTE_GROUPS), then issue its first requests. Run from
+the Cropyield2.0 directory:
+
+    python benchmarks/bench_startup.py [--json out.json]
+"""
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+PREDICT_BODY = {
+    'farm_area': 10, 'fertilizer': 100, 'pesticide': 10, 'water': 5000,
+    'crop': 'Wheat', 'irrigation': 'Drip', 'soil': 'Loamy', 'season': 'Rabi'
+}
+
+GROUP_REQUESTS = {
+    'auth': [('GET', '/', None), ('POST', '/login', {'username': 'bench', 'password': 'bench'})],
+    'history': [('GET', '/get-predictions', None)],
+    'data': [('GET', '/get-dataset', None)],
+    'inference': [('GET', '/model-status', None), ('POST', '/predict', PREDICT_BODY)],
+    'charts': [('GET', '/get-charts', None), ('GET', '/charts/eda/crop_yield.png', None)],
+    'training': [('GET', '/train-status/none', None)]
+}
+
+
+def rss_mb():
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def child(groups):
+    sys.path.insert(0, ROOT)
+    os.environ['CROP_ROUTE_GROUPS'] = ','.join(groups)
+    base_rss = rss_mb()
+    start = time.perf_counter()
+    import app
+    import_seconds = time.perf_counter() - start
+    import_rss = rss_mb()
+
+    client = app.app.test_client()
+    with client.session_transaction() as sess:
+        sess['user_id'] = 1
+        sess['username'] = 'bench'
+
+    requests = []
+    for group in groups:
+        for method, path, body in GROUP_REQUESTS[group]:
+            start = time.perf_counter()
+            response = client.open(path, method=method, json=body)
+            requests.append({
+                'path': path,
+                'status': response.status_code,
+                'first_request_seconds': round(time.perf_counter() - start, 4)
+            })
+
+    print(json.dumps({
+        'groups': groups,
+        'import_seconds': round(import_seconds, 4),
+        'interpreter_rss_mb': round(base_rss, 1),
+        'after_import_rss_mb': round(import_rss, 1),
+        'after_requests_rss_mb': round(rss_mb(), 1),
+        'modules_loaded': sorted(
+            name for name in ('pandas', 'sklearn', 'xgboost', 'lightgbm', 'catboost', 'matplotlib')
+            if name in sys.modules
+        ),
+        'requests': requests
+    }))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--json', help='Write results to this file')
+    parser.add_argument('--child', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        child(args.child.split(','))
+        return
+
+    results = []
+    for groups in [[group] for group in GROUP_REQUESTS] + [list(GROUP_REQUESTS)]:
+        out = subprocess.run(
+            [sys.executable, __file__, '--child', ','.join(groups)],
+            cwd=ROOT, capture_output=True, text=True, check=True
+        )
+        stats = json.loads(out.stdout.strip().splitlines()[-1])
+        results.append(stats)
+        first = sum(r['first_request_seconds'] for r in stats['requests'])
+        print(f"{'+'.join(groups):<45} import {stats['import_seconds']:6.2f} s  "
+              f"rss {stats['after_import_rss_mb']:6.1f} -> {stats['after_requests_rss_mb']:6.1f} MB  "
+              f"first requests {first:6.2f} s  loaded: {', '.join(stats['modules_loaded']) or '-'}")
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,80 @@
+"""Check that streaming scoring keeps peak RSS flat as the input grows.
+
+Each input size is scored in a fresh subprocess so ru_maxrss reflects only
+that run. Run from the Cropyield2.0 directory:
+
+    python benchmarks/bench_stream_memory.py [--sizes 10000 100000 1000000]
+"""
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+
+def child(path, chunk_size):
+    import pandas as pd
+    from app import registry, train_models
+    from dataset import load_dataset
+    from inference import score_chunks
+
+    snapshot = registry.get()
+    if snapshot is None:
+        train_models()
+        snapshot = registry.get()
+
+    baseline = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    start = time.perf_counter()
+    out_bytes = 0
+    for text in score_chunks(snapshot.results, load_dataset(), pd.read_csv(path, chunksize=chunk_size)):
+        out_bytes += len(text)
+    elapsed = time.perf_counter() - start
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    print(json.dumps({
+        'seconds': elapsed,
+        'output_bytes': out_bytes,
+        'baseline_rss_mb': baseline / 1024,
+        'peak_rss_mb': peak / 1024
+    }))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10_000, 100_000, 1_000_000])
+    parser.add_argument('--chunk-size', type=int, default=50_000)
+    parser.add_argument('--child', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        child(args.child, args.chunk_size)
+        return
+
+    from dataset import load_dataset
+    source = load_dataset().df_raw.drop(columns=['Yield'])
+    for n in args.sizes:
+        with tempfile.NamedTemporaryFile(suffix='.csv', delete=False) as tmp:
+            path = tmp.name
+        try:
+            # Write the input in slices so the parent does not hold it either
+            for start in range(0, n, 100_000):
+                part = source.sample(n=min(100_000, n - start), replace=True, random_state=start)
+                part.to_csv(path, mode='a', index=False, header=start == 0)
+            out = subprocess.run(
+                [sys.executable, __file__, '--child', path, '--chunk-size', str(args.chunk_size)],
+                cwd=ROOT, capture_output=True, text=True, check=True
+            )
+            stats = json.loads(out.stdout.strip().splitlines()[-1])
+            print(f"{n:>10} rows  {stats['seconds']:8.2f} s  "
+                  f"baseline {stats['baseline_rss_mb']:7.1f} MB  peak {stats['peak_rss_mb']:7.1f} MB")
+        finally:
+            os.remove(path)
+
+
+if __name__ == '__main__':
+    main()
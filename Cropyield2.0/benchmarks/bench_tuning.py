@@ -0,0 +1,67 @@
+"""Hold-out accuracy and compute cost of tuned models against the defaults.
+
+Run from the Cropyield2.0 directory:
+
+    python benchmarks/bench_tuning.py [--rows 20000] [--candidates 8] [--folds 3] [--json out.json]
+
+Works on a generated dataset in a temporary directory. The defaults are
+trained first, then each model's settings are searched (tuning.tune) and
+the models refitted with the winners; both are scored on the same
+held-out rows.
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from dataset import Dataset, generate_dataset
+from training import retrain
+from tuning import tune
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=20_000)
+    parser.add_argument('--candidates', type=int, default=8)
+    parser.add_argument('--folds', type=int, default=3)
+    parser.add_argument('--serial', action='store_true', help='Run trials in this process')
+    parser.add_argument('--json', help='Write results to this file')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'dataset.csv')
+        generate_dataset(args.rows, path)
+        data = Dataset(path)
+
+        default = retrain(data, parallel=not args.serial)
+
+        start = time.perf_counter()
+        search = tune(data, candidates=args.candidates, folds=args.folds, parallel=not args.serial)
+        search_seconds = time.perf_counter() - start
+        tuned = retrain(data, params={name: result['params'] for name, result in search.items()},
+                        parallel=not args.serial)
+
+    results = {'rows': args.rows, 'candidates': args.candidates, 'folds': args.folds,
+               'search_seconds': round(search_seconds, 2), 'models': {}}
+    print(f"{args.rows} rows, {args.candidates} candidates, {args.folds}-fold CV: "
+          f"search took {search_seconds:.1f}s wall")
+    for name, info in default['results'].items():
+        entry = {'default_r2': round(info['r2'], 4), 'tuned_r2': round(tuned['results'][name]['r2'], 4)}
+        if name in search:
+            entry.update(cv_r2=search[name]['cv_r2'], fits=search[name]['fits'],
+                         compute_seconds=search[name]['compute_seconds'], params=search[name]['params'])
+        results['models'][name] = entry
+        print(f"  {name:<18} r2 {entry['default_r2']:.4f} -> {entry['tuned_r2']:.4f}"
+              + (f"  ({entry['fits']} fits, {entry['compute_seconds']:.1f}s CPU)" if name in search else ''))
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,92 @@
+"""Time a what-if surface scored point by point, in one batch, and from a prediction grid.
+
+Run from the Cropyield2.0 directory:
+
+    python benchmarks/bench_whatif.py [--steps 100] [--json out.json]
+
+The surface sweeps fertilizer and water across their input ranges (the
+dashboard sliders' bounds) over --steps x --steps points. The
+point-by-point time is extrapolated from --sample single-row predictions.
+The grid is timed cold (built on first use) and warm, and its
+interpolated surface is compared against the exact one.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+
+import whatif
+from app import inference_engine, registry, train_models
+from dataset import NUMERIC_RANGES, load_dataset
+
+BASE = {'farm_area': 10.0, 'fertilizer': 200.0, 'pesticide': 20.0, 'water': 5000.0,
+        'crop': 'Rice', 'irrigation': 'Drip', 'soil': 'Loamy', 'season': 'Kharif'}
+
+
+def timed(fn, *args, **kwargs):
+    start = time.perf_counter()
+    result = fn(*args, **kwargs)
+    return time.perf_counter() - start, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--steps', type=int, default=100)
+    parser.add_argument('--sample', type=int, default=200)
+    parser.add_argument('--json', help='Write results to this file')
+    args = parser.parse_args()
+
+    snapshot = registry.get()
+    if snapshot is None:
+        train_models()
+        snapshot = registry.get()
+    data = load_dataset()
+    results, engine = snapshot.results, inference_engine(snapshot)
+
+    axes = [(field, np.linspace(*NUMERIC_RANGES[column], args.steps))
+            for field, column in (('fertilizer', 'Fertilizer_Used'), ('water', 'Water_Usage'))]
+    points = whatif.sweep_points(BASE, axes)
+    categories = [BASE[field] for field in whatif.CATEGORICAL_FIELDS]
+    whatif.score_points(results, data, categories, points[:1], engine, snapshot.classes)  # load the models
+
+    start = time.perf_counter()
+    for point in points[:args.sample]:
+        whatif.score_points(results, data, categories, point[None, :], engine, snapshot.classes)
+    per_point = (time.perf_counter() - start) / args.sample
+
+    exact_seconds, (_, exact) = timed(whatif.what_if, snapshot, results, data, BASE, axes, 'exact', engine)
+    whatif.grid_cache.clear()
+    cold_seconds, (source, grid) = timed(whatif.what_if, snapshot, results, data, BASE, axes, 'grid', engine)
+    warm_seconds, _ = timed(whatif.what_if, snapshot, results, data, BASE, axes, 'grid', engine)
+    assert source == 'grid'
+
+    error = np.abs(grid['average'] - exact['average'])
+    report = {
+        'points': len(points),
+        'point_by_point_seconds': per_point * len(points),
+        'exact_seconds': exact_seconds,
+        'grid_cold_seconds': cold_seconds,
+        'grid_warm_seconds': warm_seconds,
+        'grid_points': whatif.GRID_POINTS ** len(whatif.NUMERIC_FIELDS),
+        'max_abs_error': float(error.max()),
+        'mean_abs_error': float(error.mean()),
+        'output_range': float(np.ptp(exact['average']))
+    }
+    print(f"{len(points):,} points")
+    for key in ('point_by_point_seconds', 'exact_seconds', 'grid_cold_seconds', 'grid_warm_seconds'):
+        print(f"  {key.replace('_seconds', ''):<16} {report[key] * 1000:10.1f} ms")
+    print(f"  grid error       mean {report['mean_abs_error']:.4f}, max {report['max_abs_error']:.4f} "
+          f"(output range {report['output_range']:.2f})")
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
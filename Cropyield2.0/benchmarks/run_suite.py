@@ -0,0 +1,305 @@
+"""Run the benchmark suite and write one machine-readable JSON report.
+
+Run from the Cropyield2.0 directory:
+
+    python benchmarks/run_suite.py [--sizes 500,10000,100000] [--json report.json]
+    python benchmarks/run_suite.py --compare baseline.json report.json
+
+For every dataset size a synthetic dataset is made with generate_dataset(n)
+and the suite times model training (per model), single predictions through
+the /predict endpoint, batch scoring, and chart rendering. SQLite save and
+history throughput is measured once under concurrent simulated users. All
+of it runs offline in a temporary directory; the repo's own database,
+dataset and models are never touched.
+
+Every metric ending in _ms or _seconds is lower-is-better and every metric
+ending in _per_sec is higher-is-better, which is what --compare relies on.
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from importlib import metadata
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+PACKAGES = ['numpy', 'pandas', 'scikit-learn', 'xgboost', 'lightgbm', 'catboost', 'flask', 'matplotlib']
+BATCH_SIZES = [1, 100, 10_000]
+REQUEST = {
+    'farm_area': 10, 'fertilizer': 100, 'pesticide': 10, 'water': 5000,
+    'crop': 'Wheat', 'irrigation': 'Drip', 'soil': 'Loamy', 'season': 'Rabi'
+}
+
+
+def latency_summary(samples):
+    import numpy as np
+    ms = np.asarray(samples) * 1000
+    return {
+        'count': len(ms),
+        'mean_ms': round(float(ms.mean()), 3),
+        'p50_ms': round(float(np.percentile(ms, 50)), 3),
+        'p95_ms': round(float(np.percentile(ms, 95)), 3),
+        'p99_ms': round(float(np.percentile(ms, 99)), 3)
+    }
+
+
+def environment():
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT,
+                                capture_output=True, text=True).stdout.strip() or None
+    except OSError:
+        commit = None
+    versions = {}
+    for name in PACKAGES:
+        try:
+            versions[name] = metadata.version(name)
+        except metadata.PackageNotFoundError:
+            versions[name] = None
+    return {
+        'commit': commit,
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpus': os.cpu_count(),
+        'packages': versions
+    }
+
+
+# =====================================================
+# BENCHMARKS
+# =====================================================
+def bench_training(app_module, parallel):
+    start = time.perf_counter()
+    snapshot = app_module.train_models(parallel=parallel)
+    wall = time.perf_counter() - start
+    return snapshot, {
+        'parallel': parallel,
+        'wall_seconds': round(wall, 4),
+        'models': {
+            name: {
+                'fit_seconds': info['fit_seconds'],
+                'score_seconds': info['score_seconds'],
+                'r2': round(info['r2'], 4)
+            }
+            for name, info in snapshot.results.items()
+        }
+    }
+
+
+def bench_endpoint(client, requests):
+    """Latency of /predict; every request has new inputs so the cache never hits"""
+    samples = []
+    for i in range(requests):
+        body = dict(REQUEST, farm_area=1 + i % 49 + i / requests)
+        start = time.perf_counter()
+        response = client.post('/predict', json=body)
+        samples.append(time.perf_counter() - start)
+        if response.status_code != 200:
+            raise RuntimeError(f"/predict failed: {response.get_json()}")
+    return latency_summary(samples)
+
+
+def bench_batches(snapshot, data, repeat):
+    from inference import encode_features, predict_frame
+
+    source = data.df_raw.drop(columns=['Yield'])
+    out = {}
+    for n in BATCH_SIZES:
+        frame = source.sample(n=n, replace=True, random_state=0).reset_index(drop=True)
+        samples = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            predict_frame(snapshot.results, encode_features(frame, data))
+            samples.append(time.perf_counter() - start)
+        summary = latency_summary(samples)
+        summary['rows_per_sec'] = round(n / (summary['p50_ms'] / 1000), 1)
+        out[str(n)] = summary
+    return out
+
+
+def bench_charts(snapshot, data):
+    from charts import render_eda_chart, render_evaluation_chart
+    from eda_stats import load_eda_stats
+
+    start = time.perf_counter()
+    stats = load_eda_stats(data)
+    out = {'eda_stats_seconds': round(time.perf_counter() - start, 4)}
+    for name in ('crop_yield', 'soil_yield', 'correlation'):
+        start = time.perf_counter()
+        render_eda_chart(stats, name)
+        out[f'eda_{name}_seconds'] = round(time.perf_counter() - start, 4)
+    for name in snapshot.results:
+        start = time.perf_counter()
+        render_evaluation_chart(snapshot, name)
+        out[f"eval_{name.lower().replace(' ', '_')}_seconds"] = round(time.perf_counter() - start, 4)
+    return out
+
+
+def bench_size(app_module, client, n, args):
+    from dataset import generate_dataset, load_dataset
+    from schema import DATASET_PATH
+
+    start = time.perf_counter()
+    generate_dataset(n, DATASET_PATH)
+    result = {'rows': n, 'generate_seconds': round(time.perf_counter() - start, 4)}
+    start = time.perf_counter()
+    data = load_dataset()
+    result['load_seconds'] = round(time.perf_counter() - start, 4)
+
+    snapshot, result['training'] = bench_training(app_module, parallel=False)
+    if args.parallel_training:
+        snapshot, result['training_parallel'] = bench_training(app_module, parallel=True)
+    app_module.prediction_cache.clear()
+    result['predict_endpoint'] = bench_endpoint(client, args.requests)
+    result['predict_batch'] = bench_batches(snapshot, data, args.repeat)
+    result['charts'] = bench_charts(snapshot, data)
+    return result
+
+
+def bench_database(args):
+    from bench_database import insert_rate, run
+    from database import Database
+
+    db = Database(os.path.abspath('bench.db'))
+    result = run(db, args.users, args.db_seconds, write_ratio=0.5)
+    result['inserts'] = insert_rate(db, args.inserts)
+    return result
+
+
+def run_suite(args):
+    sizes = [int(s) for s in args.sizes.split(',')]
+    report = {'environment': environment(), 'args': vars(args), 'sizes': {}}
+
+    # app.py keeps its models, database and chart cache relative to the
+    # working directory, so the whole run happens in a scratch directory
+    os.environ['CHART_CACHE_DIR'] = ''
+    with tempfile.TemporaryDirectory() as tmp:
+        os.chdir(tmp)
+        import app as app_module
+
+        client = app_module.app.test_client()
+        client.post('/register', json={'username': 'bench', 'password': 'bench', 'email': 'bench@example.com'})
+        client.post('/login', json={'username': 'bench', 'password': 'bench'})
+
+        for n in sizes:
+            print(f"{n:,} rows ...", file=sys.stderr)
+            report['sizes'][str(n)] = bench_size(app_module, client, n, args)
+        if args.db_seconds > 0:
+            print("database ...", file=sys.stderr)
+            report['database'] = bench_database(args)
+        app_module.prediction_writer.close()
+        os.chdir(ROOT)
+    return report
+
+
+# =====================================================
+# REPORTING
+# =====================================================
+def flatten(tree, prefix=''):
+    out = {}
+    for key, value in tree.items():
+        path = f'{prefix}.{key}' if prefix else key
+        if isinstance(value, dict):
+            out.update(flatten(value, path))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            out[path] = value
+    return out
+
+
+def direction(metric):
+    """-1 if lower is better, +1 if higher is better, None if not a timing"""
+    name = metric.rsplit('.', 1)[-1]
+    if name.endswith('_ms') or name.endswith('_seconds'):
+        return -1
+    if name.endswith('_per_sec'):
+        return 1
+    return None
+
+
+def run_label(report):
+    """How --compare names a report: its commit, or its start time outside a
+    git checkout, and the dataset sizes it covers"""
+    env = report.get('environment', {})
+    name = env.get('commit') or env.get('timestamp') or 'unknown run'
+    sizes = ','.join(report.get('sizes', {})) or 'none'
+    return f"{name} (sizes {sizes})"
+
+
+def compare(baseline, current, threshold):
+    """Print every timing that changed by more than `threshold` (a fraction)"""
+    old = flatten({'sizes': baseline.get('sizes', {}), 'database': baseline.get('database', {})})
+    new = flatten({'sizes': current.get('sizes', {}), 'database': current.get('database', {})})
+    print(f"baseline {run_label(baseline)}  ->  current {run_label(current)}")
+    changed = 0
+    for metric in sorted(old.keys() & new.keys()):
+        sign = direction(metric)
+        if sign is None or not old[metric]:
+            continue
+        ratio = new[metric] / old[metric]
+        if abs(ratio - 1) < threshold:
+            continue
+        changed += 1
+        verdict = 'better' if (ratio - 1) * sign > 0 else 'WORSE'
+        print(f"  {metric:<70} {old[metric]:>12.4g} -> {new[metric]:>12.4g}  x{ratio:6.2f}  {verdict}")
+    if not changed:
+        print(f"  no timing changed by more than {threshold:.0%}")
+
+
+def print_summary(report):
+    for n, r in report['sizes'].items():
+        training = r['training']
+        endpoint = r['predict_endpoint']
+        print(f"{int(n):>10,} rows  train {training['wall_seconds']:7.2f} s  "
+              f"/predict p50 {endpoint['p50_ms']:6.2f} ms p99 {endpoint['p99_ms']:6.2f} ms  "
+              f"batch 10k {r['predict_batch']['10000']['p50_ms']:8.2f} ms")
+        for name, info in training['models'].items():
+            print(f"    {name:<18} fit {info['fit_seconds']:8.3f} s")
+    if 'database' in report:
+        db = report['database']
+        print(f"database  {db['users']} users: writes {db['writes']['ops_per_sec']} /s, "
+              f"reads {db['reads']['ops_per_sec']} /s; write-behind "
+              f"{db['inserts']['write_behind_rows_per_sec']} rows/s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', default='500,10000,100000',
+                        help='Comma-separated dataset sizes, e.g. 500,100000,2000000')
+    parser.add_argument('--requests', type=int, default=200, help='/predict calls per size')
+    parser.add_argument('--repeat', type=int, default=20, help='Repeats per batch size')
+    parser.add_argument('--parallel-training', action='store_true',
+                        help='Also time training with the process pool')
+    parser.add_argument('--users', type=int, default=8)
+    parser.add_argument('--db-seconds', type=float, default=5, help='0 skips the database run')
+    parser.add_argument('--inserts', type=int, default=10000)
+    parser.add_argument('--json', help='Write the report to this file')
+    parser.add_argument('--compare', nargs=2, metavar=('BASELINE', 'CURRENT'),
+                        help='Compare two reports instead of running')
+    parser.add_argument('--threshold', type=float, default=0.1,
+                        help='Relative change --compare reports (default 10%%)')
+    args = parser.parse_args()
+
+    if args.compare:
+        with open(args.compare[0]) as f:
+            baseline = json.load(f)
+        with open(args.compare[1]) as f:
+            current = json.load(f)
+        compare(baseline, current, args.threshold)
+        return
+
+    if args.json:
+        args.json = os.path.abspath(args.json)
+    report = run_suite(args)
+    print_summary(report)
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,104 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+
+
+class LRUCache:
+    """Thread-safe least-recently-used cache, with optional expiry after `ttl` seconds"""
+
+    def __init__(self, maxsize=128, ttl=None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, default=None):
+        with self._lock:
+            if key in self._data:
+                expires_at, value = self._data[key]
+                if expires_at is None or expires_at > time.monotonic():
+                    self._data.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._data[key]
+            self.misses += 1
+            return default
+
+    def put(self, key, value):
+        expires_at = time.monotonic() + self.ttl if self.ttl else None
+        with self._lock:
+            self._data[key] = (expires_at, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+    def stats(self):
+        return {
+            'size': len(self._data),
+            'maxsize': self.maxsize,
+            'ttl': self.ttl,
+            'hits': self.hits,
+            'misses': self.misses
+        }
+
+
+class ChartCache(LRUCache):
+    """LRU cache of rendered PNG bytes, optionally persisted to `directory`.
+
+    Keys are content-addressed (they embed the dataset and model versions),
+    so a file on disk never goes stale and other workers can reuse it.
+    """
+
+    def __init__(self, maxsize=64, directory=None):
+        super().__init__(maxsize)
+        self.directory = directory
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key):
+        return os.path.join(self.directory, f'{key}.png')
+
+    def get(self, key, default=None):
+        png = super().get(key)
+        if png is not None or not self.directory:
+            return default if png is None else png
+        try:
+            with open(self._path(key), 'rb') as f:
+                png = f.read()
+        except FileNotFoundError:
+            return default
+        super().put(key, png)
+        return png
+
+    def put(self, key, value):
+        super().put(key, value)
+        if self.directory:
+            tmp_path = f'{self._path(key)}.{os.getpid()}.tmp'
+            with open(tmp_path, 'wb') as f:
+                f.write(value)
+            os.replace(tmp_path, self._path(key))
+            self._prune()
+
+    def _prune(self):
+        files = [
+            os.path.join(self.directory, name)
+            for name in os.listdir(self.directory) if name.endswith('.png')
+        ]
+        if len(files) <= self.maxsize:
+            return
+        files.sort(key=os.path.getmtime)
+        for path in files[:len(files) - self.maxsize]:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
@@ -0,0 +1,67 @@
+import io
+
+import matplotlib
+matplotlib.use('Agg')
+import matplotlib.pyplot as plt
+import pandas as pd
+import seaborn as sns
+
+from metrics import span
+
+# =====================================================
+# CHART RENDERING
+# =====================================================
+def render_eda_chart(stats, name):
+    """Render an EDA chart from precomputed EdaStats, without touching the rows"""
+    if name == 'crop_yield':
+        # Chart 1: Crop Type vs Yield (mean with 95% confidence interval)
+        fig, ax = plt.subplots(figsize=(8, 5))
+        crops, _, means, ci = zip(*stats.crop_yield())
+        ax.bar(crops, means, yerr=ci, color=sns.color_palette(n_colors=len(crops)),
+               error_kw={'ecolor': '0.26', 'elinewidth': 2.5})
+        ax.set_xlabel("Crop_Type")
+        ax.set_ylabel("Yield")
+        ax.set_title("Yield by Crop Type")
+    elif name == 'soil_yield':
+        # Chart 2: Soil Type vs Yield
+        fig, ax = plt.subplots(figsize=(8, 5))
+        boxes = stats.soil_boxes()
+        artists = ax.bxp(boxes, showfliers=False, patch_artist=True,
+                         medianprops={'color': '0.26'})
+        for patch, color in zip(artists['boxes'], sns.color_palette(n_colors=len(boxes))):
+            patch.set_facecolor(color)
+        ax.set_xlabel("Soil_Type")
+        ax.set_ylabel("Yield")
+        ax.set_title("Yield Distribution by Soil Type")
+    else:
+        # Chart 3: Correlation Heatmap
+        fig, ax = plt.subplots(figsize=(8, 6))
+        columns, corr = stats.correlation()
+        sns.heatmap(
+            pd.DataFrame(corr, index=columns, columns=columns),
+            annot=True, cmap="coolwarm", ax=ax
+        )
+        ax.set_title("Feature Correlation")
+    return fig_to_png(fig)
+
+def render_evaluation_chart(snapshot, name):
+    info = snapshot.results[name]
+    y_test = snapshot.y_test
+    y_pred = info['model'].predict(snapshot.X_test)
+    
+    fig, ax = plt.subplots(figsize=(6, 6))
+    ax.scatter(y_test, y_pred, alpha=0.6, s=50, color='steelblue')
+    ax.plot([y_test.min(), y_test.max()], [y_test.min(), y_test.max()], "r--", lw=2)
+    ax.set_xlabel("Actual Yield")
+    ax.set_ylabel("Predicted Yield")
+    ax.set_title(f"{name} - R²={info['r2']:.3f}")
+    return fig_to_png(fig)
+
+def fig_to_png(fig):
+    buf = io.BytesIO()
+    try:
+        with span("figure_encode"):
+            fig.savefig(buf, format='png', bbox_inches='tight')
+    finally:
+        plt.close(fig)
+    return buf.getvalue()
@@ -0,0 +1,319 @@
+import fcntl
+import hashlib
+import json
+import os
+import shutil
+import time
+import uuid
+
+import numpy as np
+import pandas as pd
+
+# Bytes hashed at each end of the imported part of the CSV to tell an
+# append (prefix unchanged) from an edit without rereading the whole file
+EDGE_BYTES = 1 << 16
+REMAP_ROWS = 1 << 22
+
+
+def code_dtype(n_categories):
+    """Smallest signed integer type for the codes, the same rule pandas uses,
+    so Categorical.from_codes wraps the stored array without copying"""
+    for dtype in (np.int8, np.int16, np.int32):
+        if n_categories < np.iinfo(dtype).max:
+            return np.dtype(dtype)
+    return np.dtype(np.int64)
+
+
+def edge_digest(path, size):
+    """Hash of the first and last EDGE_BYTES of the first `size` bytes of `path`"""
+    digest = hashlib.sha1(str(size).encode())
+    with open(path, 'rb') as f:
+        digest.update(f.read(min(size, EDGE_BYTES)))
+        f.seek(max(0, size - EDGE_BYTES))
+        digest.update(f.read(min(size, EDGE_BYTES)))
+    return digest.hexdigest()[:16]
+
+
+class _Prefix:
+    """File wrapper that stops after `limit` bytes, so rows appended while a
+    sync is running are left for the next one"""
+
+    def __init__(self, f, limit):
+        self.f = f
+        self.remaining = limit
+
+    def read(self, size=-1):
+        if size < 0 or size > self.remaining:
+            size = self.remaining
+        data = self.f.read(size)
+        self.remaining -= len(data)
+        return data
+
+
+class ColumnStore:
+    """The dataset in a typed columnar layout, one raw binary file per column.
+
+    Numeric columns are float64 and categorical columns are integer codes
+    into a sorted dictionary (the same codes a LabelEncoder would produce).
+    Readers memory-map the files, so opening the store costs nothing per
+    row and every worker shares the same page cache.
+
+    The layout is `<directory>/meta.json` plus `<directory>/<epoch>/<col>.bin`.
+    Appending rows extends the files of the current epoch in place; anything
+    that changes existing rows (a re-import, a new category value) writes a
+    new epoch directory and swaps meta.json, so open readers are unaffected.
+    """
+
+    def __init__(self, directory, categorical):
+        self.directory = directory
+        self.categorical = list(categorical)
+        self.meta_path = os.path.join(directory, 'meta.json')
+
+    # -------------------------------------------------
+    # Reading
+    # -------------------------------------------------
+    def meta(self):
+        try:
+            with open(self.meta_path) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    def meta_state(self):
+        try:
+            st = os.stat(self.meta_path)
+        except FileNotFoundError:
+            return None
+        return (st.st_mtime_ns, st.st_size)
+
+    def _column_path(self, epoch, name):
+        return os.path.join(self.directory, epoch, f'{name}.bin')
+
+    def open(self, meta=None):
+        """Read-only memory maps of every column, sized to the committed rows"""
+        meta = meta or self.meta()
+        arrays = {}
+        for name, dtype in meta['dtypes'].items():
+            if meta['rows'] == 0:
+                arrays[name] = np.zeros(0, dtype=dtype)
+            else:
+                arrays[name] = np.memmap(self._column_path(meta['epoch'], name), dtype=dtype,
+                                         mode='r', shape=(meta['rows'],))
+        return arrays
+
+    # -------------------------------------------------
+    # Writing
+    # -------------------------------------------------
+    def _lock(self):
+        os.makedirs(self.directory, exist_ok=True)
+        fd = os.open(os.path.join(self.directory, '.lock'), os.O_RDWR | os.O_CREAT, 0o644)
+        fcntl.flock(fd, fcntl.LOCK_EX)
+        return fd
+
+    def _commit(self, meta):
+        tmp_path = f'{self.meta_path}.{os.getpid()}.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(meta, f)
+        os.replace(tmp_path, self.meta_path)
+
+    def _parse(self, chunk, columns):
+        """Coerce a raw CSV chunk; rows with unparseable numbers are dropped"""
+        chunk = chunk[columns].copy()
+        for col in columns:
+            if col not in self.categorical:
+                chunk[col] = pd.to_numeric(chunk[col], errors='coerce')
+        return chunk.dropna()
+
+    def sync(self, csv_path, chunk_rows=1_000_000):
+        """Bring the store up to date with `csv_path`.
+
+        Rows appended to the CSV since the last sync are ingested on their
+        own; any other change re-imports the whole file. Returns the mode
+        used: 'unchanged', 'append' or 'import'.
+        """
+        fd = self._lock()
+        try:
+            meta = self.meta()
+            st = os.stat(csv_path)
+            state = [st.st_mtime_ns, st.st_size]
+            # A store written by create() has no source CSV to compare with
+            if meta is not None and meta['source'] is None:
+                meta = None
+            if meta is not None and meta['source']['state'] == state:
+                return 'unchanged'
+            if meta is not None and self._appended(meta, csv_path, st.st_size):
+                if self._append(meta, csv_path, state, chunk_rows):
+                    return 'append'
+            self._import(csv_path, state, chunk_rows)
+            return 'import'
+        finally:
+            fcntl.flock(fd, fcntl.LOCK_UN)
+            os.close(fd)
+
+    def create(self, chunks, columns, categories):
+        """Write a new epoch straight from `chunks`, dicts of column -> array.
+
+        Categorical columns must already be codes into the sorted lists in
+        `categories`. Used by the dataset generator, which produces columns
+        directly, so nothing is parsed. The store has no source CSV until
+        one is imported over it.
+        """
+        fd = self._lock()
+        try:
+            epoch = uuid.uuid4().hex[:12]
+            os.makedirs(os.path.join(self.directory, epoch))
+            dtypes = {
+                col: code_dtype(len(categories[col])) if col in self.categorical else np.dtype(np.float64)
+                for col in columns
+            }
+            files = {col: open(self._column_path(epoch, col), 'wb') for col in columns}
+            rows = 0
+            try:
+                for chunk in chunks:
+                    for col in columns:
+                        files[col].write(np.asarray(chunk[col]).astype(dtypes[col], copy=False).tobytes())
+                    rows += len(chunk[columns[0]])
+            finally:
+                for f in files.values():
+                    f.close()
+
+            self._commit({
+                'epoch': epoch,
+                'rows': rows,
+                'columns': list(columns),
+                'dtypes': {col: dtype.name for col, dtype in dtypes.items()},
+                'categories': {col: list(categories[col]) for col in self.categorical},
+                'source': None,
+                'updated_at': time.time()
+            })
+            self._remove_old_epochs(epoch)
+        finally:
+            fcntl.flock(fd, fcntl.LOCK_UN)
+            os.close(fd)
+
+    def _appended(self, meta, csv_path, size):
+        source = meta['source']
+        return size > source['bytes'] and edge_digest(csv_path, source['bytes']) == source['digest']
+
+    def _import(self, csv_path, state, chunk_rows):
+        header = list(pd.read_csv(csv_path, nrows=0).columns)
+        epoch = uuid.uuid4().hex[:12]
+        os.makedirs(os.path.join(self.directory, epoch))
+
+        # Codes are assigned in order of appearance while streaming, then
+        # remapped once at the end so the dictionary is sorted like
+        # LabelEncoder.classes_
+        seen = {col: {} for col in self.categorical}
+        files = {
+            col: open(self._column_path(epoch, col) + ('.tmp' if col in self.categorical else ''), 'wb')
+            for col in header
+        }
+        rows = 0
+        try:
+            with open(csv_path, 'rb') as f:
+                chunks = pd.read_csv(_Prefix(f, state[1]), chunksize=chunk_rows, float_precision='round_trip')
+                for chunk in chunks:
+                    chunk = self._parse(chunk, header)
+                    for col in header:
+                        if col in self.categorical:
+                            lookup = seen[col]
+                            for value in pd.unique(chunk[col].astype(str)):
+                                lookup.setdefault(value, len(lookup))
+                            values = chunk[col].astype(str).map(lookup).to_numpy(np.int64)
+                        else:
+                            values = chunk[col].to_numpy(np.float64)
+                        files[col].write(values.tobytes())
+                    rows += len(chunk)
+        finally:
+            for f in files.values():
+                f.close()
+
+        dtypes = {}
+        categories = {}
+        for col in header:
+            if col not in self.categorical:
+                dtypes[col] = 'float64'
+                continue
+            classes = sorted(seen[col])
+            remap = np.empty(max(1, len(classes)), dtype=np.int64)
+            for new_code, value in enumerate(classes):
+                remap[seen[col][value]] = new_code
+            path = self._column_path(epoch, col)
+            dtype = code_dtype(len(classes))
+            raw = np.memmap(path + '.tmp', dtype=np.int64, mode='r') if rows else np.zeros(0, np.int64)
+            with open(path, 'wb') as f:
+                for start in range(0, rows, REMAP_ROWS):
+                    f.write(remap[raw[start:start + REMAP_ROWS]].astype(dtype).tobytes())
+            del raw
+            os.remove(path + '.tmp')
+            dtypes[col] = dtype.name
+            categories[col] = classes
+
+        self._commit({
+            'epoch': epoch,
+            'rows': rows,
+            'columns': header,
+            'dtypes': dtypes,
+            'categories': categories,
+            'source': {'state': state, 'bytes': state[1], 'digest': edge_digest(csv_path, state[1])},
+            'updated_at': time.time()
+        })
+        self._remove_old_epochs(epoch)
+
+    def _append(self, meta, csv_path, state, chunk_rows):
+        """Ingest only the bytes after the last sync; False if the new rows
+        carry category values the dictionary doesn't have"""
+        header = meta['columns']
+        with open(csv_path, 'rb') as f:
+            f.seek(meta['source']['bytes'])
+            tail = _Prefix(f, state[1] - meta['source']['bytes'])
+            parts = [self._parse(chunk, header)
+                     for chunk in pd.read_csv(tail, header=None, names=header, chunksize=chunk_rows,
+                                             float_precision='round_trip')]
+        if not parts:
+            return False
+        tail = pd.concat(parts)
+        for col in self.categorical:
+            if not set(tail[col].astype(str).unique()) <= set(meta['categories'][col]):
+                return False
+
+        epoch = meta['epoch']
+        for col in header:
+            path = self._column_path(epoch, col)
+            dtype = np.dtype(meta['dtypes'][col])
+            if col in self.categorical:
+                values = pd.Categorical(tail[col].astype(str), categories=meta['categories'][col]).codes
+            else:
+                values = tail[col].to_numpy(np.float64)
+            with open(path, 'r+b' if os.path.exists(path) else 'wb') as f:
+                # Drop anything past the committed rows, left by an interrupted append
+                f.truncate(meta['rows'] * dtype.itemsize)
+                f.seek(0, os.SEEK_END)
+                f.write(values.astype(dtype).tobytes())
+
+        meta = dict(meta, rows=meta['rows'] + len(tail), updated_at=time.time())
+        meta['source'] = {'state': state, 'bytes': state[1], 'digest': edge_digest(csv_path, state[1])}
+        self._commit(meta)
+        return True
+
+    def _remove_old_epochs(self, keep):
+        # Readers that still map an old epoch keep their pages after unlink
+        for name in os.listdir(self.directory):
+            path = os.path.join(self.directory, name)
+            if name != keep and os.path.isdir(path):
+                shutil.rmtree(path, ignore_errors=True)
+
+    # -------------------------------------------------
+    # Export
+    # -------------------------------------------------
+    def iter_csv(self, chunk_rows=100_000):
+        """The dataset as CSV text, `chunk_rows` rows at a time"""
+        meta = self.meta()
+        arrays = self.open(meta)
+        for start in range(0, max(meta['rows'], 1), chunk_rows):
+            frame = pd.DataFrame({
+                col: (pd.Categorical.from_codes(arrays[col][start:start + chunk_rows], meta['categories'][col])
+                      if col in self.categorical else arrays[col][start:start + chunk_rows])
+                for col in meta['columns']
+            })
+            yield frame.to_csv(index=False, header=start == 0)
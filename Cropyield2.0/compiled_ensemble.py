@@ -0,0 +1,326 @@
+import json
+import os
+import tempfile
+
+import numpy as np
+
+# Rows scored per block; bounds the (rows x trees) node-index matrices
+BLOCK_ROWS = 4096
+
+
+# =====================================================
+# EXPORTERS
+# =====================================================
+# Each exporter turns one fitted model into plain arrays. Tree splits are
+# normalised to "go left if x <= threshold"; trees from libraries that
+# compare in float32 (sklearn, XGBoost, CatBoost) are flagged so they are
+# walked with the features rounded to float32 first, exactly as the library
+# itself does.
+
+def _sklearn_tree(tree):
+    return {
+        'feature': tree.feature,
+        'threshold': tree.threshold,
+        'left': tree.children_left,
+        'right': tree.children_right,
+        'value': tree.value[:, 0, 0]
+    }
+
+
+def _export_linear(model):
+    return {'kind': 'linear', 'coef': np.ravel(model.coef_), 'bias': float(np.ravel(model.intercept_)[0])}
+
+
+def _export_random_forest(model):
+    trees = [_sklearn_tree(est.tree_) for est in model.estimators_]
+    return {'kind': 'trees', 'trees': trees, 'float32': True, 'scale': 1.0 / len(trees), 'bias': 0.0}
+
+
+def _export_gradient_boosting(model):
+    if isinstance(model.init_, str):
+        bias = 0.0
+    elif hasattr(model.init_, 'constant_'):
+        bias = float(np.ravel(model.init_.constant_)[0])
+    else:
+        raise ValueError("Gradient Boosting init estimator cannot be compiled")
+    trees = [_sklearn_tree(est.tree_) for est in model.estimators_[:, 0]]
+    return {'kind': 'trees', 'trees': trees, 'float32': True, 'scale': model.learning_rate, 'bias': bias}
+
+
+def _export_xgboost(model):
+    raw = json.loads(model.get_booster().save_raw('json'))
+    learner = raw['learner']
+    base_score = float(learner['learner_model_param']['base_score'].strip('[]'))
+    trees_json = learner['gradient_booster']['model']['trees']
+    # predict() stops at the best iteration when early stopping was used
+    best = getattr(model, 'best_iteration', None)
+    if best is not None:
+        trees_json = trees_json[:best + 1]
+
+    trees = []
+    for tree in trees_json:
+        if any(tree['split_type']):
+            raise ValueError("XGBoost categorical splits cannot be compiled")
+        conditions = np.asarray(tree['split_conditions'], dtype=np.float32)
+        left = np.asarray(tree['left_children'])
+        # XGBoost goes left when x < t in float32, i.e. x <= the float just below t
+        threshold = np.nextafter(conditions, np.float32(-np.inf)).astype(np.float64)
+        trees.append({
+            'feature': np.asarray(tree['split_indices']),
+            'threshold': threshold,
+            'left': left,
+            'right': np.asarray(tree['right_children']),
+            'value': conditions.astype(np.float64)
+        })
+    return {'kind': 'trees', 'trees': trees, 'float32': True, 'scale': 1.0, 'bias': base_score}
+
+
+def _export_lightgbm(model):
+    dump = model.booster_.dump_model()
+    trees = []
+    for info in dump['tree_info']:
+        nodes = {'feature': [], 'threshold': [], 'left': [], 'right': [], 'value': []}
+
+        def visit(node):
+            index = len(nodes['feature'])
+            for column in nodes.values():
+                column.append(0)
+            if 'leaf_value' in node or 'split_feature' not in node:
+                nodes['left'][index] = nodes['right'][index] = -1
+                nodes['value'][index] = node.get('leaf_value', 0.0)
+                return index
+            if node['decision_type'] != '<=' or node['missing_type'] == 'Zero':
+                raise ValueError("LightGBM categorical or zero-as-missing splits cannot be compiled")
+            nodes['feature'][index] = node['split_feature']
+            nodes['threshold'][index] = node['threshold']
+            nodes['left'][index] = visit(node['left_child'])
+            nodes['right'][index] = visit(node['right_child'])
+            return index
+
+        visit(info['tree_structure'])
+        trees.append({key: np.asarray(values) for key, values in nodes.items()})
+    return {'kind': 'trees', 'trees': trees, 'float32': False, 'scale': 1.0, 'bias': 0.0}
+
+
+def _export_catboost(model):
+    fd, path = tempfile.mkstemp(suffix='.json')
+    os.close(fd)
+    try:
+        model.save_model(path, format='json')
+        with open(path) as f:
+            raw = json.load(f)
+    finally:
+        os.remove(path)
+
+    if raw['features_info'].get('categorical_features'):
+        raise ValueError("CatBoost categorical features cannot be compiled")
+    columns = [feature['flat_feature_index'] for feature in raw['features_info']['float_features']]
+    trees = raw['oblivious_trees']
+    depth = max(len(tree['splits']) for tree in trees)
+
+    # Shallower trees are padded with splits that are never taken (x > +inf)
+    features = np.zeros((len(trees), depth), dtype=np.intp)
+    borders = np.full((len(trees), depth), np.inf)
+    leaf_values = np.zeros((len(trees), 1 << depth))
+    for t, tree in enumerate(trees):
+        for d, split in enumerate(tree['splits']):
+            if split['split_type'] != 'FloatFeature':
+                raise ValueError("CatBoost non-float splits cannot be compiled")
+            features[t, d] = columns[split['float_feature_index']]
+            borders[t, d] = split['border']
+        leaf_values[t, :len(tree['leaf_values'])] = tree['leaf_values']
+
+    scale, bias = raw['scale_and_bias']
+    return {
+        'kind': 'oblivious',
+        'features': features,
+        'borders': borders,
+        'leaf_values': leaf_values,
+        'scale': float(scale),
+        'bias': float(np.ravel(bias)[0]) if np.size(bias) else 0.0
+    }
+
+
+EXPORTERS = {
+    'LinearRegression': _export_linear,
+    'RandomForestRegressor': _export_random_forest,
+    'GradientBoostingRegressor': _export_gradient_boosting,
+    'XGBRegressor': _export_xgboost,
+    'LGBMRegressor': _export_lightgbm,
+    'CatBoostRegressor': _export_catboost
+}
+
+
+# =====================================================
+# COMPILED ENSEMBLE
+# =====================================================
+class CompiledEnsemble:
+    """Every model of a trained ensemble as flat NumPy arrays.
+
+    All binary trees (Random Forest, Gradient Boosting, XGBoost, LightGBM)
+    share one node table with global child indices and leaves pointing at
+    themselves, so a batch is routed through every tree at once, one depth
+    level per step. Trees are ordered deepest first so shallow boosters drop
+    out of the walk once they have reached their leaves. CatBoost's
+    oblivious trees are evaluated with a single bit-index lookup per tree
+    and linear models with one matrix product.
+    """
+
+    def __init__(self, names, exports, n_features):
+        self.names = list(names)
+        self.n_features = n_features
+        n_models = len(self.names)
+        self.bias = np.zeros(n_models)
+
+        # Linear terms for every model as one (features x models) matrix
+        self.coef = np.zeros((n_features, n_models))
+
+        trees = []
+        oblivious = []
+        for m, export in enumerate(exports):
+            self.bias[m] = export['bias']
+            if export['kind'] == 'linear':
+                self.coef[:, m] = export['coef']
+            elif export['kind'] == 'oblivious':
+                oblivious.append((m, export))
+            else:
+                # float32 trees read the float32-rounded copy of the features,
+                # stored in columns n_features..2*n_features-1
+                column_offset = n_features if export['float32'] else 0
+                for tree in export['trees']:
+                    depth = _tree_depth(tree['left'], tree['right'])
+                    trees.append((depth, tree, column_offset, export['scale'], m))
+
+        # Deepest trees first, so level k only walks the first active[k] trees
+        trees.sort(key=lambda item: -item[0])
+        nodes = {'feature': [], 'threshold': [], 'children': [], 'value': []}
+        roots = []
+        offset = 0
+        for depth, tree, column_offset, _, _ in trees:
+            n_nodes = len(tree['left'])
+            leaf = tree['left'] < 0
+            self_index = np.arange(n_nodes)
+            nodes['feature'].append(np.where(leaf, 0, tree['feature']) + column_offset)
+            nodes['threshold'].append(np.where(leaf, np.inf, tree['threshold']))
+            nodes['children'].append(np.column_stack([
+                np.where(leaf, self_index, tree['left']),
+                np.where(leaf, self_index, tree['right'])
+            ]) + offset)
+            nodes['value'].append(np.where(leaf, tree['value'], 0.0))
+            roots.append(offset)
+            offset += n_nodes
+
+        self.feature = _concat(nodes['feature'], np.intp)
+        self.threshold = _concat(nodes['threshold'], np.float64)
+        self.children = _concat(nodes['children'], np.intp).reshape(-1, 2)
+        self.value = _concat(nodes['value'], np.float64)
+        self.roots = np.asarray(roots, dtype=np.intp)
+        depths = np.asarray([item[0] for item in trees], dtype=np.intp)
+        self.active = [int((depths > level).sum()) for level in range(depths.max(initial=0))]
+
+        # Per-tree weights as a (trees x models) matrix, so one product sums
+        # and scales every model's trees
+        self.tree_weights = np.zeros((len(trees), n_models))
+        for t, (_, _, _, scale, m) in enumerate(trees):
+            self.tree_weights[t, m] = scale
+
+        # Oblivious trees split on the float32 copy too
+        self.oblivious = [
+            (m, export['features'] + n_features, export['borders'], export['leaf_values'],
+             1 << np.arange(export['borders'].shape[1]), export['scale'])
+            for m, export in oblivious
+        ]
+
+    @property
+    def n_nodes(self):
+        return len(self.feature)
+
+    @property
+    def depth(self):
+        return len(self.active)
+
+    def nbytes(self):
+        arrays = [self.feature, self.threshold, self.children, self.value,
+                  self.roots, self.tree_weights, self.coef]
+        for _, features, borders, leaf_values, _, _ in self.oblivious:
+            arrays += [features, borders, leaf_values]
+        return sum(a.nbytes for a in arrays)
+
+    def _predict_block(self, X):
+        # Plain float64 features followed by the float32-rounded copy
+        Xcat = np.hstack([X, X.astype(np.float32).astype(np.float64)])
+        out = X @ self.coef + self.bias
+
+        if len(self.roots):
+            rows = np.arange(len(X))[:, None]
+            node = np.tile(self.roots, (len(X), 1))
+            for active in self.active:
+                current = node[:, :active]
+                go_right = Xcat[rows, self.feature[current]] > self.threshold[current]
+                node[:, :active] = self.children[current, go_right.view(np.uint8)]
+            out += self.value[node] @ self.tree_weights
+
+        for m, features, borders, leaf_values, bit_weights, scale in self.oblivious:
+            leaf = (Xcat[:, features] > borders) @ bit_weights
+            out[:, m] += scale * leaf_values[np.arange(len(leaf_values)), leaf].sum(axis=1)
+        return out
+
+    def predict_matrix(self, X):
+        """(rows x models) predictions for a 2-D feature array"""
+        X = np.asarray(X, dtype=np.float64)
+        if X.ndim != 2 or X.shape[1] != self.n_features:
+            raise ValueError(f"Expected {self.n_features} feature columns")
+        if np.isnan(X).any():
+            # Same as the native path: LinearRegression rejects missing values
+            raise ValueError("Input X contains NaN")
+        if len(X) <= BLOCK_ROWS:
+            return self._predict_block(X)
+        return np.vstack([
+            self._predict_block(X[start:start + BLOCK_ROWS])
+            for start in range(0, len(X), BLOCK_ROWS)
+        ])
+
+    def predict(self, features):
+        """Same output as inference.predict_frame: one array per model plus 'average'"""
+        matrix = self.predict_matrix(features)
+        predictions = {name: matrix[:, m] for m, name in enumerate(self.names)}
+        predictions['average'] = matrix.mean(axis=1)
+        return predictions
+
+
+def _concat(parts, dtype):
+    return np.concatenate(parts).astype(dtype) if parts else np.zeros(0, dtype=dtype)
+
+
+def _tree_depth(left, right):
+    depth = 0
+    level = [0]
+    while True:
+        level = [child for node in level if left[node] >= 0 for child in (left[node], right[node])]
+        if not level:
+            return depth
+        depth += 1
+
+
+def compile_ensemble(results, n_features):
+    """Export the fitted models from a train_models results dict.
+
+    Raises ValueError if any model uses a feature this exporter does not
+    reproduce (categorical splits, unknown model types).
+    """
+    exports = []
+    for name, info in results.items():
+        exporter = EXPORTERS.get(type(info['model']).__name__)
+        if exporter is None:
+            raise ValueError(f"No compiler for {name} ({type(info['model']).__name__})")
+        exports.append(exporter(info['model']))
+    return CompiledEnsemble(results, exports, n_features)
+
+
+def max_differences(engine, results, features):
+    """Largest absolute difference from each model's own predict()"""
+    from inference import predict_frame
+
+    expected = predict_frame(results, features)
+    actual = engine.predict(features)
+    return {name: float(np.max(np.abs(expected[name] - actual[name]))) for name in expected}
@@ -1,56 +1,150 @@
+import os
+import time
+import atexit
+import queue
 import sqlite3
 import hashlib
+import threading
+from contextlib import contextmanager
+
+import metrics
+
+
+INSERT_PREDICTION = """
+    INSERT INTO predictions (
+        user_id,
+        farm_area, fertilizer_used, pesticide_used, water_usage,
+        crop_type, irrigation_type, soil_type, season,
+        linear, random_forest, gradient_boost,
+        xgboost, lightgbm, catboost, average)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+"""
+
+
+class ConnectionPool:
+    """Small thread-safe pool of SQLite connections.
+
+    Connections are opened lazily up to `size` and reused, so each one keeps
+    its own prepared-statement cache and pragmas. The pool resets itself
+    after a fork, since SQLite handles must not cross processes.
+    """
+
+    def __init__(self, factory, size=8, timeout=10.0):
+        self.factory = factory
+        self.size = size
+        self.timeout = timeout
+        self._lock = threading.Lock()
+        self._reset()
+
+    def _reset(self):
+        self._idle = queue.LifoQueue()
+        self._created = 0
+        self._pid = os.getpid()
+
+    def _acquire(self):
+        with self._lock:
+            if self._pid != os.getpid():
+                self._reset()
+            try:
+                return self._idle.get_nowait()
+            except queue.Empty:
+                if self._created < self.size:
+                    self._created += 1
+                    return self.factory()
+        return self._idle.get(timeout=self.timeout)
+
+    @contextmanager
+    def connection(self):
+        conn = self._acquire()
+        try:
+            yield conn
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            if conn.in_transaction:
+                conn.rollback()
+            self._idle.put(conn)
 
 
 class Database:
-    def __init__(self, db_path="crop_yield.db"):
+    def __init__(self, db_path="crop_yield.db", pool_size=8):
         self.db_path = db_path
-        self.init_db()
+        self.pool = ConnectionPool(self.connect, size=pool_size)
+        # The schema is created on first use rather than at import time
+        self._ready = False
+        self._init_lock = threading.Lock()
 
     def connect(self):
-        return sqlite3.connect(self.db_path)
+        conn = sqlite3.connect(
+            self.db_path,
+            timeout=30,
+            check_same_thread=False,
+            cached_statements=256
+        )
+        # WAL lets readers run alongside the single writer; NORMAL sync is
+        # durable across application crashes and much cheaper per commit.
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute("PRAGMA busy_timeout=30000")
+        conn.execute("PRAGMA temp_store=MEMORY")
+        conn.execute("PRAGMA cache_size=-16000")
+        return conn
+
+    def connection(self):
+        if not self._ready:
+            with self._init_lock:
+                if not self._ready:
+                    self.init_db()
+                    self._ready = True
+        return self.pool.connection()
 
     def init_db(self):
-        conn = self.connect()
-        cur = conn.cursor()
-
-        # ✅ MODIFIED: Added email TEXT UNIQUE
-        cur.execute("""
-        CREATE TABLE IF NOT EXISTS users (
-            user_id INTEGER PRIMARY KEY AUTOINCREMENT,
-            username TEXT UNIQUE,
-            password_hash TEXT,
-            email UNIQUE
-        )
-        """)
-
-        # ✅ MODIFIED: Added created_at and FOREIGN KEY
-        cur.execute("""
-        CREATE TABLE IF NOT EXISTS predictions (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            user_id INTEGER,
-            farm_area REAL,
-            fertilizer_used REAL,
-            pesticide_used REAL,
-            water_usage REAL,
-            crop_type TEXT,
-            irrigation_type TEXT,
-            soil_type TEXT,
-            season TEXT,
-            linear REAL,
-            random_forest REAL,
-            gradient_boost REAL,
-            xgboost REAL,
-            lightgbm REAL,
-            catboost REAL,
-            average REAL,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            FOREIGN KEY(user_id) REFERENCES users(user_id)
-        )
-        """)
+        with self.pool.connection() as conn:
+            cur = conn.cursor()
+
+            # ✅ MODIFIED: Added email TEXT UNIQUE
+            cur.execute("""
+            CREATE TABLE IF NOT EXISTS users (
+                user_id INTEGER PRIMARY KEY AUTOINCREMENT,
+                username TEXT UNIQUE,
+                password_hash TEXT,
+                email UNIQUE
+            )
+            """)
+
+            # ✅ MODIFIED: Added created_at and FOREIGN KEY
+            cur.execute("""
+            CREATE TABLE IF NOT EXISTS predictions (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                user_id INTEGER,
+                farm_area REAL,
+                fertilizer_used REAL,
+                pesticide_used REAL,
+                water_usage REAL,
+                crop_type TEXT,
+                irrigation_type TEXT,
+                soil_type TEXT,
+                season TEXT,
+                linear REAL,
+                random_forest REAL,
+                gradient_boost REAL,
+                xgboost REAL,
+                lightgbm REAL,
+                catboost REAL,
+                average REAL,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                FOREIGN KEY(user_id) REFERENCES users(user_id)
+            )
+            """)
 
-        conn.commit()
-        conn.close()
+            # History is always read per user, newest first
+            cur.execute("""
+            CREATE INDEX IF NOT EXISTS idx_predictions_user_created
+            ON predictions(user_id, created_at)
+            """)
+
+            conn.commit()
 
     def hash(self, pwd):
         return hashlib.sha256(pwd.encode()).hexdigest()
@@ -59,13 +153,12 @@ class Database:
     def register_user(self, username, password, email):
         try:
             email = email.strip() if email else None  # Clean or None
-            conn = self.connect()
-            conn.execute(
-                "INSERT INTO users(username, password_hash, email) VALUES (?,?,?)",
-                (username, self.hash(password), email)
-            )
-            conn.commit()
-            conn.close()
+            with self.connection() as conn:
+                conn.execute(
+                    "INSERT INTO users(username, password_hash, email) VALUES (?,?,?)",
+                    (username, self.hash(password), email)
+                )
+                conn.commit()
             return True, "Registration successful"
         except sqlite3.IntegrityError as e:
             if "username" in str(e):
@@ -78,138 +171,280 @@ class Database:
     # ✅ MODIFIED: Better error handling
     def authenticate_user(self, username, password):
         try:
-            conn = self.connect()
-            cur = conn.cursor()
-            cur.execute(
-                "SELECT user_id FROM users WHERE username=? AND password_hash=?",
-                (username, self.hash(password))
-            )
-            row = cur.fetchone()
-            conn.close()
+            with self.connection() as conn:
+                row = conn.execute(
+                    "SELECT user_id FROM users WHERE username=? AND password_hash=?",
+                    (username, self.hash(password))
+                ).fetchone()
             return (True, row[0]) if row else (False, None)
         except Exception as e:
             return False, None
 
     # ✅ MODIFIED: Safe dictionary access with .get()
+    def prediction_row(self, user_id, params, preds):
+        return (
+            user_id,
+            float(params.get('farm_area', 0)),      # Safe float conversion
+            float(params.get('fertilizer', 0)),
+            float(params.get('pesticide', 0)),
+            float(params.get('water', 0)),
+            params.get('crop', ''),
+            params.get('irrigation', ''),
+            params.get('soil', ''),
+            params.get('season', ''),
+            float(preds.get('Linear Regression', 0)),
+            float(preds.get('Random Forest', 0)),
+            float(preds.get('Gradient Boosting', 0)),
+            float(preds.get('XGBoost', 0)),
+            float(preds.get('LightGBM', 0)),
+            float(preds.get('CatBoost', 0)),
+            float(preds.get('average', 0))
+        )
+
     def save_prediction(self, user_id, params, preds):
         try:
-            conn = self.connect()
-            conn.execute("""
-                INSERT INTO predictions (
-                    user_id, 
-                    farm_area, fertilizer_used, pesticide_used, water_usage,
-                    crop_type, irrigation_type, soil_type, season,
-                    linear, random_forest, gradient_boost, 
-                    xgboost, lightgbm, catboost, average)
-                 VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-            """, (
-                user_id,
-                float(params.get('farm_area', 0)),      # Safe float conversion
-                float(params.get('fertilizer', 0)),
-                float(params.get('pesticide', 0)),
-                float(params.get('water', 0)),
-                params.get('crop', ''),
-                params.get('irrigation', ''),
-                params.get('soil', ''),
-                params.get('season', ''),
-                float(preds.get('Linear Regression', 0)),
-                float(preds.get('Random Forest', 0)),
-                float(preds.get('Gradient Boosting', 0)),
-                float(preds.get('XGBoost', 0)),
-                float(preds.get('LightGBM', 0)),
-                float(preds.get('CatBoost', 0)),
-                float(preds.get('average', 0))
-            ))
-            conn.commit()
-            conn.close()
-            return True
+            return self.save_predictions([self.prediction_row(user_id, params, preds)])
         except Exception as e:
             print(f"Error saving prediction: {str(e)}")
             return False
+
+    def save_predictions(self, rows):
+        """Insert many prediction rows in a single transaction"""
+        with metrics.span("db_write"), self.connection() as conn:
+            conn.executemany(INSERT_PREDICTION, rows)
+            conn.commit()
+        metrics.inc("crop_db_rows_written_total", len(rows))
+        return True
+
     # ✅ MODIFIED: Fetch predictions in descending order
     def get_user_predictions(self, user_id):
         try:
-            conn = self.connect()
-            cur = conn.cursor()
-            cur.execute("SELECT * FROM predictions WHERE user_id=? ORDER BY created_at DESC", (user_id,))
-            cols = [c[0] for c in cur.description]
-            rows = [dict(zip(cols, r)) for r in cur.fetchall()]
-            conn.close()
-            return rows
+            with self.connection() as conn:
+                cur = conn.execute(
+                    "SELECT * FROM predictions WHERE user_id=? ORDER BY created_at DESC",
+                    (user_id,)
+                )
+                cols = [c[0] for c in cur.description]
+                return [dict(zip(cols, r)) for r in cur.fetchall()]
         except Exception as e:
             print(f"Error fetching predictions: {str(e)}")
             return []
 
+    def _predictions_page(self, user_id, limit, after=None):
+        """(column names, row tuples) of up to `limit` rows older than the
+        (created_at, id) key `after`, newest first"""
+        query = "SELECT * FROM predictions WHERE user_id=?"
+        args = [user_id]
+        if after is not None:
+            query += " AND (created_at, id) < (?, ?)"
+            args.extend(after)
+        query += " ORDER BY created_at DESC, id DESC LIMIT ?"
+        args.append(limit)
+
+        with self.connection() as conn:
+            cur = conn.execute(query, args)
+            return [c[0] for c in cur.description], cur.fetchall()
+
+    def get_user_predictions_page(self, user_id, limit=50, after=None):
+        """Return one page of history, newest first, and the key for the next page.
+
+        Pages are addressed by the (created_at, id) of the last row seen, so
+        each page is a range scan on idx_predictions_user_created no matter
+        how deep the user pages.
+        """
+        cols, rows = self._predictions_page(user_id, limit + 1, after)
+        rows = [dict(zip(cols, r)) for r in rows]
+
+        next_key = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            next_key = (rows[-1]['created_at'], rows[-1]['id'])
+        return rows, next_key
+
+    def iter_user_predictions(self, user_id, batch_size=1000):
+        """Stream a user's history in keyset pages.
+
+        Yields the column names first, then lists of row tuples, so an export
+        never holds more than `batch_size` rows in memory. Each page takes a
+        pooled connection only while it is read, so a slow client holds
+        neither a connection nor a read transaction (which would also block
+        WAL checkpoints) between pages.
+        """
+        cols, rows = self._predictions_page(user_id, batch_size)
+        yield cols
+        created_at, row_id = cols.index('created_at'), cols.index('id')
+        while rows:
+            yield rows
+            if len(rows) < batch_size:
+                break
+            cols, rows = self._predictions_page(user_id, batch_size, (rows[-1][created_at], rows[-1][row_id]))
+
     # ✅ NEW: Get user statistics
     def get_user_stats(self, user_id):
         try:
-            conn = self.connect()
-            cur = conn.cursor()
-            
-            cur.execute("SELECT COUNT(*) FROM predictions WHERE user_id=?", (user_id,))
-            total = cur.fetchone()[0]
-            
-            cur.execute("SELECT AVG(average) FROM predictions WHERE user_id=?", (user_id,))
-            avg = cur.fetchone()[0] or 0
-            
-            cur.execute("SELECT MAX(average) FROM predictions WHERE user_id=?", (user_id,))
-            max_val = cur.fetchone()[0] or 0
-            
-            cur.execute("SELECT MIN(average) FROM predictions WHERE user_id=?", (user_id,))
-            min_val = cur.fetchone()[0] or 0
-            
-            conn.close()
-            
+            with self.connection() as conn:
+                total, avg, max_val, min_val = conn.execute("""
+                    SELECT COUNT(*), AVG(average), MAX(average), MIN(average)
+                    FROM predictions WHERE user_id=?
+                """, (user_id,)).fetchone()
+
             return {
                 "total_predictions": total,
-                "average_yield": round(avg, 2),
-                "max_yield": round(max_val, 2),
-                "min_yield": round(min_val, 2)
+                "average_yield": round(avg or 0, 2),
+                "max_yield": round(max_val or 0, 2),
+                "min_yield": round(min_val or 0, 2)
             }
         except Exception as e:
             print(f"Error getting stats: {str(e)}")
             return {}
-    # ✅ ADD THESE TWO FUNCTIONS TO YOUR database.py
-
-def get_username_by_id(self, user_id):
-    """Get username from user_id"""
-    try:
-        conn = self.connect()
-        cur = conn.cursor()
-        cur.execute("SELECT username FROM users WHERE user_id=?", (user_id,))
-        row = cur.fetchone()
-        conn.close()
-        return row if row else None
-    except Exception as e:
-        return None
-
-def delete_user(self, user_id, password):
-    """Delete user account"""
-    try:
-        conn = self.connect()
-        cur = conn.cursor()
-        
-        # Verify password first
-        cur.execute("SELECT password_hash FROM users WHERE user_id=?", (user_id,))
-        row = cur.fetchone()
-        
-        if not row or row != self.hash(password):
-            conn.close()
-            return False, "Invalid password"
-        
-        # Delete predictions
-        cur.execute("DELETE FROM predictions WHERE user_id=?", (user_id,))
-        
-        # Delete user
-        cur.execute("DELETE FROM users WHERE user_id=?", (user_id,))
-        
-        conn.commit()
-        conn.close()
-        return True, "User deleted successfully"
-    except Exception as e:
-        return False, str(e)
 
+    def get_username_by_id(self, user_id):
+        """Get username from user_id"""
+        try:
+            with self.connection() as conn:
+                row = conn.execute("SELECT username FROM users WHERE user_id=?", (user_id,)).fetchone()
+            return row[0] if row else None
+        except Exception as e:
+            return None
+
+    def delete_user(self, user_id, password):
+        """Delete user account"""
+        try:
+            with self.connection() as conn:
+                cur = conn.cursor()
+
+                # Verify password first
+                cur.execute("SELECT password_hash FROM users WHERE user_id=?", (user_id,))
+                row = cur.fetchone()
+
+                if not row or row[0] != self.hash(password):
+                    return False, "Invalid password"
+
+                # Delete predictions
+                cur.execute("DELETE FROM predictions WHERE user_id=?", (user_id,))
+
+                # Delete user
+                cur.execute("DELETE FROM users WHERE user_id=?", (user_id,))
+
+                conn.commit()
+            return True, "User deleted successfully"
+        except Exception as e:
+            return False, str(e)
+
+
+
+class PredictionWriter:
+    """Write-behind queue for saved predictions.
+
+    Rows are buffered and inserted with executemany in one transaction once
+    `batch_size` rows are waiting or `flush_interval` seconds have passed, so
+    many saves share one commit. Pending rows are flushed at interpreter
+    exit; a hard kill can still lose whatever is in the queue.
+    """
+
+    def __init__(self, db, batch_size=500, flush_interval=0.5, retries=3, flush_timeout=5.0):
+        self.db = db
+        self.flush_timeout = flush_timeout
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.retries = retries
+        self._lock = threading.Lock()
+        self._queue = queue.Queue()
+        # Rows are numbered as they are queued; flush() waits for a number
+        self._written_cond = threading.Condition()
+        self._submitted = 0
+        self._written = 0
+        self._thread = None
+        self._pid = None
+        atexit.register(self.close)
+
+    def _ensure_thread(self):
+        with self._lock:
+            # Threads don't survive a fork, so each worker starts its own
+            if self._pid != os.getpid():
+                self._pid = os.getpid()
+                self._queue = queue.Queue()
+                self._written_cond = threading.Condition()
+                self._submitted = self._written = 0
+                self._thread = None
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, daemon=True)
+                self._thread.start()
+
+    def submit(self, user_id, params, preds):
+        self._ensure_thread()
+        row = self.db.prediction_row(user_id, params, preds)
+        # Numbered and queued together, so rows are written in number order
+        with self._written_cond:
+            self._submitted += 1
+            self._queue.put((self._submitted, row))
+
+    def _run(self):
+        while True:
+            rows = [self._queue.get()]
+            deadline = time.monotonic() + self.flush_interval
+            while rows[-1] is not None and len(rows) < self.batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    rows.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+
+            stop = rows[-1] is None
+            batch = [row for _, row in rows[:-1 if stop else None]]
+            if batch:
+                self._write(batch)
+                with self._written_cond:
+                    self._written = rows[len(batch) - 1][0]
+                    self._written_cond.notify_all()
+            if stop:
+                return
+
+    def _write(self, batch):
+        for attempt in range(self.retries):
+            try:
+                self.db.save_predictions(batch)
+                return
+            except Exception as e:
+                print(f"Error saving {len(batch)} predictions (attempt {attempt + 1}): {str(e)}")
+                time.sleep(0.1 * (attempt + 1))
+        print(f"Dropped {len(batch)} predictions after {self.retries} attempts")
+
+    def flush(self):
+        """Block until every row submitted before this call has been written.
+
+        Rows queued meanwhile, e.g. other users' saves, are not waited for,
+        so a steady stream of saves can't hold up the caller. Gives up after
+        `flush_timeout` seconds (e.g. while SQLite stays locked) or if the
+        writer thread has died; returns False then, and callers read what
+        is already committed.
+        """
+        thread = self._thread
+        if thread is None or self._pid != os.getpid():
+            return True
+        with self._written_cond:
+            target = self._submitted
+            if self._written >= target:
+                return True
+            if not thread.is_alive():
+                print(f"Prediction writer is not running; {target - self._written} rows not written")
+                return False
+            if not self._written_cond.wait_for(lambda: self._written >= target, timeout=self.flush_timeout):
+                print(f"Timed out after {self.flush_timeout}s waiting for {target - self._written} prediction rows")
+                return False
+        return True
+
+    def close(self):
+        with self._lock:
+            thread = self._thread if self._pid == os.getpid() else None
+            self._thread = None
+        if thread is not None:
+            self._queue.put(None)
+            thread.join()
 
 
 # ✅ NEW: Global database instance
 db = Database()
+prediction_writer = PredictionWriter(db)
@@ -0,0 +1,231 @@
+import os
+import threading
+
+import numpy as np
+import pandas as pd
+from sklearn.preprocessing import LabelEncoder
+
+from column_store import ColumnStore
+from schema import DATASET_PATH, CATEGORICAL_COLUMNS, NUMERIC_COLUMNS, TARGET
+
+# =====================================================
+# DATASET GENERATION
+# =====================================================
+# Uniform ranges of the numeric inputs and their weight in the yield formula
+NUMERIC_RANGES = {
+    "Farm_Area": (1, 50),
+    "Fertilizer_Used": (50, 500),
+    "Pesticide_Used": (5, 50),
+    "Water_Usage": (1000, 10000)
+}
+YIELD_WEIGHTS = {
+    "Farm_Area": 0.1,
+    "Fertilizer_Used": 0.015,
+    "Pesticide_Used": -0.05,
+    "Water_Usage": 0.0005
+}
+# Category values, sorted like the column store codes them, and their yield effect
+CATEGORY_EFFECTS = {
+    "Crop_Type": {"Cotton": 2.0, "Rice": 3.0, "Wheat": 2.5},
+    "Irrigation_Type": {"Drip": 1.5, "Flood": 0.8, "Manual": 1.0},
+    "Soil_Type": {"Clay": 1.1, "Loamy": 1.4, "Sandy": 0.9},
+    "Season": {"Kharif": 0.0, "Rabi": 0.0, "Zaid": 0.0}
+}
+GENERATE_CHUNK_ROWS = 1 << 18
+
+def generate_chunk(rows, seed, index):
+    """Chunk `index` of the synthetic dataset as {column: array}.
+
+    Each chunk draws from its own stream spawned from `seed`, so chunks can
+    be made in any order or process and still come out the same. The
+    categorical columns are int8 codes into CATEGORY_EFFECTS.
+    """
+    rng = np.random.default_rng(np.random.SeedSequence(seed, spawn_key=(index,)))
+    columns = {}
+    yield_ = np.zeros(rows)
+    for col in NUMERIC_COLUMNS:
+        low, high = NUMERIC_RANGES[col]
+        columns[col] = rng.uniform(low, high, rows)
+        yield_ += YIELD_WEIGHTS[col] * columns[col]
+    for col in CATEGORICAL_COLUMNS:
+        effects = CATEGORY_EFFECTS[col]
+        columns[col] = rng.integers(0, len(effects), rows, dtype=np.int8)
+        yield_ += np.fromiter(effects.values(), dtype=float)[columns[col]]
+    yield_ += rng.normal(0, 1, rows)
+    columns[TARGET] = yield_
+    return columns
+
+def chunk_csv(columns, header=False):
+    """CSV text of a generated chunk.
+
+    Same bytes as DataFrame.to_csv (floats as their shortest repr), built
+    by joining strings directly, which is about 2.5x faster.
+    """
+    fields = []
+    for col, values in columns.items():
+        if col in CATEGORY_EFFECTS:
+            fields.append(np.asarray(list(CATEGORY_EFFECTS[col]), dtype=object)[values].tolist())
+        else:
+            fields.append(list(map(repr, values.tolist())))
+    lines = [",".join(columns)] if header else []
+    lines.extend(",".join(row) for row in zip(*fields))
+    return "\n".join(lines) + "\n" if lines else ""
+
+def _generate_csv_chunk(rows, seed, index):
+    return chunk_csv(generate_chunk(rows, seed, index), header=index == 0).encode()
+
+def _ordered_map(fn, tasks, workers):
+    """fn(*task) for each task, in order, with at most 2 * workers in flight"""
+    if workers <= 1:
+        for task in tasks:
+            yield fn(*task)
+        return
+    
+    from collections import deque
+    from concurrent.futures import ProcessPoolExecutor
+    import multiprocessing
+    
+    method = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context(method)) as pool:
+        pending = deque()
+        for task in tasks:
+            pending.append(pool.submit(fn, *task))
+            if len(pending) >= 2 * workers:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+def generate_dataset(n=500, path=DATASET_PATH, seed=42, fmt="csv", workers=1,
+                     chunk_rows=GENERATE_CHUNK_ROWS):
+    """Write `n` synthetic rows and return `n`.
+
+    Rows are produced `chunk_rows` at a time, so memory stays constant
+    however large `n` is, and with `workers` > 1 chunks are generated (and
+    formatted as CSV) in parallel processes. The output depends only on
+    `seed` and `chunk_rows`, not on `workers`.
+
+    `fmt` is "csv" to write the CSV at `path`, or "columns" to write the
+    column store next to it directly, skipping CSV formatting and parsing
+    entirely; Dataset(path) opens such a store as long as there is no CSV
+    at `path`.
+    """
+    tasks = [
+        (min(chunk_rows, n - start), seed, index)
+        for index, start in enumerate(range(0, n, chunk_rows))
+    ]
+    
+    if fmt == "columns":
+        store = ColumnStore(store_directory(path), CATEGORICAL_COLUMNS)
+        store.create(_ordered_map(generate_chunk, tasks, workers),
+                     NUMERIC_COLUMNS + CATEGORICAL_COLUMNS + [TARGET],
+                     {col: list(effects) for col, effects in CATEGORY_EFFECTS.items()})
+        return n
+    if fmt != "csv":
+        raise ValueError(f"Unknown format: {fmt}")
+    
+    # Written under a temporary name, so readers never see a partial file
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as f:
+        if not tasks:
+            f.write(chunk_csv(generate_chunk(0, seed, 0), header=True).encode())
+        for text in _ordered_map(_generate_csv_chunk, tasks, workers):
+            f.write(text)
+    os.replace(tmp_path, path)
+    return n
+
+def store_directory(path):
+    """Where the columnar copy of the CSV at `path` lives"""
+    return os.path.splitext(path)[0] + ".columns"
+
+def file_state(path):
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return (st.st_mtime_ns, st.st_size)
+
+# =====================================================
+# DATASET LOADING
+# =====================================================
+class Dataset:
+    """The training data in raw (`df_raw`) and encoded (`X`, `y`) form.
+
+    The CSV is only an import/export format: it is ingested into a
+    ColumnStore, and every frame here is a zero-copy view over the store's
+    memory-mapped columns. `df_raw` holds the categoricals as pandas
+    Categoricals and `X` as their integer codes, which are the same arrays.
+    """
+
+    def __init__(self, path=DATASET_PATH):
+        self.path = path
+        self.store = ColumnStore(store_directory(path), CATEGORICAL_COLUMNS)
+        if not os.path.exists(path) and self.store.meta() is None:
+            generate_dataset(path=path)
+        
+        # Without a CSV (a store written by generate_dataset(fmt="columns"))
+        # the store is used as it is
+        self.csv_state = file_state(path)
+        if self.csv_state is not None:
+            self.store.sync(path)
+        self.store_state = self.store.meta_state()
+        meta = self.store.meta()
+        columns = self.store.open(meta)
+        
+        self.epoch = meta["epoch"]
+        self.rows = meta["rows"]
+        self.version = f"{self.epoch}-{self.rows:x}"
+        
+        # Encoders carry the store's sorted dictionaries, so their codes are
+        # the stored codes
+        self.encoders = {}
+        for col in CATEGORICAL_COLUMNS:
+            le = LabelEncoder()
+            le.classes_ = np.asarray(meta["categories"][col], dtype=object)
+            self.encoders[col] = le
+        
+        features = [col for col in meta["columns"] if col != TARGET]
+        self.X = pd.DataFrame({col: columns[col] for col in features}, copy=False)
+        self.y = pd.Series(columns[TARGET], name=TARGET, copy=False)
+        self.df_raw = pd.DataFrame({
+            col: pd.Categorical.from_codes(columns[col], self.encoders[col].classes_, validate=False)
+            if col in self.encoders else columns[col]
+            for col in meta["columns"]
+        }, copy=False)
+    
+    def stale(self):
+        """True once the CSV or the store has changed since this was loaded"""
+        return file_state(self.path) != self.csv_state or self.store.meta_state() != self.store_state
+    
+    def iter_csv(self, chunk_rows=100_000):
+        """Export the dataset as CSV text, one chunk at a time"""
+        return self.store.iter_csv(chunk_rows)
+
+_dataset = None
+_dataset_lock = threading.Lock()
+
+def load_dataset():
+    """Return the process-wide Dataset, ingesting the CSV on first use.
+
+    New rows appended to the CSV are added to the column store and picked
+    up here on the next call.
+    """
+    global _dataset
+    data = _dataset
+    if data is None or data.stale():
+        with _dataset_lock:
+            if _dataset is data:
+                _dataset = Dataset()
+            data = _dataset
+    return data
+
+if __name__ == "__main__":
+    import argparse
+    
+    parser = argparse.ArgumentParser(description="Generate a synthetic crop yield dataset")
+    parser.add_argument("rows", type=int)
+    parser.add_argument("--path", default=DATASET_PATH)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--format", choices=["csv", "columns"], default="csv")
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    args = parser.parse_args()
+    generate_dataset(args.rows, args.path, args.seed, args.format, args.workers)
@@ -0,0 +1,266 @@
+import base64
+import json
+import threading
+
+import numpy as np
+
+from cache import LRUCache
+from schema import CATEGORICAL_COLUMNS, FORM_FIELDS, TARGET
+
+# Query parameter name -> dataset column; dataset column names work too
+QUERY_FIELDS = dict(FORM_FIELDS, **{"yield": TARGET})
+DEFAULT_LIMIT = 100
+MAX_LIMIT = 1000
+
+
+# =====================================================
+# QUERY PARSING
+# =====================================================
+def resolve_column(name, columns):
+    column = QUERY_FIELDS.get(name, name)
+    if column not in columns:
+        raise ValueError(f"Unknown column: {name}")
+    return column
+
+def parse_query(args, columns):
+    """Normalise request args into a query spec; raises ValueError if invalid.
+
+    crop=Rice,Wheat&soil=Clay         category filters (any of the values)
+    farm_area_min=5&water_max=4000    numeric ranges, inclusive
+    sort=-yield                       sort column, '-' for descending
+    columns=crop,yield                projection
+    limit=100&offset=0 or cursor=...  offset or keyset pagination
+    """
+    filters, ranges = {}, {}
+    for key, value in args.items():
+        if key.endswith("_min") or key.endswith("_max"):
+            column = resolve_column(key[:-4], columns)
+            if column in CATEGORICAL_COLUMNS:
+                raise ValueError(f"{key}: {column} is not numeric")
+            bounds = ranges.setdefault(column, [None, None])
+            try:
+                bounds[key.endswith("_max")] = float(value)
+            except ValueError:
+                raise ValueError(f"{key} must be a number")
+        elif QUERY_FIELDS.get(key, key) in CATEGORICAL_COLUMNS:
+            filters[QUERY_FIELDS.get(key, key)] = sorted(set(v.strip() for v in value.split(",")))
+
+    sort, descending = args.get("sort"), False
+    if sort:
+        descending = sort.startswith("-")
+        sort = resolve_column(sort.lstrip("-"), columns)
+
+    projection = args.get("columns")
+    projection = [resolve_column(c.strip(), columns) for c in projection.split(",")] if projection else list(columns)
+
+    try:
+        limit = min(max(int(args.get("limit", DEFAULT_LIMIT)), 1), MAX_LIMIT)
+        offset = max(int(args.get("offset", 0)), 0)
+    except ValueError:
+        raise ValueError("limit and offset must be integers")
+
+    return {
+        "filters": filters,
+        "ranges": {col: ranges[col] for col in sorted(ranges)},
+        "sort": sort,
+        "descending": descending,
+        "columns": projection,
+        "limit": limit,
+        "offset": offset,
+        "cursor": decode_cursor(args.get("cursor"))
+    }
+
+def encode_cursor(key, row):
+    return base64.urlsafe_b64encode(json.dumps([key, row]).encode()).decode()
+
+def decode_cursor(token):
+    if not token:
+        return None
+    try:
+        key, row = json.loads(base64.urlsafe_b64decode(token.encode()))
+        return (None if key is None else float(key), int(row))
+    except Exception:
+        raise ValueError("Invalid cursor")
+
+
+# =====================================================
+# INDEXES
+# =====================================================
+class CategoryIndex:
+    """Sorted row positions for every value of every categorical column.
+
+    Built with one stable argsort per column. An index is never modified
+    once built, since queries over an older Dataset may still be reading
+    it; extended() returns a new index with the appended rows added to the
+    ends of the lists, which keeps them sorted.
+    """
+
+    def __init__(self, data):
+        self.epoch = data.epoch
+        self.rows = data.rows
+        self.postings = {}
+        for col in CATEGORICAL_COLUMNS:
+            codes = data.X[col].to_numpy()
+            order = np.argsort(codes, kind="stable")
+            bounds = np.concatenate([[0], np.cumsum(np.bincount(codes, minlength=len(data.encoders[col].classes_)))])
+            self.postings[col] = [order[bounds[i]:bounds[i + 1]] for i in range(len(bounds) - 1)]
+
+    def extended(self, data):
+        """A new index that also covers the rows appended since this one was built"""
+        index = object.__new__(CategoryIndex)
+        index.epoch = self.epoch
+        index.rows = data.rows
+        index.postings = {}
+        for col in CATEGORICAL_COLUMNS:
+            codes = data.X[col].to_numpy()[self.rows:data.rows]
+            postings = index.postings[col] = list(self.postings[col])
+            for code, positions in enumerate(postings):
+                new = np.flatnonzero(codes == code) + self.rows
+                if len(new):
+                    # A new array; this index's lists are left as they are
+                    postings[code] = np.concatenate([positions, new])
+        return index
+
+    def rows_for(self, col, codes):
+        """Sorted rows whose `col` is any of `codes`"""
+        if len(codes) == 1:
+            return self.postings[col][codes[0]]
+        return np.sort(np.concatenate([self.postings[col][code] for code in codes]))
+
+
+class DatasetQuery:
+    """Filtered, sorted, paginated reads over one Dataset.
+
+    Category filters are answered from the CategoryIndex and numeric ranges
+    from a sorted index of the column, so a page costs O(matching rows)
+    at most, never a scan and serialisation of the whole frame. The ordered
+    row ids of recent queries are cached, so later pages are O(page size).
+    """
+
+    def __init__(self, data, index):
+        self.data = data
+        self.index = index
+        self.columns = list(data.df_raw.columns)
+        self._values = {col: data.df_raw[col].array for col in self.columns}
+        self._sorted = {}
+        self._sorted_lock = threading.Lock()
+        self.orders = LRUCache(maxsize=16)
+
+    def values(self, col):
+        """Numeric values, or category codes, of `col` as a NumPy array"""
+        array = self._values[col]
+        return array.codes if col in CATEGORICAL_COLUMNS else np.asarray(array)
+
+    def sorted_index(self, col):
+        """(rows ordered by `col`, the values in that order), built on first use"""
+        with self._sorted_lock:
+            if col not in self._sorted:
+                values = self.values(col)
+                order = np.argsort(values, kind="stable")
+                self._sorted[col] = (order, values[order])
+            return self._sorted[col]
+
+    def _candidates(self, spec):
+        """Sorted row ids matching the filters, or None for every row"""
+        rows = None
+        for col, wanted in spec["filters"].items():
+            classes = list(self.data.encoders[col].classes_)
+            codes = [classes.index(value) for value in wanted if value in classes]
+            matched = self.index.rows_for(col, codes) if codes else np.zeros(0, dtype=np.int64)
+            rows = matched if rows is None else np.intersect1d(rows, matched, assume_unique=True)
+
+        for col, (low, high) in spec["ranges"].items():
+            low = -np.inf if low is None else low
+            high = np.inf if high is None else high
+            if rows is None:
+                order, values = self.sorted_index(col)
+                start = np.searchsorted(values, low, side="left")
+                end = np.searchsorted(values, high, side="right")
+                rows = np.sort(order[start:end])
+            else:
+                values = self.values(col)[rows]
+                rows = rows[(values >= low) & (values <= high)]
+        return rows
+
+    def _ordered(self, spec):
+        """(row ids in result order, sort keys in that order or None)"""
+        cache_key = json.dumps([self.data.version, spec["filters"], spec["ranges"],
+                                spec["sort"], spec["descending"]])
+        cached = self.orders.get(cache_key)
+        if cached is not None:
+            return cached
+
+        rows = self._candidates(spec)
+        col = spec["sort"]
+        if col is None:
+            result = (rows, None)
+        else:
+            sign = -1.0 if spec["descending"] else 1.0
+            if rows is None and not spec["descending"]:
+                result = self.sorted_index(col)
+            else:
+                rows = np.arange(self.data.rows) if rows is None else rows
+                # Stable sort on the (negated) keys keeps ties in row order
+                keys = sign * self.values(col)[rows].astype(float)
+                order = np.argsort(keys, kind="stable")
+                result = (rows[order], keys[order])
+        self.orders.put(cache_key, result)
+        return result
+
+    def run(self, spec):
+        rows, keys = self._ordered(spec)
+        total = self.data.rows if rows is None else len(rows)
+        limit = spec["limit"]
+
+        # Where the page starts: after the cursor's (key, row), or at offset
+        cursor = spec["cursor"]
+        if cursor is None:
+            start = spec["offset"]
+        elif keys is None:
+            start = int(np.searchsorted(rows, cursor[1], side="right")) if rows is not None else cursor[1] + 1
+        else:
+            lo = int(np.searchsorted(keys, cursor[0], side="left"))
+            hi = int(np.searchsorted(keys, cursor[0], side="right"))
+            start = lo + int(np.searchsorted(rows[lo:hi], cursor[1], side="right"))
+
+        end = min(start + limit, total)
+        page = np.arange(start, end) if rows is None else rows[start:end]
+
+        data = {}
+        for col in spec["columns"]:
+            array = self._values[col]
+            if col in CATEGORICAL_COLUMNS:
+                data[col] = np.asarray(array.categories)[array.codes[page]].tolist()
+            else:
+                data[col] = np.asarray(array)[page].tolist()
+
+        next_cursor = None
+        if end < total and len(page):
+            key = None if keys is None else float(keys[end - 1])
+            next_cursor = encode_cursor(key, int(page[-1]))
+        return {
+            "columns": spec["columns"],
+            "data": data,
+            "row_ids": page.tolist(),
+            "total": total,
+            "offset": start,
+            "next_cursor": next_cursor
+        }
+
+
+_query = None
+_query_lock = threading.Lock()
+
+def dataset_query(data):
+    """The DatasetQuery for `data`, reusing the category index across appends"""
+    global _query
+    with _query_lock:
+        query = _query
+        if query is None or query.data is not data:
+            index = query.index if query is not None else None
+            if index is not None and index.epoch == data.epoch and index.rows <= data.rows:
+                index = index.extended(data)
+            else:
+                index = CategoryIndex(data)
+            query = _query = DatasetQuery(data, index)
+        return query
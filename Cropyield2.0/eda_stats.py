@@ -0,0 +1,273 @@
+import json
+import os
+import threading
+
+import numpy as np
+
+from schema import NUMERIC_COLUMNS, TARGET
+
+# Rows folded in per step when (re)building, so memory stays bounded
+UPDATE_CHUNK_ROWS = 1 << 20
+STATS_FILE = "eda_stats.json"
+
+
+# =====================================================
+# ACCUMULATORS
+# =====================================================
+class QuantileSketch:
+    """Mergeable streaming quantile sketch (DDSketch).
+
+    Values are counted in logarithmic buckets whose width is a fixed
+    fraction of their magnitude, so any quantile is returned within
+    `alpha` relative error while the sketch stays a few hundred buckets.
+    """
+
+    def __init__(self, alpha=0.005):
+        self.alpha = alpha
+        self.gamma = (1 + alpha) / (1 - alpha)
+        self.log_gamma = np.log(self.gamma)
+        self.positive = {}
+        self.negative = {}
+        self.zero = 0
+        self.count = 0
+        self.min = np.inf
+        self.max = -np.inf
+
+    def _add_buckets(self, buckets, magnitudes):
+        index, counts = np.unique(np.ceil(np.log(magnitudes) / self.log_gamma).astype(np.int64),
+                                  return_counts=True)
+        for i, c in zip(index.tolist(), counts.tolist()):
+            buckets[i] = buckets.get(i, 0) + c
+
+    def add(self, values):
+        values = np.asarray(values, dtype=float)
+        if not len(values):
+            return
+        self._add_buckets(self.positive, values[values > 0])
+        self._add_buckets(self.negative, -values[values < 0])
+        self.zero += int((values == 0).sum())
+        self.count += len(values)
+        self.min = min(self.min, float(values.min()))
+        self.max = max(self.max, float(values.max()))
+
+    def _value(self, index):
+        return 2 * self.gamma ** index / (self.gamma + 1)
+
+    def quantile(self, q):
+        if not self.count:
+            return float('nan')
+        rank = q * (self.count - 1)
+        seen = 0
+        ordered = (
+            [(-self._value(i), c) for i, c in sorted(self.negative.items(), reverse=True)]
+            + [(0.0, self.zero)]
+            + [(self._value(i), c) for i, c in sorted(self.positive.items())]
+        )
+        for value, c in ordered:
+            seen += c
+            if seen > rank:
+                return min(max(value, self.min), self.max)
+        return self.max
+
+    def to_dict(self):
+        return {
+            'alpha': self.alpha,
+            'positive': list(self.positive.items()),
+            'negative': list(self.negative.items()),
+            'zero': self.zero,
+            'count': self.count,
+            'min': self.min,
+            'max': self.max
+        }
+
+    @classmethod
+    def from_dict(cls, d):
+        sketch = cls(d['alpha'])
+        sketch.positive = {int(i): c for i, c in d['positive']}
+        sketch.negative = {int(i): c for i, c in d['negative']}
+        sketch.zero, sketch.count = d['zero'], d['count']
+        sketch.min, sketch.max = d['min'], d['max']
+        return sketch
+
+
+class Covariance:
+    """Running mean and co-moment matrix, merged batch by batch (Welford/Chan)"""
+
+    def __init__(self, k):
+        self.n = 0
+        self.mean = np.zeros(k)
+        self.m2 = np.zeros((k, k))
+
+    def add(self, X):
+        X = np.asarray(X, dtype=float)
+        if not len(X):
+            return
+        n_b = len(X)
+        mean_b = X.mean(axis=0)
+        centered = X - mean_b
+        m2_b = centered.T @ centered
+
+        n = self.n + n_b
+        delta = mean_b - self.mean
+        self.m2 = self.m2 + m2_b + np.outer(delta, delta) * self.n * n_b / n
+        self.mean = self.mean + delta * n_b / n
+        self.n = n
+
+    def correlation(self):
+        std = np.sqrt(np.diag(self.m2))
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return self.m2 / np.outer(std, std)
+
+
+# =====================================================
+# EDA STATISTICS STORE
+# =====================================================
+class EdaStats:
+    """Everything the EDA charts need, folded in one batch of rows at a time.
+
+    - yield count/sum/sum of squares per crop type (bar chart with CI)
+    - a quantile sketch of yield per soil type (box plot)
+    - running covariance of the numeric columns and yield (heatmap)
+
+    The stats track the column store epoch; appended rows are added in
+    O(new rows), and a new epoch (rows rewritten) means a rebuild.
+    """
+
+    COLUMNS = NUMERIC_COLUMNS + [TARGET]
+
+    def __init__(self, epoch, crops, soils):
+        self.epoch = epoch
+        self.rows = 0
+        self.crops = list(crops)
+        self.crop_count = np.zeros(len(self.crops))
+        self.crop_sum = np.zeros(len(self.crops))
+        self.crop_sumsq = np.zeros(len(self.crops))
+        self.soils = list(soils)
+        self.soil_sketches = [QuantileSketch() for _ in self.soils]
+        self.covariance = Covariance(len(self.COLUMNS))
+
+    def update(self, data):
+        """Fold in the rows of `data` (a Dataset) not seen yet"""
+        crop_codes = data.X['Crop_Type'].to_numpy()
+        soil_codes = data.X['Soil_Type'].to_numpy()
+        columns = [data.X[col].to_numpy() for col in NUMERIC_COLUMNS] + [data.y.to_numpy()]
+        for start in range(self.rows, data.rows, UPDATE_CHUNK_ROWS):
+            end = min(start + UPDATE_CHUNK_ROWS, data.rows)
+            y = columns[-1][start:end]
+
+            crops = crop_codes[start:end]
+            k = len(self.crops)
+            self.crop_count += np.bincount(crops, minlength=k)
+            self.crop_sum += np.bincount(crops, weights=y, minlength=k)
+            self.crop_sumsq += np.bincount(crops, weights=y * y, minlength=k)
+
+            soils = soil_codes[start:end]
+            for code, sketch in enumerate(self.soil_sketches):
+                sketch.add(y[soils == code])
+
+            self.covariance.add(np.column_stack([col[start:end] for col in columns]))
+        self.rows = max(self.rows, data.rows)
+
+    def crop_yield(self):
+        """(crop, count, mean, 95% CI half-width) for each crop type"""
+        out = []
+        for name, n, s, ss in zip(self.crops, self.crop_count, self.crop_sum, self.crop_sumsq):
+            if not n:
+                continue
+            mean = s / n
+            var = max(ss / n - mean * mean, 0.0) * n / max(n - 1, 1)
+            out.append((name, int(n), mean, 1.96 * np.sqrt(var / n)))
+        return out
+
+    def soil_boxes(self):
+        """Box plot stats per soil type, in the form Axes.bxp takes"""
+        boxes = []
+        for name, sketch in zip(self.soils, self.soil_sketches):
+            if not sketch.count:
+                continue
+            q1, med, q3 = (sketch.quantile(q) for q in (0.25, 0.5, 0.75))
+            iqr = q3 - q1
+            boxes.append({
+                'label': name, 'q1': q1, 'med': med, 'q3': q3,
+                'whislo': max(sketch.min, q1 - 1.5 * iqr),
+                'whishi': min(sketch.max, q3 + 1.5 * iqr),
+                'fliers': []
+            })
+        return boxes
+
+    def correlation(self):
+        return self.COLUMNS, self.covariance.correlation()
+
+    def to_dict(self):
+        return {
+            'epoch': self.epoch,
+            'rows': self.rows,
+            'crops': self.crops,
+            'crop_count': self.crop_count.tolist(),
+            'crop_sum': self.crop_sum.tolist(),
+            'crop_sumsq': self.crop_sumsq.tolist(),
+            'soils': self.soils,
+            'soil_sketches': [sketch.to_dict() for sketch in self.soil_sketches],
+            'covariance': {
+                'n': self.covariance.n,
+                'mean': self.covariance.mean.tolist(),
+                'm2': self.covariance.m2.tolist()
+            }
+        }
+
+    @classmethod
+    def from_dict(cls, d):
+        stats = cls(d['epoch'], d['crops'], d['soils'])
+        stats.rows = d['rows']
+        stats.crop_count = np.asarray(d['crop_count'])
+        stats.crop_sum = np.asarray(d['crop_sum'])
+        stats.crop_sumsq = np.asarray(d['crop_sumsq'])
+        stats.soil_sketches = [QuantileSketch.from_dict(s) for s in d['soil_sketches']]
+        stats.covariance.n = d['covariance']['n']
+        stats.covariance.mean = np.asarray(d['covariance']['mean'])
+        stats.covariance.m2 = np.asarray(d['covariance']['m2'])
+        return stats
+
+
+_stats = None
+_stats_lock = threading.Lock()
+
+def _stats_path(data):
+    return os.path.join(data.store.directory, STATS_FILE)
+
+def _read_stats(data):
+    try:
+        with open(_stats_path(data)) as f:
+            return EdaStats.from_dict(json.load(f))
+    except (FileNotFoundError, ValueError, KeyError):
+        return None
+
+def _write_stats(data, stats):
+    path = _stats_path(data)
+    tmp_path = f'{path}.{os.getpid()}.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(stats.to_dict(), f)
+    os.replace(tmp_path, path)
+
+def _usable(stats, data):
+    return stats is not None and stats.epoch == data.epoch and stats.rows <= data.rows
+
+def load_eda_stats(data):
+    """EdaStats for `data`, updated with any rows appended since last time.
+
+    The stats are saved next to the column store, so a restarted or
+    different worker only folds in rows it hasn't seen.
+    """
+    global _stats
+    with _stats_lock:
+        stats = _stats
+        if not _usable(stats, data):
+            stats = _read_stats(data)
+        if not _usable(stats, data):
+            stats = EdaStats(data.epoch, data.encoders['Crop_Type'].classes_,
+                             data.encoders['Soil_Type'].classes_)
+        if stats.rows < data.rows:
+            stats.update(data)
+            _write_stats(data, stats)
+        _stats = stats
+        return stats
@@ -0,0 +1,90 @@
+import json
+
+import numpy as np
+import pandas as pd
+
+from metrics import span
+from schema import FORM_FIELDS
+
+# Above this many rows the libraries' own batched predict() beats walking the
+# compiled node table (see benchmarks/bench_compiled_inference.py)
+COMPILED_MAX_ROWS = 256
+
+# =====================================================
+# FEATURE PIPELINE
+# =====================================================
+def encode_features(frame, dataset, classes=None):
+    """Turn rows in the dataset schema into the model feature matrix.
+
+    Each categorical column is encoded in a single vectorized lookup against
+    the fitted encoder classes instead of one LabelEncoder call per row.
+    `classes` ({column: values}) are the dictionaries the models were
+    trained with (ModelSnapshot.classes); the dataset's own are re-sorted
+    when a new category is appended, which would shift every code under
+    unchanged models. Values outside `classes` are rejected until the
+    models are retrained.
+    """
+    X, encoders = dataset.X, dataset.encoders
+    frame = frame.rename(columns=FORM_FIELDS)
+    missing = [col for col in X.columns if col not in frame.columns]
+    if missing:
+        raise ValueError(f"Missing columns: {', '.join(missing)}")
+    
+    features = {}
+    with span("label_encoding"):
+        for col in X.columns:
+            if col in encoders:
+                categories = classes[col] if classes else encoders[col].classes_
+                codes = pd.Categorical(frame[col], categories=categories).codes
+                if (codes < 0).any():
+                    unknown = pd.unique(frame[col][codes < 0])[:5]
+                    raise ValueError(f"Unknown {col} values: {', '.join(map(str, unknown))}")
+                features[col] = codes
+            else:
+                features[col] = pd.to_numeric(frame[col]).to_numpy()
+        
+        return pd.DataFrame(features, columns=X.columns).astype(X.dtypes)
+
+def predict_frame(results, features, engine=None):
+    """Run every model once over the whole feature matrix.
+
+    With an `engine` (a CompiledEnsemble of the same models) small batches
+    are scored in one NumPy pass instead of six framework predict() calls.
+    """
+    if engine is not None and len(features) <= COMPILED_MAX_ROWS:
+        with span("model_predict", model="compiled"):
+            return engine.predict(features)
+    predictions = {}
+    for name, info in results.items():
+        with span("model_predict", model=name):
+            predictions[name] = np.asarray(info['model'].predict(features), dtype=float)
+    predictions['average'] = np.mean(np.column_stack(list(predictions.values())), axis=1)
+    return predictions
+
+def score_chunks(results, dataset, chunks, fmt='csv', engine=None, classes=None):
+    """Score an iterator of raw DataFrame chunks, yielding encoded result text.
+
+    Only one chunk is held in memory at a time, so peak memory depends on the
+    chunk size and not on the size of the input. If a chunk can't be read or
+    scored once output has started, a final error record is written (an
+    `{"error": ..., "row": ...}` line, or an `error,<row>,<message>` CSV
+    row) so clients can tell the output was cut short.
+    """
+    offset = 0
+    try:
+        for chunk in chunks:
+            out = pd.DataFrame(predict_frame(results, encode_features(chunk, dataset, classes), engine))
+            out.insert(0, 'row', np.arange(offset, offset + len(out)))
+            if fmt == 'ndjson':
+                # pandas rounds to 10 significant digits by default
+                yield out.to_json(orient='records', lines=True, double_precision=15)
+            else:
+                yield out.to_csv(index=False, header=offset == 0)
+            offset += len(out)
+    except Exception as e:
+        if offset == 0:
+            raise  # nothing sent yet, so the caller can still answer with an error
+        if fmt == 'ndjson':
+            yield json.dumps({'error': str(e), 'row': offset}) + '\n'
+        else:
+            yield pd.DataFrame([['error', offset, str(e)]]).to_csv(index=False, header=False)
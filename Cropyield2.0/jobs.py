@@ -0,0 +1,170 @@
+import fcntl
+import json
+import os
+import threading
+import time
+import uuid
+
+
+class JobConflict(Exception):
+    """Raised when a training job is already running"""
+
+    def __init__(self, job_id=None):
+        super().__init__("Training already in progress")
+        self.job_id = job_id
+
+
+class JobCancelled(Exception):
+    """Raised inside a job when cancellation was requested"""
+
+
+class Job:
+    def __init__(self, kind, names):
+        self.id = uuid.uuid4().hex[:12]
+        self.kind = kind
+        self.status = 'queued'
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.models = {name: {'status': 'pending'} for name in names}
+        self.result = None
+        self.info = {}
+        self.error = None
+        self.cancel_event = threading.Event()
+
+    def elapsed(self):
+        if self.started_at is None:
+            return 0.0
+        return (self.finished_at or time.time()) - self.started_at
+
+    def to_dict(self):
+        done = sum(1 for info in self.models.values() if info['status'] == 'done')
+        return {
+            'job_id': self.id,
+            'kind': self.kind,
+            'status': self.status,
+            'created_at': self.created_at,
+            'elapsed_seconds': round(self.elapsed(), 3),
+            'progress': {'done': done, 'total': len(self.models)},
+            'models': self.models,
+            'result': self.result,
+            'info': self.info,
+            'error': self.error
+        }
+
+
+class JobManager:
+    """Runs training in a background thread, one job at a time.
+
+    The one-at-a-time rule is enforced with an flock on `lock_path`, so it
+    holds across gunicorn workers too. Job state is mirrored to JSON files in
+    `state_dir` so any worker can answer a status poll, and cancellation is
+    requested through a marker file the running worker checks.
+    """
+
+    def __init__(self, state_dir, lock_path, keep=50):
+        self.state_dir = state_dir
+        self.lock_path = lock_path
+        self.keep = keep
+        self._jobs = {}
+        self._lock = threading.Lock()
+
+    def _state_path(self, job_id, suffix='json'):
+        return os.path.join(self.state_dir, f'{job_id}.{suffix}')
+
+    def _save(self, job):
+        os.makedirs(self.state_dir, exist_ok=True)
+        tmp_path = self._state_path(job.id, f'{os.getpid()}.tmp')
+        with open(tmp_path, 'w') as f:
+            json.dump(job.to_dict(), f)
+        os.replace(tmp_path, self._state_path(job.id))
+
+    def _acquire(self):
+        os.makedirs(os.path.dirname(os.path.abspath(self.lock_path)), exist_ok=True)
+        fd = os.open(self.lock_path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            with os.fdopen(fd) as f:
+                running_id = f.read().strip() or None
+            raise JobConflict(running_id)
+        return fd
+
+    def submit(self, kind, names, target):
+        """Start `target(job)` in the background and return the Job.
+
+        Raises JobConflict if another job holds the training lock.
+        """
+        with self._lock:
+            fd = self._acquire()
+            os.ftruncate(fd, 0)
+            job = Job(kind, names)
+            os.write(fd, job.id.encode())
+            self._jobs[job.id] = job
+            self._trim()
+        self._save(job)
+
+        thread = threading.Thread(target=self._run, args=(job, target, fd), daemon=True)
+        thread.start()
+        return job
+
+    def _run(self, job, target, fd):
+        job.status = 'running'
+        job.started_at = time.time()
+        self._save(job)
+        try:
+            job.result = target(job)
+            job.status = 'completed'
+        except JobCancelled:
+            job.status = 'cancelled'
+        except Exception as e:
+            job.status = 'failed'
+            job.error = str(e)
+        finally:
+            job.finished_at = time.time()
+            self._save(job)
+            cancel_path = self._state_path(job.id, 'cancel')
+            if os.path.exists(cancel_path):
+                os.remove(cancel_path)
+            fcntl.flock(fd, fcntl.LOCK_UN)
+            os.close(fd)
+
+    def _trim(self):
+        finished = [job for job in self._jobs.values() if job.finished_at is not None]
+        finished.sort(key=lambda job: job.finished_at)
+        for job in finished[:max(0, len(finished) - self.keep)]:
+            del self._jobs[job.id]
+
+    def update(self, job, name, **info):
+        """Record per-model progress for a running job"""
+        job.models[name].update(info)
+        self._save(job)
+
+    def check_cancelled(self, job):
+        """Raise JobCancelled if cancellation was requested from any worker"""
+        if not job.cancel_event.is_set() and os.path.exists(self._state_path(job.id, 'cancel')):
+            job.cancel_event.set()
+        if job.cancel_event.is_set():
+            raise JobCancelled()
+
+    def get(self, job_id):
+        job = self._jobs.get(job_id)
+        if job is not None:
+            return job.to_dict()
+        try:
+            with open(self._state_path(os.path.basename(job_id))) as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            return None
+
+    def cancel(self, job_id):
+        """Request cancellation; returns the job's state or None if unknown"""
+        state = self.get(job_id)
+        if state is None or state['status'] not in ('queued', 'running'):
+            return state
+        job = self._jobs.get(job_id)
+        if job is not None:
+            job.cancel_event.set()
+        else:
+            open(self._state_path(os.path.basename(job_id), 'cancel'), 'w').close()
+        return dict(state, cancel_requested=True)
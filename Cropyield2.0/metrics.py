@@ -0,0 +1,281 @@
+# Process-local counters, timing histograms and a sampling profiler, exposed
+# in the Prometheus text format by /metrics. Like schema.py this module only
+# uses the standard library, so every worker can import it cheaply.
+
+import os
+import sys
+import threading
+import time
+from bisect import bisect_left
+from collections import Counter
+
+# CROP_METRICS=0 turns every span/inc/observe into a no-op
+ENABLED = os.environ.get("CROP_METRICS", "1") != "0"
+# CROP_PROFILER=1 exposes /profiler/start and /profiler/stop
+PROFILER_ENABLED = os.environ.get("CROP_PROFILER") == "1"
+
+# Upper bounds in seconds; spans range from sub-millisecond encodes to
+# minute-long training runs
+BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+           1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 300.0)
+
+HELP = {
+    "crop_span_seconds": "Time spent in an instrumented section of code",
+    "crop_request_seconds": "HTTP request latency",
+    "crop_requests_total": "HTTP requests handled",
+    "crop_errors_total": "Unexpected exceptions turned into 500 responses",
+    "crop_training_runs_total": "Training jobs by kind and outcome",
+    "crop_training_seconds": "Wall time of training jobs",
+    "crop_model_fit_seconds": "Time to fit one model",
+    "crop_tuning_cpu_seconds_total": "CPU time spent on hyperparameter search trials",
+    "crop_db_rows_written_total": "Prediction rows committed to SQLite",
+    "crop_cache_hits_total": "Cache lookups that found an entry",
+    "crop_cache_misses_total": "Cache lookups that did not",
+    "crop_cache_entries": "Entries currently held in a cache",
+    "crop_pool_pending": "Tasks queued or running in a worker pool",
+    "crop_pool_wait_seconds": "Time work spent queued before a worker picked it up",
+    "crop_pool_rejected_total": "Work refused by admission control, by HTTP status",
+    "crop_batches_total": "Micro-batches scored",
+    "crop_batched_items_total": "Requests scored in micro-batches",
+    "crop_whatif_total": "What-if surfaces served, by source (grid or exact)"
+}
+
+
+# =====================================================
+# METRICS REGISTRY
+# =====================================================
+class Histogram:
+    __slots__ = ("counts", "sum", "count")
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(BUCKETS, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+def _labels_key(labels):
+    return tuple(sorted((key, str(value)) for key, value in labels.items()))
+
+def _format_labels(key, extra=()):
+    pairs = list(key) + list(extra)
+    if not pairs:
+        return ""
+    escaped = (
+        '{}="{}"'.format(k, v.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n"))
+        for k, v in pairs
+    )
+    return "{" + ",".join(escaped) + "}"
+
+
+class MetricsRegistry:
+    """Counters and histograms keyed by (name, labels).
+
+    Values live in this process only; with several workers each one serves
+    its own numbers and Prometheus adds them up. Collectors are called at
+    scrape time for values other objects already keep (e.g. cache hits), so
+    those cost nothing on the hot path.
+    """
+
+    def __init__(self):
+        self.counters = {}
+        self.histograms = {}
+        self.collectors = []
+        self._lock = threading.Lock()
+
+    def inc(self, name, value=1, **labels):
+        key = (name, _labels_key(labels))
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def observe(self, name, seconds, **labels):
+        key = (name, _labels_key(labels))
+        with self._lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = Histogram()
+            histogram.observe(seconds)
+
+    def drain(self):
+        """Take this process's counters and histograms and start from zero,
+        so a pool process can hand what a task recorded to its parent"""
+        with self._lock:
+            recorded = (self.counters, self.histograms)
+            self.counters, self.histograms = {}, {}
+        return recorded
+
+    def merge(self, counters, histograms):
+        """Add values drained from another process"""
+        with self._lock:
+            for key, value in counters.items():
+                self.counters[key] = self.counters.get(key, 0) + value
+            for key, other in histograms.items():
+                histogram = self.histograms.get(key)
+                if histogram is None:
+                    histogram = self.histograms[key] = Histogram()
+                histogram.counts = [a + b for a, b in zip(histogram.counts, other.counts)]
+                histogram.sum += other.sum
+                histogram.count += other.count
+
+    def register_collector(self, collector):
+        """`collector()` returns (name, type, labels, value) tuples"""
+        self.collectors.append(collector)
+
+    def render(self):
+        """Everything in the Prometheus text exposition format"""
+        with self._lock:
+            samples = {}
+            for (name, key), value in self.counters.items():
+                samples.setdefault((name, "counter"), []).append(f"{name}{_format_labels(key)} {value}")
+            for (name, key), h in self.histograms.items():
+                lines = samples.setdefault((name, "histogram"), [])
+                cumulative = 0
+                for bound, count in zip(BUCKETS + ("+Inf",), h.counts):
+                    cumulative += count
+                    lines.append(f"{name}_bucket{_format_labels(key, [('le', str(bound))])} {cumulative}")
+                lines.append(f"{name}_sum{_format_labels(key)} {h.sum}")
+                lines.append(f"{name}_count{_format_labels(key)} {h.count}")
+        for collector in self.collectors:
+            for name, kind, labels, value in collector():
+                samples.setdefault((name, kind), []).append(
+                    f"{name}{_format_labels(_labels_key(labels))} {value}")
+
+        out = []
+        for (name, kind), lines in sorted(samples.items()):
+            if name in HELP:
+                out.append(f"# HELP {name} {HELP[name]}")
+            out.append(f"# TYPE {name} {kind}")
+            out.extend(sorted(lines) if kind != "histogram" else lines)
+        return "\n".join(out) + "\n"
+
+
+registry = MetricsRegistry()
+
+
+# =====================================================
+# INSTRUMENTATION HELPERS
+# =====================================================
+class _Span:
+    __slots__ = ("name", "labels", "start")
+
+    def __init__(self, name, labels):
+        self.name = name
+        self.labels = labels
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        registry.observe("crop_span_seconds", time.perf_counter() - self.start,
+                         span=self.name, **self.labels)
+
+
+class _NoSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        pass
+
+
+_NO_SPAN = _NoSpan()
+
+def span(name, **labels):
+    """Context manager timing a block into crop_span_seconds{span=name}"""
+    if not ENABLED:
+        return _NO_SPAN
+    return _Span(name, labels)
+
+def inc(name, value=1, **labels):
+    if ENABLED:
+        registry.inc(name, value, **labels)
+
+def observe(name, seconds, **labels):
+    if ENABLED:
+        registry.observe(name, seconds, **labels)
+
+def cache_collector(name, cache):
+    """Collector reporting the hit/miss counters an LRUCache keeps anyway"""
+    def collect():
+        stats = cache.stats()
+        return [
+            ("crop_cache_hits_total", "counter", {"cache": name}, stats["hits"]),
+            ("crop_cache_misses_total", "counter", {"cache": name}, stats["misses"]),
+            ("crop_cache_entries", "gauge", {"cache": name}, stats["size"])
+        ]
+    return collect
+
+
+# =====================================================
+# SAMPLING PROFILER
+# =====================================================
+class SamplingProfiler:
+    """Records every thread's Python stack `interval` seconds apart.
+
+    Nothing is traced in between samples, so the cost is one stack walk per
+    thread per interval whatever the request load. Results are collapsed
+    stacks ("frame;frame;frame count"), which flamegraph.pl and speedscope
+    read directly.
+    """
+
+    def __init__(self, interval=0.005):
+        self.interval = interval
+        self.stacks = Counter()
+        self.samples = 0
+        self.started_at = None
+        self._thread = None
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+
+    @property
+    def running(self):
+        return self._thread is not None
+
+    def start(self, interval=None):
+        with self._lock:
+            if self._thread is not None:
+                return False
+            self.interval = interval or self.interval
+            self.stacks = Counter()
+            self.samples = 0
+            self.started_at = time.time()
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+            self._thread.start()
+            return True
+
+    def stop(self):
+        """Stop sampling and return the collapsed stacks"""
+        with self._lock:
+            thread, self._thread = self._thread, None
+        if thread is not None:
+            self._stop.set()
+            thread.join()
+        return self.collapsed()
+
+    def collapsed(self):
+        return "".join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+    def _run(self):
+        own = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+                    frame = frame.f_back
+                self.stacks[";".join(reversed(stack))] += 1
+            self.samples += 1
+
+
+profiler = SamplingProfiler()
@@ -0,0 +1,391 @@
+import json
+import os
+import shutil
+import threading
+import time
+import uuid
+
+# Largest acceptable difference between compiled and native predictions;
+# XGBoost sums its trees in float32, which accounts for ~1e-5
+COMPILE_TOLERANCE = 1e-4
+ARTIFACT_FORMAT = 1
+# Versions kept on disk besides the current one, so a worker that still
+# holds an older snapshot can load its remaining models
+KEEP_VERSIONS = 2
+
+
+def resident_mb():
+    """This process's resident set size in MB, or None where /proc isn't available"""
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return None
+
+
+def model_slug(name):
+    return name.lower().replace(' ', '-')
+
+
+def parse_compress(value):
+    """joblib `compress` from a setting like "0", "3", "lz4" or "zlib:6" """
+    value = str(value or '0').strip()
+    if value.isdigit():
+        return int(value)
+    method, _, level = value.partition(':')
+    return (method, int(level)) if level else method
+
+
+class ModelInfo(dict):
+    """A model's metrics; the fitted model itself is read from the artifact
+    the first time info['model'] is looked up"""
+
+    def __init__(self, metrics, loader=None):
+        super().__init__(metrics)
+        self._loader = loader
+
+    def __missing__(self, key):
+        if key != 'model' or self._loader is None:
+            raise KeyError(key)
+        return self._loader()
+
+    @property
+    def loaded(self):
+        return dict.__contains__(self, 'model')
+
+
+class ModelSnapshot:
+    """One version of the trained models, read from its artifact directory.
+
+    Only manifest.json is read up front. Each model is loaded the first
+    time it is used, and the held-out rows (X_test/y_test) the first time
+    they are needed, so a worker that serves two models never unpickles
+    the other four.
+    """
+
+    def __init__(self, directory, manifest, version, load_seconds, mmap=False, loaded=None):
+        self.directory = directory
+        self.manifest = manifest
+        self.version = version
+        self.load_seconds = load_seconds
+        self.loaded_at = time.time()
+        self.training = training_from_json(manifest.get('training'))
+        # Memory-mapping only works on uncompressed files
+        self.mmap_mode = 'r' if mmap and not manifest['compress'] else None
+        self.model_load_seconds = {}
+        self.model_memory_mb = {}
+        self._load_lock = threading.Lock()
+        self.results = {
+            name: ModelInfo(entry['metrics'], lambda name=name: self._load_model(name))
+            for name, entry in manifest['models'].items()
+        }
+        self._holdout = None
+        if loaded is not None:
+            for name, info in loaded['results'].items():
+                dict.__setitem__(self.results[name], 'model', info['model'])
+            self._holdout = (loaded['X_test'], loaded['y_test'])
+        self._compiled = None
+        self._compile_lock = threading.Lock()
+        self.compile_info = None
+
+    @property
+    def classes(self):
+        """Category dictionaries the models were trained with, {column: values};
+        None for artifacts that predate them"""
+        return self.manifest.get('classes') or (self.training or {}).get('classes')
+
+    @property
+    def tag(self):
+        """Short version string for cache keys and URLs"""
+        return '%x%x' % self.version
+
+    def _read(self, filename):
+        import joblib  # deferred so workers that never predict don't load it
+        return joblib.load(os.path.join(self.directory, filename), mmap_mode=self.mmap_mode)
+
+    def _load_model(self, name):
+        with self._load_lock:
+            info = self.results[name]
+            if not info.loaded:
+                # Memory is the RSS growth across the load (compressed
+                # artifacts are several times smaller on disk). joblib and
+                # the model's library are imported first so they aren't counted.
+                import importlib
+                import joblib
+                entry = self.manifest['models'][name]
+                if entry.get('module'):
+                    importlib.import_module(entry['module'])
+                rss = resident_mb()
+                start = time.perf_counter()
+                dict.__setitem__(info, 'model', self._read(entry['file']))
+                self.model_load_seconds[name] = round(time.perf_counter() - start, 4)
+                if rss is not None:
+                    self.model_memory_mb[name] = round(max(0.0, resident_mb() - rss), 3)
+            return dict.__getitem__(info, 'model')
+
+    def _load_holdout(self):
+        with self._load_lock:
+            if self._holdout is None:
+                self._holdout = self._read(self.manifest['holdout']['file'])
+            return self._holdout
+
+    @property
+    def X_test(self):
+        return (self._holdout or self._load_holdout())[0]
+
+    @property
+    def y_test(self):
+        return (self._holdout or self._load_holdout())[1]
+
+    def compiled(self):
+        """The CompiledEnsemble for these models, built and verified on first use.
+
+        Returns None if a model cannot be exported or the compiled outputs
+        differ from the models' own predictions on the held-out rows.
+        """
+        if self._compiled is None:
+            with self._compile_lock:
+                if self._compiled is None:
+                    self._compiled = self._compile()
+        return self._compiled or None
+
+    def _compile(self):
+        from compiled_ensemble import compile_ensemble, max_differences
+
+        start = time.perf_counter()
+        try:
+            engine = compile_ensemble(self.results, self.X_test.shape[1])
+            error = max(max_differences(engine, self.results, self.X_test).values())
+        except ValueError as e:
+            self.compile_info = {'error': str(e)}
+            return False
+        self.compile_info = {
+            'seconds': round(time.perf_counter() - start, 4),
+            'nodes': engine.n_nodes,
+            'size_mb': round(engine.nbytes() / 1024 / 1024, 3),
+            'max_error': error
+        }
+        if error > COMPILE_TOLERANCE:
+            self.compile_info['error'] = 'Compiled predictions do not match'
+            return False
+        return engine
+
+    def status(self):
+        return {
+            'version': self.tag,
+            'artifact': self.manifest['id'],
+            'compress': self.manifest['compress'],
+            'mmap': self.mmap_mode is not None,
+            'loaded_at': self.loaded_at,
+            'load_seconds': round(self.load_seconds, 4),
+            'models': {
+                name: {
+                    'file_mb': round(entry['bytes'] / 1024 / 1024, 3),
+                    'loaded': self.results[name].loaded,
+                    'load_seconds': self.model_load_seconds.get(name),
+                    # None unless this process loaded it from disk
+                    'memory_mb': self.model_memory_mb.get(name)
+                }
+                for name, entry in self.manifest['models'].items()
+            },
+            'compiled': self.compile_info,
+            'training': training_summary(self.training)
+        }
+
+
+def training_summary(training):
+    """How the models were last trained, without the linear-model statistics"""
+    if not training:
+        return None
+    return {key: value for key, value in training.items() if key not in ('linear_stats', 'classes')}
+
+
+def training_to_json(training):
+    """The training record with its NumPy statistics as lists, for the manifest"""
+    if not training or 'linear_stats' not in training:
+        return training
+    stats = {key: value.tolist() if hasattr(value, 'tolist') else value
+             for key, value in training['linear_stats'].items()}
+    return dict(training, linear_stats=stats)
+
+
+def training_from_json(training):
+    if not training or 'linear_stats' not in training:
+        return training
+    import numpy as np
+    stats = dict(training['linear_stats'])
+    for key in ('x_mean', 'xx', 'xy'):
+        stats[key] = np.asarray(stats[key], dtype=float)
+    return dict(training, linear_stats=stats)
+
+
+class ModelRegistry:
+    """Process-wide cache of the trained models.
+
+    Artifacts are directories under `path`, one per version:
+
+        <path>/CURRENT                  name of the active version
+        <path>/<version>/manifest.json  metrics, feature schema, encoder
+                                        classes, training record, file list
+        <path>/<version>/models/*.joblib   one file per model
+        <path>/<version>/holdout.joblib    X_test, y_test
+
+    Every `check_interval` seconds CURRENT's mtime/size is compared against
+    the loaded version so that other workers pick up a freshly trained
+    artifact. `compress` is passed to joblib.dump; with `mmap` uncompressed
+    artifacts are memory-mapped, so workers share the NumPy arrays (e.g. the
+    Random Forest's trees) through the page cache.
+    """
+
+    def __init__(self, path, check_interval=1.0, compress=0, mmap=False, legacy_path=None):
+        self.path = path
+        self.check_interval = check_interval
+        self.compress = compress
+        self.mmap = mmap
+        self.legacy_path = legacy_path
+        self.current_path = os.path.join(path, 'CURRENT')
+        self._lock = threading.Lock()
+        self._snapshot = None
+        self._last_check = 0.0
+
+    def _disk_version(self):
+        try:
+            st = os.stat(self.current_path)
+        except FileNotFoundError:
+            return None
+        return (st.st_mtime_ns, st.st_size)
+
+    def get(self, refresh=False):
+        """Return the current snapshot, reloading it if the artifact changed.
+
+        With `refresh` the artifact is checked even within check_interval.
+        """
+        snapshot = self._snapshot
+        now = time.monotonic()
+        if snapshot is not None and not refresh and now - self._last_check < self.check_interval:
+            return snapshot
+
+        self._last_check = now
+        version = self._disk_version()
+        if version is None and self.legacy_path and os.path.exists(self.legacy_path):
+            return self._import_legacy()
+        if version is None or (snapshot is not None and snapshot.version == version):
+            return snapshot
+
+        with self._lock:
+            # Another thread may have reloaded while we waited for the lock
+            snapshot = self._snapshot
+            if snapshot is not None and snapshot.version == version:
+                return snapshot
+            start = time.perf_counter()
+            with open(self.current_path) as f:
+                directory = os.path.join(self.path, f.read().strip())
+            with open(os.path.join(directory, 'manifest.json')) as f:
+                manifest = json.load(f)
+            snapshot = ModelSnapshot(directory, manifest, version, time.perf_counter() - start, self.mmap)
+            self._snapshot = snapshot
+            return snapshot
+
+    def _import_legacy(self):
+        """Convert a single-file artifact from before the directory format"""
+        import joblib
+
+        with self._lock:
+            if self._disk_version() is None:
+                self._write(joblib.load(self.legacy_path))
+        return self.get()
+
+    def publish(self, data):
+        """Write a new artifact version and swap it in without reloading"""
+        with self._lock:
+            directory, manifest, version = self._write(data)
+            self._snapshot = ModelSnapshot(directory, manifest, version, 0.0, self.mmap, loaded=data)
+            self._last_check = time.monotonic()
+        return self._snapshot
+
+    def _write(self, data):
+        """Write `data` as a new version and point CURRENT at it; returns
+        (directory, manifest, version)"""
+        name = f'{int(time.time() * 1000):x}-{uuid.uuid4().hex[:6]}'
+        directory = os.path.join(self.path, name)
+        os.makedirs(os.path.join(directory, 'models'))
+        try:
+            manifest = self._write_version(data, name, directory)
+        except BaseException:
+            # e.g. an unavailable compressor: leave no half-written version
+            shutil.rmtree(directory, ignore_errors=True)
+            raise
+
+        tmp_path = f'{self.current_path}.{os.getpid()}.tmp'
+        with open(tmp_path, 'w') as f:
+            f.write(name)
+        os.replace(tmp_path, self.current_path)
+        self._remove_old_versions(name)
+        return directory, manifest, self._disk_version()
+
+    def _write_version(self, data, name, directory):
+        import joblib
+
+        previous = self._snapshot
+        # As it reads back from the manifest (tuples become lists)
+        compress = json.loads(json.dumps(self.compress))
+
+        models = {}
+        for model_name, info in data['results'].items():
+            filename = f'models/{model_slug(model_name)}.joblib'
+            path = os.path.join(directory, filename)
+            old = previous.results.get(model_name) if previous is not None else None
+            if (old is not None and old.loaded and dict.__getitem__(old, 'model') is info['model']
+                    and previous.manifest['compress'] == compress):
+                # Unchanged since the last version (e.g. a Random Forest kept
+                # through an incremental update): link the file, don't rewrite it
+                source = os.path.join(previous.directory, previous.manifest['models'][model_name]['file'])
+                try:
+                    os.link(source, path)
+                except OSError:
+                    shutil.copyfile(source, path)
+            else:
+                joblib.dump(info['model'], path, compress=self.compress)
+            models[model_name] = {
+                'file': filename,
+                'class': type(info['model']).__name__,
+                'module': type(info['model']).__module__,
+                'bytes': os.path.getsize(path),
+                'metrics': {key: value for key, value in info.items() if key != 'model'}
+            }
+        joblib.dump((data['X_test'], data['y_test']), os.path.join(directory, 'holdout.joblib'),
+                    compress=self.compress)
+
+        X_test = data['X_test']
+        training = data.get('training') or {}
+        manifest = {
+            'format': ARTIFACT_FORMAT,
+            'id': name,
+            'created_at': time.time(),
+            'compress': compress,
+            'features': {'columns': list(X_test.columns), 'dtypes': {c: str(t) for c, t in X_test.dtypes.items()}},
+            'classes': training.get('classes'),
+            'models': models,
+            'holdout': {'file': 'holdout.joblib', 'rows': len(X_test)},
+            'training': training_to_json(data.get('training'))
+        }
+        with open(os.path.join(directory, 'manifest.json'), 'w') as f:
+            json.dump(manifest, f, indent=1)
+        return manifest
+
+    def _remove_old_versions(self, current):
+        versions = sorted(
+            entry for entry in os.listdir(self.path)
+            if entry != current and os.path.isdir(os.path.join(self.path, entry))
+        )
+        for entry in versions[:max(0, len(versions) - KEEP_VERSIONS)]:
+            shutil.rmtree(os.path.join(self.path, entry), ignore_errors=True)
+
+    def status(self):
+        snapshot = self.get()
+        if snapshot is None:
+            return {'loaded': False}
+        return dict(snapshot.status(), loaded=True)
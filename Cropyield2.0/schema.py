@@ -0,0 +1,30 @@
+# Dataset location, column names and model names shared by the web layer and
+# the ML modules. This module has no imports so lightweight workers can use it
+# without pulling in pandas or the model libraries.
+
+DATASET_PATH = "crop_yield_dataset.csv"
+
+NUMERIC_COLUMNS = ["Farm_Area", "Fertilizer_Used", "Pesticide_Used", "Water_Usage"]
+CATEGORICAL_COLUMNS = ["Crop_Type", "Irrigation_Type", "Soil_Type", "Season"]
+TARGET = "Yield"
+
+# Request field name -> dataset column
+FORM_FIELDS = {
+    "farm_area": "Farm_Area",
+    "fertilizer": "Fertilizer_Used",
+    "pesticide": "Pesticide_Used",
+    "water": "Water_Usage",
+    "crop": "Crop_Type",
+    "irrigation": "Irrigation_Type",
+    "soil": "Soil_Type",
+    "season": "Season"
+}
+
+MODEL_NAMES = [
+    "Linear Regression",
+    "Random Forest",
+    "Gradient Boosting",
+    "XGBoost",
+    "LightGBM",
+    "CatBoost"
+]
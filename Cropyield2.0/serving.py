@@ -0,0 +1,233 @@
+# Bounded worker pools with admission control, and the micro-batcher behind
+# /predict. CPU-bound work runs here instead of in the request threads, so a
+# slow chart render can't hold up predictions, and overload turns into quick
+# 429/503 responses instead of a growing backlog.
+
+import multiprocessing
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, TimeoutError
+
+import metrics
+
+
+class Overloaded(Exception):
+    """Work refused because a pool is saturated.
+
+    `status` is 429 when the pool's queue is full and 503 when the work
+    waited in it longer than the pool's queue timeout.
+    """
+
+    def __init__(self, pool, status, retry_after=1):
+        reason = "queue is full" if status == 429 else "timed out waiting in the queue"
+        super().__init__(f"Server busy: {pool} {reason}")
+        self.pool = pool
+        self.status = status
+        self.retry_after = retry_after
+
+
+def _run_task(fn, args, enqueued_at, in_process=False):
+    """Runs in the pool; returns (seconds spent queued, result, metrics).
+
+    In a pool process, `metrics` is what the task recorded there (e.g. its
+    spans), for the parent to merge into the registry /metrics serves.
+    """
+    waited = time.time() - enqueued_at
+    result = fn(*args)
+    return waited, result, metrics.registry.drain() if in_process else None
+
+
+# =====================================================
+# WORKER POOLS
+# =====================================================
+class WorkPool:
+    """At most `workers` tasks run at once and at most `max_queue` more wait.
+
+    run() blocks until its task is done. Beyond the queue limit it raises
+    Overloaded(429) straight away, and a task still queued after
+    `queue_timeout` seconds is withdrawn with Overloaded(503). With
+    `processes` the workers are forkserver processes, for work that holds
+    the GIL (matplotlib); `fn` and its arguments must then be picklable,
+    and the metrics a task records there are merged into this process's.
+    `niceness` lowers those processes' CPU priority, so background work
+    yields to the request threads when cores are scarce.
+    """
+
+    def __init__(self, name, workers, max_queue, queue_timeout=10.0, processes=False, niceness=0):
+        self.name = name
+        self.workers = workers
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.processes = processes
+        self.niceness = niceness
+        self._executor = None
+        self._pending = 0
+        self._lock = threading.Lock()
+
+    def _get_executor(self):
+        if self._executor is None:
+            if self.processes:
+                method = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+                self._executor = ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context(method),
+                                                     initializer=os.nice, initargs=(self.niceness,))
+            else:
+                self._executor = ThreadPoolExecutor(self.workers, thread_name_prefix=f"{self.name}-pool")
+        return self._executor
+
+    def run(self, fn, *args, admit=True):
+        """fn(*args) on a pool worker.
+
+        `admit=False` skips the queue limit and timeout, for the later
+        chunks of a response that has already started streaming.
+        """
+        with self._lock:
+            if admit and self._pending >= self.workers + self.max_queue:
+                metrics.inc("crop_pool_rejected_total", pool=self.name, status=429)
+                raise Overloaded(self.name, 429)
+            self._pending += 1
+            executor = self._get_executor()
+        try:
+            future = executor.submit(_run_task, fn, args, time.time(), self.processes)
+            try:
+                waited, result, recorded = future.result(timeout=self.queue_timeout if admit else None)
+            except TimeoutError:
+                if future.cancel():
+                    metrics.inc("crop_pool_rejected_total", pool=self.name, status=503)
+                    raise Overloaded(self.name, 503)
+                # Already running, so let it finish
+                waited, result, recorded = future.result()
+        finally:
+            with self._lock:
+                self._pending -= 1
+        if recorded is not None:
+            metrics.registry.merge(*recorded)
+        metrics.observe("crop_pool_wait_seconds", waited, pool=self.name)
+        return result
+
+    def stats(self):
+        return {"workers": self.workers, "max_queue": self.max_queue, "pending": self._pending}
+
+
+# =====================================================
+# MICRO-BATCHING
+# =====================================================
+class _Request:
+    __slots__ = ("key", "item", "enqueued_at", "done", "result", "error")
+
+    def __init__(self, key, item):
+        self.key = key
+        self.item = item
+        self.enqueued_at = time.monotonic()
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class MicroBatcher:
+    """Coalesces concurrent single-row requests into one scoring call.
+
+    submit() queues an item and blocks until a worker thread has scored it.
+    A worker takes the oldest item, waits up to `max_wait` seconds after it
+    arrived for up to `max_batch` items, then scores every queued item with
+    the same key (e.g. the model snapshot) in one `score(key, items)` call.
+    `score` returns one result per item; an Exception in that list fails
+    only its own request. Queue limits behave like WorkPool's.
+    """
+
+    def __init__(self, name, score, workers=2, max_batch=64, max_wait=0.002, max_queue=256,
+                 queue_timeout=10.0):
+        self.name = name
+        self.score = score
+        self.workers = workers
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self._queue = deque()
+        self._cond = threading.Condition()
+        self._threads = []
+
+    def submit(self, key, item):
+        request = _Request(key, item)
+        with self._cond:
+            if not self._threads:
+                for i in range(self.workers):
+                    thread = threading.Thread(target=self._work, name=f"{self.name}-batcher-{i}", daemon=True)
+                    thread.start()
+                    self._threads.append(thread)
+            if len(self._queue) >= self.max_queue:
+                metrics.inc("crop_pool_rejected_total", pool=self.name, status=429)
+                raise Overloaded(self.name, 429)
+            self._queue.append(request)
+            self._cond.notify()
+
+        if not request.done.wait(self.queue_timeout):
+            with self._cond:
+                try:
+                    self._queue.remove(request)
+                except ValueError:
+                    pass  # already being scored
+                else:
+                    metrics.inc("crop_pool_rejected_total", pool=self.name, status=503)
+                    raise Overloaded(self.name, 503)
+            request.done.wait()
+        if request.error is not None:
+            raise request.error
+        return request.result
+
+    def _take(self):
+        """Block until a batch is due and remove it from the queue"""
+        with self._cond:
+            while True:
+                while not self._queue:
+                    self._cond.wait()
+                deadline = self._queue[0].enqueued_at + self.max_wait
+                while self._queue and len(self._queue) < self.max_batch:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+                if not self._queue:
+                    continue  # another worker took them
+
+                key = self._queue[0].key
+                batch, rest = [], deque()
+                while self._queue and len(batch) < self.max_batch:
+                    request = self._queue.popleft()
+                    (batch if request.key is key else rest).append(request)
+                rest.extend(self._queue)
+                self._queue = rest
+                if rest:
+                    self._cond.notify()
+                return key, batch
+
+    def _work(self):
+        while True:
+            key, batch = self._take()
+            now = time.monotonic()
+            for request in batch:
+                metrics.observe("crop_pool_wait_seconds", now - request.enqueued_at, pool=self.name)
+            metrics.inc("crop_batches_total", batcher=self.name)
+            metrics.inc("crop_batched_items_total", len(batch), batcher=self.name)
+            try:
+                results = self.score(key, [request.item for request in batch])
+            except Exception as e:
+                results = [e] * len(batch)
+            for request, result in zip(batch, results):
+                if isinstance(result, Exception):
+                    request.error = result
+                else:
+                    request.result = result
+                request.done.set()
+
+    def stats(self):
+        return {"workers": self.workers, "max_batch": self.max_batch, "pending": len(self._queue)}
+
+
+def pool_collector(*pools):
+    """Collector reporting how much work each pool has queued or running"""
+    def collect():
+        return [("crop_pool_pending", "gauge", {"pool": pool.name}, pool.stats()["pending"]) for pool in pools]
+    return collect
@@ -1,5 +1,6 @@
 let modelsTrained = false;
 let currentPredictions = null;
+let currentPredictionToken = null;
 let modelResults = null;
 
 // Tab switching
@@ -46,32 +47,87 @@ document.addEventListener('DOMContentLoaded', () => {
 });
 
 // Train Models
-async function trainModels() {
+let trainingJobId = null;
+
+async function trainModels(incremental = false, tune = false) {
     const testSize = document.getElementById('test-size').value / 100;
     const statusBox = document.getElementById('training-status');
     
     statusBox.className = 'status-box loading';
-    statusBox.textContent = '⏳ Training models... This may take a moment.';
+    statusBox.textContent = tune
+        ? '⏳ Searching hyperparameters... This can take several minutes.'
+        : '⏳ Training models... This may take a moment.';
     
     try {
-        const response = await fetch('/train-models', {
+        const response = await fetch(tune ? '/tune-models' : '/train-models', {
             method: 'POST',
             headers: { 'Content-Type': 'application/json' },
-            body: JSON.stringify({ test_size: testSize })
+            body: JSON.stringify({ test_size: testSize, incremental: incremental })
         });
         
         const data = await response.json();
         
-        if (data.success) {
+        if (data.job_id) {
+            // A 409 still carries the id of the job already running, so follow that one
+            trainingJobId = data.job_id;
+            document.getElementById('cancel-training-btn').style.display = 'block';
+            pollTrainingStatus();
+        } else {
+            statusBox.className = 'status-box error';
+            statusBox.textContent = '❌ Training failed: ' + data.message;
+        }
+    } catch (error) {
+        statusBox.className = 'status-box error';
+        statusBox.textContent = '❌ Network error';
+    }
+}
+
+async function pollTrainingStatus() {
+    const statusBox = document.getElementById('training-status');
+    
+    try {
+        const response = await fetch(`/train-status/${trainingJobId}`);
+        const data = await response.json();
+        
+        if (!data.success) {
+            throw new Error(data.message);
+        }
+        
+        const job = data.status;
+        if (job.status === 'queued' || job.status === 'running') {
+            const tuned = Object.values(job.models).filter(m => m.status === 'tuned').length;
+            statusBox.textContent = job.kind === 'tune' && job.progress.done === 0
+                ? `⏳ Tuning models... ${tuned} searched (${job.elapsed_seconds.toFixed(1)}s)`
+                : `⏳ Training models... ${job.progress.done}/${job.progress.total} done (${job.elapsed_seconds.toFixed(1)}s)`;
+            setTimeout(pollTrainingStatus, 1000);
+            return;
+        }
+        
+        document.getElementById('cancel-training-btn').style.display = 'none';
+        trainingJobId = null;
+        
+        if (job.status === 'completed') {
             modelsTrained = true;
-            modelResults = data.results;
+            modelResults = job.result;
             statusBox.className = 'status-box success';
-            statusBox.textContent = '✅ Models trained successfully!';
+            const info = job.info || {};
+            if (info.mode === 'incremental') {
+                statusBox.textContent = `✅ Models updated with new rows in ${info.seconds.toFixed(1)}s (full refit took ${info.full_refit_seconds.toFixed(1)}s)`;
+            } else if (info.tuning) {
+                statusBox.textContent = `✅ Tuned ${Object.keys(info.tuning).length} models and retrained in ${job.elapsed_seconds.toFixed(1)}s`;
+            } else if (info.mode === 'unchanged') {
+                statusBox.textContent = '✅ No new rows since the last training run';
+            } else {
+                statusBox.textContent = `✅ Models trained successfully in ${job.elapsed_seconds.toFixed(1)}s!`;
+            }
             document.getElementById('predict-warning').style.display = 'none';
-            updateEvaluationTab(data.results);
+            updateEvaluationTab(job.result);
+        } else if (job.status === 'cancelled') {
+            statusBox.className = 'status-box error';
+            statusBox.textContent = '⚠️ Training cancelled';
         } else {
             statusBox.className = 'status-box error';
-            statusBox.textContent = '❌ Training failed: ' + data.message;
+            statusBox.textContent = '❌ Training failed: ' + job.error;
         }
     } catch (error) {
         statusBox.className = 'status-box error';
@@ -79,21 +135,54 @@ async function trainModels() {
     }
 }
 
+async function cancelTraining() {
+    if (!trainingJobId) return;
+    await fetch(`/train-cancel/${trainingJobId}`, { method: 'POST' });
+}
+
 // Load Dataset
-async function loadDataset() {
+let datasetRows = [];
+let datasetCursor = null;
+
+async function loadDataset(append = false) {
     try {
-        const response = await fetch('/get-dataset');
+        if (!append) {
+            datasetRows = [];
+            datasetCursor = null;
+        }
+        
+        const params = new URLSearchParams({ limit: 100 });
+        ['crop', 'soil', 'season', 'sort'].forEach(field => {
+            const value = document.getElementById(`dataset-${field}`).value;
+            if (value) params.set(field, value);
+        });
+        if (datasetCursor) params.set('cursor', datasetCursor);
+        
+        const response = await fetch(`/dataset/query?${params}`);
         const data = await response.json();
         
         if (data.success) {
-            const table = createTable(data.data);
-            document.getElementById('dataset-table').innerHTML = table;
+            // Columnar response -> rows for createTable
+            data.row_ids.forEach((_, i) => {
+                const row = {};
+                data.columns.forEach(col => { row[col] = data.data[col][i]; });
+                datasetRows.push(row);
+            });
+            datasetCursor = data.next_cursor;
+            document.getElementById('dataset-table').innerHTML = createTable(datasetRows);
+            document.getElementById('dataset-total').textContent =
+                `Showing ${datasetRows.length} of ${data.total} rows`;
         }
+        document.getElementById('dataset-more-btn').style.display = datasetCursor ? 'inline-block' : 'none';
     } catch (error) {
         console.error('Error loading dataset:', error);
     }
 }
 
+function loadMoreDataset() {
+    loadDataset(true);
+}
+
 // Create HTML table
 function createTable(data) {
     if (!data || data.length === 0) return '<p>No data available</p>';
@@ -156,6 +245,7 @@ document.getElementById('predict-form').addEventListener('submit', async (e) =>
         
         if (data.success) {
             currentPredictions = data.predictions;
+            currentPredictionToken = data.prediction_token;
             const avg = data.predictions.average;
             
             const resultBox = document.getElementById('prediction-result');
@@ -183,6 +273,8 @@ async function savePrediction() {
         irrigation: document.getElementById('irrigation').value,
         soil: document.getElementById('soil').value,
         season: document.getElementById('season').value,
+        // Lets the server commit its cached result instead of re-running the models
+        prediction_token: currentPredictionToken,
         save: true
     };
     
@@ -204,6 +296,68 @@ async function savePrediction() {
     }
 }
 
+// What-if Sweep
+const WHATIF_STEPS = 50;
+
+async function runWhatIf() {
+    if (!modelsTrained) {
+        alert('Please train models first!');
+        return;
+    }
+    
+    const base = {};
+    ['farm_area', 'fertilizer', 'pesticide', 'water', 'crop', 'irrigation', 'soil', 'season'].forEach(field => {
+        base[field] = document.getElementById(field.replace('_', '-')).value;
+    });
+    
+    // Sweep the slider's own range
+    const field = document.getElementById('whatif-field').value;
+    const slider = document.getElementById(field.replace('_', '-'));
+    const axis = { field, min: Number(slider.min), max: Number(slider.max), steps: WHATIF_STEPS };
+    
+    try {
+        const response = await fetch('/what-if', {
+            method: 'POST',
+            headers: { 'Content-Type': 'application/json' },
+            body: JSON.stringify({ base, axes: [axis] })
+        });
+        
+        const data = await response.json();
+        if (!data.success) {
+            alert('What-if sweep failed: ' + data.message);
+            return;
+        }
+        
+        const canvas = document.getElementById('whatif-chart');
+        if (window.whatifChart) {
+            window.whatifChart.destroy();
+        }
+        
+        const label = document.getElementById('whatif-field').selectedOptions[0].text;
+        window.whatifChart = new Chart(canvas, {
+            type: 'line',
+            data: {
+                labels: data.axes[0].values.map(v => Math.round(v)),
+                datasets: Object.entries(data.surface).map(([name, values]) => ({
+                    label: name,
+                    data: values,
+                    borderWidth: name === 'average' ? 3 : 1,
+                    pointRadius: 0
+                }))
+            },
+            options: {
+                responsive: true,
+                maintainAspectRatio: false,
+                plugins: {
+                    title: { display: true, text: `Predicted Yield vs ${label}` }
+                }
+            }
+        });
+    } catch (error) {
+        alert('What-if sweep failed: ' + error.message);
+    }
+}
+
 // Load EDA Charts
 async function loadEDACharts() {
     try {
@@ -343,21 +497,40 @@ function updateComparisonTab(predictions) {
 }
 
 // Load History
-async function loadHistory() {
+let historyRows = [];
+let historyCursor = null;
+
+async function loadHistory(append = false) {
     try {
-        const response = await fetch('/get-predictions');
+        if (!append) {
+            historyRows = [];
+            historyCursor = null;
+        }
+        
+        const query = historyCursor ? `?cursor=${encodeURIComponent(historyCursor)}` : '';
+        const response = await fetch(`/get-predictions${query}`);
         const data = await response.json();
         
-        if (data.success && data.predictions.length > 0) {
-            document.getElementById('history-table').innerHTML = createTable(data.predictions);
+        if (data.success) {
+            historyRows = historyRows.concat(data.predictions);
+            historyCursor = data.next_cursor;
+        }
+        
+        if (historyRows.length > 0) {
+            document.getElementById('history-table').innerHTML = createTable(historyRows);
         } else {
             document.getElementById('history-table').innerHTML = '<p class="info">No predictions yet</p>';
         }
+        document.getElementById('history-more-btn').style.display = historyCursor ? 'inline-block' : 'none';
     } catch (error) {
         console.error('Error loading history:', error);
     }
 }
 
+function loadMoreHistory() {
+    loadHistory(true);
+}
+
 // Download History
 function downloadHistory() {
     window.location.href = '/download-predictions';
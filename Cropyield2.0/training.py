@@ -0,0 +1,424 @@
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+import numpy as np
+import pandas as pd
+from sklearn.model_selection import train_test_split
+from sklearn.linear_model import LinearRegression
+from sklearn.ensemble import RandomForestRegressor, GradientBoostingRegressor
+from sklearn.metrics import r2_score, mean_absolute_error, mean_squared_error
+from xgboost import XGBRegressor
+from lightgbm import LGBMRegressor
+from catboost import CatBoostRegressor
+
+from schema import MODEL_NAMES
+
+# Relative share of the CPU budget. Linear Regression and sklearn's Gradient
+# Boosting are single-threaded, so they only ever get one core.
+CPU_WEIGHTS = {
+    "Linear Regression": 0,
+    "Random Forest": 3,
+    "Gradient Boosting": 0,
+    "XGBoost": 2,
+    "LightGBM": 2,
+    "CatBoost": 2
+}
+
+
+def build_model(name, n_threads=1, params=None):
+    """Create an unfitted model with its thread count pinned to `n_threads`.
+
+    `params` overrides the default settings, e.g. with the ones found by
+    tuning.tune.
+    """
+    if name == "Linear Regression":
+        model = LinearRegression()
+    elif name == "Random Forest":
+        model = RandomForestRegressor(n_estimators=100, random_state=42)
+    elif name == "Gradient Boosting":
+        model = GradientBoostingRegressor(random_state=42)
+    elif name == "XGBoost":
+        model = XGBRegressor(n_estimators=100, learning_rate=0.1, max_depth=5, random_state=42)
+    elif name == "LightGBM":
+        model = LGBMRegressor(n_estimators=100, learning_rate=0.1, random_state=42)
+    elif name == "CatBoost":
+        model = CatBoostRegressor(iterations=100, learning_rate=0.1, depth=5, verbose=False, random_state=42)
+    else:
+        raise ValueError(f"Unknown model: {name}")
+    if params:
+        model.set_params(**params)
+    if name == "CatBoost":
+        model.set_params(thread_count=n_threads)
+    elif name not in ("Linear Regression", "Gradient Boosting"):
+        model.set_params(n_jobs=n_threads)
+    return model
+
+
+def recorded_params(previous):
+    """Per-model settings the models in `previous` were trained with"""
+    training = getattr(previous, "training", None) or {}
+    return dict(training.get("params") or {})
+
+
+def available_cpus():
+    if hasattr(os, "sched_getaffinity"):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 1
+
+
+def allocate_cpus(names, total=None):
+    """Split `total` cores between the models so they don't oversubscribe.
+
+    Single-threaded models take one core each; the rest is shared among the
+    multi-threaded ones in proportion to CPU_WEIGHTS.
+    """
+    if total is None:
+        total = available_cpus()
+    budget = {name: 1 for name in names}
+    threaded = [name for name in names if CPU_WEIGHTS.get(name, 0) > 0]
+    spare = total - len(names)
+    if threaded and spare > 0:
+        weight_sum = sum(CPU_WEIGHTS[name] for name in threaded)
+        for name in threaded:
+            budget[name] += spare * CPU_WEIGHTS[name] // weight_sum
+    return budget
+
+
+def score_predictions(y_true, preds):
+    return {
+        "r2": float(r2_score(y_true, preds)),
+        "mae": float(mean_absolute_error(y_true, preds)),
+        "rmse": float(np.sqrt(mean_squared_error(y_true, preds)))
+    }
+
+
+def fit_and_score(name, n_threads, X_train, y_train, X_test, y_test, params=None):
+    """Fit one model and evaluate it on the test split"""
+    model = build_model(name, n_threads, params)
+
+    start = time.perf_counter()
+    model.fit(X_train, y_train)
+    fit_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    preds = model.predict(X_test)
+    score_seconds = time.perf_counter() - start
+
+    info = {"model": model}
+    info.update(score_predictions(y_test, preds))
+    info["fit_seconds"] = round(fit_seconds, 4)
+    info["score_seconds"] = round(score_seconds, 4)
+    info["threads"] = n_threads
+    return name, info
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool():
+    """Return the shared training process pool, starting it on first use.
+
+    Forking a threaded Flask worker that has already run OpenMP code can
+    deadlock, so children come from a clean forkserver with the model
+    libraries preloaded. The pool is kept alive so that start-up cost is
+    paid once per worker, not once per training run.
+    """
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            if "forkserver" in multiprocessing.get_all_start_methods():
+                ctx = multiprocessing.get_context("forkserver")
+                ctx.set_forkserver_preload([__name__])
+            else:
+                ctx = multiprocessing.get_context("spawn")
+            # Training runs one model per process; tuning one trial per core
+            _pool = ProcessPoolExecutor(max_workers=max(len(MODEL_NAMES), available_cpus()), mp_context=ctx)
+        return _pool
+
+
+def abandon(futures):
+    """Stop the pool work of a run that was cancelled or failed.
+
+    Queued work is cancelled. Work already running can't be interrupted
+    through the executor, so if there is any, the pool's processes are
+    terminated and a new pool starts on next use. Otherwise the training
+    lock would be released while abandoned fits still hold the CPUs.
+    """
+    global _pool
+    running = [future for future in list(futures) if not future.cancel() and not future.done()]
+    if not running:
+        return
+    with _pool_lock:
+        pool, _pool = _pool, None
+    if pool is not None:
+        # ProcessPoolExecutor has no public way to stop running tasks
+        for process in list(pool._processes.values()):
+            process.terminate()
+        pool.shutdown(wait=True, cancel_futures=True)
+
+
+def fit_models(X_train, y_train, X_test, y_test, names=None, parallel=True,
+               progress=None, should_stop=None, params=None):
+    """Fit every model, concurrently across processes unless `parallel` is False.
+
+    Returns the usual results dict (model, r2, mae, rmse) with per-model
+    fit/score timings added. `params` maps model names to settings passed
+    to build_model. `progress(name, status, info)` is called as
+    each model starts and finishes; `should_stop()` is polled while waiting
+    and may raise to abandon the run, which stops its fits (see abandon).
+    """
+    names = names or MODEL_NAMES
+    budget = allocate_cpus(names)
+    progress = progress or (lambda name, status, info=None: None)
+    should_stop = should_stop or (lambda: None)
+    params = params or {}
+
+    results = {}
+    if not parallel:
+        for name in names:
+            should_stop()
+            progress(name, "running")
+            name, info = fit_and_score(name, budget[name], X_train, y_train, X_test, y_test, params.get(name))
+            results[name] = info
+            progress(name, "done", info)
+        return results
+
+    pool = get_pool()
+    pending = {
+        pool.submit(fit_and_score, name, budget[name], X_train, y_train, X_test, y_test, params.get(name)): name
+        for name in names
+    }
+    started = set()
+    try:
+        while pending:
+            done, _ = wait(pending, timeout=0.5, return_when=FIRST_COMPLETED)
+            should_stop()
+            for future in done:
+                name, info = future.result()
+                del pending[future]
+                results[name] = info
+                progress(name, "done", info)
+            for future, name in pending.items():
+                if name not in started and future.running():
+                    started.add(name)
+                    progress(name, "running")
+    except BaseException:
+        abandon(pending)
+        raise
+
+    # Keep the dashboard's model order regardless of completion order
+    return {name: results[name] for name in names}
+
+
+# =====================================================
+# INCREMENTAL RETRAINING
+# =====================================================
+# Boosters continue from their current trees, fitting only the appended rows.
+# Linear Regression is re-solved from running sufficient statistics. Random
+# Forest and sklearn's Gradient Boosting can't be extended, so they keep
+# their last fit until the next full refit, which is forced after
+# FULL_REFIT_EVERY incremental updates or once the dataset has grown by
+# FULL_REFIT_GROWTH since the last full refit.
+BOOSTED_MODELS = ["XGBoost", "LightGBM", "CatBoost"]
+FULL_REFIT_EVERY = 5
+FULL_REFIT_GROWTH = 0.5
+
+
+def linear_statistics(X, y):
+    """Row count, means and centered cross-products for a least-squares fit"""
+    X = np.asarray(X, dtype=float)
+    y = np.asarray(y, dtype=float)
+    x_mean = X.mean(axis=0)
+    y_mean = y.mean()
+    Xc = X - x_mean
+    return {
+        "rows": len(X),
+        "x_mean": x_mean,
+        "y_mean": y_mean,
+        "xx": Xc.T @ Xc,
+        "xy": Xc.T @ (y - y_mean)
+    }
+
+
+def merge_linear_statistics(a, b):
+    """Combine the statistics of two row sets (Chan et al.'s pairwise update)"""
+    rows = a["rows"] + b["rows"]
+    dx = b["x_mean"] - a["x_mean"]
+    dy = b["y_mean"] - a["y_mean"]
+    weight = a["rows"] * b["rows"] / rows
+    return {
+        "rows": rows,
+        "x_mean": a["x_mean"] + dx * b["rows"] / rows,
+        "y_mean": a["y_mean"] + dy * b["rows"] / rows,
+        "xx": a["xx"] + b["xx"] + np.outer(dx, dx) * weight,
+        "xy": a["xy"] + b["xy"] + dx * dy * weight
+    }
+
+
+def linear_from_statistics(stats, columns):
+    """A fitted LinearRegression equal to refitting on every row seen so far"""
+    model = LinearRegression()
+    coef = np.linalg.lstsq(stats["xx"], stats["xy"], rcond=None)[0]
+    model.coef_ = coef
+    model.intercept_ = float(stats["y_mean"] - stats["x_mean"] @ coef)
+    model.n_features_in_ = len(coef)
+    model.feature_names_in_ = np.asarray(columns, dtype=object)
+    return model
+
+
+def boosting_rounds(name, new_rows, total_rows, params=None):
+    """Extra rounds for a booster, in proportion to the share of new rows"""
+    settings = build_model(name, params=params).get_params()
+    base = settings.get("n_estimators") or settings.get("iterations")
+    return int(min(base, max(1, np.ceil(base * new_rows / total_rows))))
+
+
+def continue_boosting(name, model, rounds, n_threads, X_new, y_new, params=None):
+    """Add `rounds` trees to a fitted booster, trained on the new rows only"""
+    if name == "CatBoost":
+        update = build_model(name, n_threads, params).set_params(iterations=rounds)
+        update.fit(X_new, y_new, init_model=model)
+    elif name == "XGBoost":
+        update = build_model(name, n_threads, params).set_params(n_estimators=rounds)
+        update.fit(X_new, y_new, xgb_model=model.get_booster())
+    elif name == "LightGBM":
+        update = build_model(name, n_threads, params).set_params(n_estimators=rounds)
+        update.fit(X_new, y_new, init_model=model.booster_)
+    else:
+        raise ValueError(f"{name} cannot be trained incrementally")
+    return update
+
+
+def refit_plan(previous, data):
+    """Return (new_row_positions, None) if `previous` can be updated with the
+    rows appended to `data`, or (None, reason) if a full refit is needed."""
+    state = getattr(previous, "training", None)
+    if not state:
+        return None, "no incremental state in the current models"
+    if any(list(data.encoders[col].classes_) != classes for col, classes in state["classes"].items()):
+        return None, "new category values"
+    # The column store keeps its epoch for as long as rows are only appended
+    if data.epoch != state.get("dataset_epoch") or data.rows < state["dataset_rows"]:
+        return None, "dataset was rewritten, not appended to"
+    if state["updates_since_full_refit"] >= FULL_REFIT_EVERY:
+        return None, "scheduled full refit (update count)"
+    if len(data.X) - state["rows_at_full_refit"] > FULL_REFIT_GROWTH * state["rows_at_full_refit"]:
+        return None, "scheduled full refit (dataset growth)"
+    return np.arange(state["dataset_rows"], len(data.X)), None
+
+
+def update_models(previous, X_new, y_new, X_test, y_test, linear_stats, progress=None, should_stop=None,
+                  params=None):
+    """Bring `previous.results` up to date with the appended training rows"""
+    progress = progress or (lambda name, status, info=None: None)
+    should_stop = should_stop or (lambda: None)
+    params = params or {}
+    total_rows = linear_stats["rows"]
+    budget = allocate_cpus(list(previous.results))
+
+    results = {}
+    for name, old in previous.results.items():
+        should_stop()
+        progress(name, "running")
+        start = time.perf_counter()
+        if name == "Linear Regression":
+            model, update = linear_from_statistics(linear_stats, X_new.columns), "incremental"
+        elif name in BOOSTED_MODELS:
+            rounds = boosting_rounds(name, len(X_new), total_rows, params.get(name))
+            model = continue_boosting(name, old["model"], rounds, budget[name], X_new, y_new, params.get(name))
+            update = "incremental"
+        else:
+            model, update = old["model"], "stale"
+        fit_seconds = time.perf_counter() - start
+
+        start = time.perf_counter()
+        preds = model.predict(X_test)
+        score_seconds = time.perf_counter() - start
+
+        info = {"model": model}
+        info.update(score_predictions(y_test, preds))
+        info["fit_seconds"] = round(fit_seconds, 4)
+        info["score_seconds"] = round(score_seconds, 4)
+        info["threads"] = budget[name]
+        info["update"] = update
+        results[name] = info
+        progress(name, "done", info)
+    return results
+
+
+def retrain(data, previous=None, test_size=0.2, incremental=False, parallel=True,
+            progress=None, should_stop=None, params=None):
+    """Train on `data` and return the artifact for ModelRegistry.publish.
+
+    With `incremental`, rows appended to the dataset since `previous` was
+    trained are folded into the existing models, and None is returned if
+    there are none. If an update isn't possible a full refit is done
+    instead and the reason recorded in artifact['training']['reason'].
+
+    `params` ({model: settings}) defaults to the settings `previous` was
+    trained with, so tuned models stay tuned across refits.
+    """
+    start = time.perf_counter()
+    if params is None:
+        params = recorded_params(previous)
+    positions, reason = None, "full refit requested"
+    if incremental and previous is None:
+        reason = "no trained models yet"
+    elif incremental:
+        positions, reason = refit_plan(previous, data)
+    state = previous.training if positions is not None else None
+
+    if positions is None:
+        X_train, X_test, y_train, y_test = train_test_split(data.X, data.y, test_size=test_size, random_state=42)
+        # Each model is fitted in its own process with a share of the CPU cores
+        results = fit_models(X_train, y_train, X_test, y_test, parallel=parallel,
+                             progress=progress, should_stop=should_stop, params=params)
+        for info in results.values():
+            info["update"] = "refit"
+        linear_stats = linear_statistics(X_train, y_train)
+        mode = "full"
+    elif len(positions) == 0:
+        return None
+    else:
+        X_new, y_new = data.X.iloc[positions], data.y.iloc[positions]
+        test_size = state["test_size"]
+        # New rows are split the same way, so the held-out set keeps growing too
+        if len(positions) * test_size >= 1 and len(positions) * (1 - test_size) >= 1:
+            X_new, X_new_test, y_new, y_new_test = train_test_split(
+                X_new, y_new, test_size=test_size, random_state=42)
+            X_test = pd.concat([previous.X_test, X_new_test])
+            y_test = pd.concat([previous.y_test, y_new_test])
+        else:
+            X_test, y_test = previous.X_test, previous.y_test
+        linear_stats = merge_linear_statistics(state["linear_stats"], linear_statistics(X_new, y_new))
+        results = update_models(previous, X_new, y_new, X_test, y_test, linear_stats,
+                                progress=progress, should_stop=should_stop, params=params)
+        mode = "incremental"
+    if should_stop:
+        should_stop()
+
+    seconds = time.perf_counter() - start
+    training = {
+        "mode": mode,
+        "reason": reason,
+        "seconds": round(seconds, 4),
+        "test_size": test_size,
+        "dataset_rows": len(data.X),
+        "dataset_epoch": data.epoch,
+        "dataset_version": data.version,
+        "classes": {col: list(enc.classes_) for col, enc in data.encoders.items()},
+        "linear_stats": linear_stats,
+        "params": params
+    }
+    if mode == "full":
+        training.update(rows_at_full_refit=len(data.X), updates_since_full_refit=0,
+                        full_refit_seconds=round(seconds, 4))
+    else:
+        training.update(rows_at_full_refit=state["rows_at_full_refit"],
+                        updates_since_full_refit=state["updates_since_full_refit"] + 1,
+                        full_refit_seconds=state["full_refit_seconds"])
+    return {"results": results, "X_test": X_test, "y_test": y_test, "training": training}
@@ -0,0 +1,331 @@
+import math
+import os
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, wait
+from itertools import zip_longest
+
+import numpy as np
+from sklearn.metrics import r2_score
+from sklearn.model_selection import ParameterGrid, ParameterSampler, train_test_split
+
+from training import BOOSTED_MODELS, abandon, available_cpus, build_model, get_pool
+
+# =====================================================
+# SEARCH SPACES
+# =====================================================
+# Values sampled for each model's settings. The boosters' round counts are
+# not searched: trials run up to MAX_ROUNDS and stop early, and the number
+# of rounds they settled on becomes the tuned setting. Linear Regression has
+# nothing worth searching.
+SEARCH_SPACES = {
+    "Random Forest": {
+        "n_estimators": [100, 200],
+        "max_depth": [None, 10, 20],
+        "min_samples_leaf": [1, 2, 5, 10],
+        "max_features": [1.0, 0.5, "sqrt"]
+    },
+    "Gradient Boosting": {
+        "learning_rate": [0.05, 0.1, 0.2],
+        "max_depth": [2, 3, 4, 5],
+        "subsample": [0.8, 1.0],
+        "min_samples_leaf": [1, 5, 20]
+    },
+    "XGBoost": {
+        "learning_rate": [0.03, 0.1, 0.3],
+        "max_depth": [3, 4, 5, 6, 8],
+        "subsample": [0.7, 0.85, 1.0],
+        "colsample_bytree": [0.7, 1.0],
+        "min_child_weight": [1, 5, 10],
+        "reg_lambda": [0.1, 1.0, 10.0]
+    },
+    "LightGBM": {
+        "learning_rate": [0.03, 0.1, 0.3],
+        "num_leaves": [15, 31, 63],
+        "min_child_samples": [5, 20, 50],
+        "subsample": [0.7, 1.0],
+        "subsample_freq": [1],
+        "colsample_bytree": [0.7, 1.0],
+        "reg_lambda": [0.0, 1.0, 10.0]
+    },
+    "CatBoost": {
+        "learning_rate": [0.03, 0.1, 0.3],
+        "depth": [4, 5, 6, 8],
+        "l2_leaf_reg": [1, 3, 10]
+    }
+}
+TUNABLE_MODELS = list(SEARCH_SPACES)
+ROUNDS_SETTING = {
+    "Gradient Boosting": "n_estimators",
+    "XGBoost": "n_estimators",
+    "LightGBM": "n_estimators",
+    "CatBoost": "iterations"
+}
+MAX_ROUNDS = 1000
+EARLY_STOPPING_ROUNDS = 20
+# Share of each training fold held back to decide when to stop boosting, so
+# the validation fold only ever scores
+STOPPING_FRACTION = 0.1
+# Successive halving starts from no fewer rows than this per fold
+MIN_ROWS_PER_FOLD = 50
+
+
+def sample_candidates(name, n, seed):
+    """Up to `n` distinct settings drawn from the model's search space"""
+    space = SEARCH_SPACES[name]
+    n = min(n, len(ParameterGrid(space)))
+    return list(ParameterSampler(space, n, random_state=seed))
+
+
+def halving_schedule(n_candidates, rows, folds, eta):
+    """Training rows per successive-halving rung, smallest first.
+
+    Each rung keeps the best 1/`eta` of the candidates and gives them
+    `eta` times the rows; the last rung uses every training row.
+    """
+    rungs = 1
+    while eta ** rungs <= n_candidates and rows / eta ** rungs >= folds * MIN_ROWS_PER_FOLD:
+        rungs += 1
+    return [int(rows / eta ** (rungs - 1 - i)) for i in range(rungs)]
+
+
+# =====================================================
+# TRIALS
+# =====================================================
+# Runs in the training pool's processes
+_trial_data = {}
+
+
+def trial_data(source):
+    """(X, y, shuffled training positions) for a search, cached per process.
+
+    `source` is (dataset path, epoch, rows, test_size, seed). Workers open
+    the column store themselves, zero-copy, instead of being sent the rows;
+    rows appended after the search started are ignored. The training rows
+    are the ones retrain's split leaves out of the held-out set.
+    """
+    data = _trial_data.get(source)
+    if data is None:
+        from dataset import Dataset
+
+        path, epoch, rows, test_size, seed = source
+        dataset = Dataset(path)
+        if dataset.epoch != epoch or dataset.rows < rows:
+            raise RuntimeError("Dataset was rewritten during the search")
+        train, _ = train_test_split(np.arange(rows), test_size=test_size, random_state=42)
+        order = np.random.default_rng(seed).permutation(train)
+        data = (dataset.X.iloc[:rows], dataset.y.iloc[:rows], order)
+        _trial_data.clear()
+        _trial_data[source] = data
+    return data
+
+
+def search_estimator(name, params):
+    """The model for one trial: boosters get MAX_ROUNDS and early stopping"""
+    model = build_model(name, 1, params)
+    if name == "Gradient Boosting":
+        model.set_params(n_estimators=MAX_ROUNDS, n_iter_no_change=EARLY_STOPPING_ROUNDS,
+                         validation_fraction=STOPPING_FRACTION)
+    elif name == "XGBoost":
+        model.set_params(n_estimators=MAX_ROUNDS, early_stopping_rounds=EARLY_STOPPING_ROUNDS)
+    elif name in ROUNDS_SETTING:
+        model.set_params(**{ROUNDS_SETTING[name]: MAX_ROUNDS})
+    return model
+
+
+def fit_trial(name, model, X, y):
+    """Fit one trial, stopping boosters on the last rows of X; returns the
+    number of rounds kept (None for models without rounds)"""
+    if name not in BOOSTED_MODELS:
+        model.fit(X, y)
+        # Gradient Boosting stops on its own validation_fraction
+        return getattr(model, "n_estimators_", None)
+
+    cut = len(X) - max(1, int(len(X) * STOPPING_FRACTION))
+    X_fit, y_fit, X_stop, y_stop = X.iloc[:cut], y.iloc[:cut], X.iloc[cut:], y.iloc[cut:]
+    if name == "XGBoost":
+        model.fit(X_fit, y_fit, eval_set=[(X_stop, y_stop)], verbose=False)
+        return model.best_iteration + 1
+    if name == "LightGBM":
+        import lightgbm
+        model.fit(X_fit, y_fit, eval_set=[(X_stop, y_stop)],
+                  callbacks=[lightgbm.early_stopping(EARLY_STOPPING_ROUNDS, verbose=False)])
+        return model.best_iteration_
+    model.fit(X_fit, y_fit, eval_set=(X_stop, y_stop), early_stopping_rounds=EARLY_STOPPING_ROUNDS,
+              use_best_model=True)
+    return model.get_best_iteration() + 1
+
+
+def run_trial(name, params, source, rows, folds, fold):
+    """Cross-validate `params` on fold `fold` of the first `rows` shuffled
+    training rows; returns (r2 on the fold, rounds kept, CPU seconds)"""
+    X, y, order = trial_data(source)
+    start = time.process_time()
+    positions = order[:rows]
+    bounds = np.linspace(0, rows, folds + 1).astype(int)
+    valid = positions[bounds[fold]:bounds[fold + 1]]
+    train = np.concatenate([positions[:bounds[fold]], positions[bounds[fold + 1]:]])
+
+    model = search_estimator(name, params)
+    rounds = fit_trial(name, model, X.iloc[train], y.iloc[train])
+    score = r2_score(y.iloc[valid], model.predict(X.iloc[valid]))
+    return float(score), rounds, time.process_time() - start
+
+
+# =====================================================
+# SUCCESSIVE HALVING
+# =====================================================
+class ModelSearch:
+    """Successive-halving state for one model"""
+
+    def __init__(self, name, candidates, schedule, folds, eta):
+        self.name = name
+        self.candidates = candidates
+        self.schedule = schedule
+        self.folds = folds
+        self.eta = eta
+        self.rung = 0
+        self.alive = list(range(len(candidates)))
+        self.trials = {}
+        self.rungs = []
+        self.fits = 0
+        self.cpu_seconds = 0.0
+        self.started_at = time.perf_counter()
+        self.finished_at = None
+        self.best = None
+
+    @property
+    def done(self):
+        return self.best is not None
+
+    def tasks(self):
+        """(candidate, rows, fold) for every trial of the current rung"""
+        rows = self.schedule[self.rung]
+        return [(i, rows, fold) for i in self.alive for fold in range(self.folds)]
+
+    def record(self, candidate, score, rounds, cpu_seconds):
+        """Store one trial; returns True once the current rung is complete"""
+        self.trials.setdefault(candidate, []).append((score, rounds))
+        self.fits += 1
+        self.cpu_seconds += cpu_seconds
+        return sum(len(self.trials.get(i, ())) for i in self.alive) == len(self.alive) * self.folds
+
+    def advance(self):
+        """Rank the finished rung and move the best candidates on to the next"""
+        ranked = sorted(self.alive, key=lambda i: -np.mean([s for s, _ in self.trials[i]]))
+        best_score = float(np.mean([s for s, _ in self.trials[ranked[0]]]))
+        self.rungs.append({
+            "rows": self.schedule[self.rung],
+            "candidates": len(ranked),
+            "best_r2": round(best_score, 4)
+        })
+        if self.rung == len(self.schedule) - 1:
+            self.best = (ranked[0], best_score)
+            self.finished_at = time.perf_counter()
+        else:
+            self.alive = ranked[:math.ceil(len(ranked) / self.eta)]
+            self.rung += 1
+            self.trials = {}
+
+    def best_params(self):
+        """The winning settings, with the rounds early stopping settled on"""
+        index, _ = self.best
+        params = dict(self.candidates[index])
+        rounds = [r for _, r in self.trials[index] if r is not None]
+        if self.name in ROUNDS_SETTING and rounds:
+            params[ROUNDS_SETTING[self.name]] = max(1, int(round(np.mean(rounds))))
+        return params
+
+    def summary(self):
+        summary = {
+            "candidates": len(self.candidates),
+            "fits": self.fits,
+            "rungs": self.rungs,
+            "compute_seconds": round(self.cpu_seconds, 3),
+            "wall_seconds": round((self.finished_at or time.perf_counter()) - self.started_at, 3)
+        }
+        if self.done:
+            summary.update(params=self.best_params(), cv_r2=round(self.best[1], 4))
+        return summary
+
+
+def tune(data, names=None, candidates=8, folds=3, eta=3, test_size=0.2, seed=42,
+         parallel=True, progress=None, should_stop=None):
+    """Search each model's settings with k-fold CV and successive halving.
+
+    `candidates` settings are sampled per model and cross-validated on a
+    fraction of the training rows; the best 1/`eta` go on to `eta` times as
+    many rows, until the survivors are scored on all of them. Every
+    (candidate, fold) trial is a separate single-threaded task in the
+    training pool, at most one per core, and a model moves to its next rung
+    as soon as its own trials finish. The held-out split retrain will use
+    is never seen.
+
+    Returns {name: summary} with the winning `params`, their CV r2 and the
+    CPU time spent on the model's trials. `progress` and `should_stop`
+    work as in training.fit_models.
+    """
+    names = names or TUNABLE_MODELS
+    progress = progress or (lambda name, status, info=None: None)
+    should_stop = should_stop or (lambda: None)
+
+    train_rows = len(data.X) - math.ceil(len(data.X) * test_size)
+    if train_rows < folds * MIN_ROWS_PER_FOLD:
+        raise ValueError(f"Need at least {folds * MIN_ROWS_PER_FOLD} training rows for {folds}-fold search")
+    source = (os.path.abspath(data.path), data.epoch, len(data.X), test_size, seed)
+    searches = {}
+    queue = deque()
+    for offset, name in enumerate(names):
+        if name not in SEARCH_SPACES:
+            raise ValueError(f"No search space for {name}")
+        sampled = sample_candidates(name, candidates, seed + offset)
+        searches[name] = ModelSearch(name, sampled, halving_schedule(len(sampled), train_rows, folds, eta),
+                                     folds, eta)
+
+    def rung_tasks(search):
+        progress(search.name, "tuning", {"rung": search.rung + 1, "rungs": len(search.schedule),
+                                         "rows": search.schedule[search.rung],
+                                         "candidates": len(search.alive)})
+        return [(search.name, candidate, rows, fold) for candidate, rows, fold in search.tasks()]
+
+    def finish(task, result):
+        name, candidate = task[0], task[1]
+        search = searches[name]
+        if search.record(candidate, *result):
+            search.advance()
+            if search.done:
+                progress(name, "tuned", search.summary())
+            else:
+                queue.extend(rung_tasks(search))
+
+    # Interleave the models' first rungs so they all make progress together
+    first_rungs = [rung_tasks(search) for search in searches.values()]
+    queue.extend(task for tasks in zip_longest(*first_rungs) for task in tasks if task)
+
+    if not parallel:
+        while queue:
+            should_stop()
+            task = queue.popleft()
+            name, candidate, rows, fold = task
+            finish(task, run_trial(name, searches[name].candidates[candidate], source, rows, folds, fold))
+        return {name: search.summary() for name, search in searches.items()}
+
+    pool = get_pool()
+    slots = available_cpus()
+    pending = {}
+    try:
+        while queue or pending:
+            while queue and len(pending) < slots:
+                task = queue.popleft()
+                name, candidate, rows, fold = task
+                future = pool.submit(run_trial, name, searches[name].candidates[candidate],
+                                     source, rows, folds, fold)
+                pending[future] = task
+            done, _ = wait(pending, timeout=0.5, return_when=FIRST_COMPLETED)
+            should_stop()
+            for future in done:
+                finish(pending.pop(future), future.result())
+    except BaseException:
+        abandon(pending)
+        raise
+    return {name: search.summary() for name, search in searches.items()}
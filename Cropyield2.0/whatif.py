@@ -0,0 +1,185 @@
+import itertools
+import threading
+
+import numpy as np
+import pandas as pd
+
+from cache import LRUCache
+from dataset import NUMERIC_RANGES
+from inference import encode_features, predict_frame
+from schema import CATEGORICAL_COLUMNS, FORM_FIELDS, NUMERIC_COLUMNS
+
+# Request fields of the numeric inputs, in NUMERIC_COLUMNS order
+COLUMN_FIELDS = {column: field for field, column in FORM_FIELDS.items()}
+NUMERIC_FIELDS = [COLUMN_FIELDS[col] for col in NUMERIC_COLUMNS]
+CATEGORICAL_FIELDS = [COLUMN_FIELDS[col] for col in CATEGORICAL_COLUMNS]
+MAX_AXES = 2
+MAX_STEPS = 200
+# Points per numeric input in a category's prediction grid: 12^4 = 20,736
+# rows, scored in one batch the first time a crop/irrigation/soil/season
+# combination is swept
+GRID_POINTS = 12
+GRID_CACHE_SIZE = 32
+
+
+def parse_axes(axes):
+    """[(field, values)] from the request's axes, e.g.
+    [{"field": "fertilizer", "min": 50, "max": 500, "steps": 100}] or
+    [{"field": "water", "values": [1000, 2000, 4000]}]"""
+    if not isinstance(axes, list) or not 1 <= len(axes) <= MAX_AXES:
+        raise ValueError(f"axes must be a list of 1 to {MAX_AXES} axes")
+    parsed = []
+    for axis in axes:
+        if not isinstance(axis, dict):
+            raise ValueError("Each axis must be an object with a field")
+        field = axis.get("field")
+        if field not in NUMERIC_FIELDS:
+            raise ValueError(f"Axis field must be one of: {', '.join(NUMERIC_FIELDS)}")
+        if field in (f for f, _ in parsed):
+            raise ValueError(f"Duplicate axis: {field}")
+        try:
+            if "values" in axis:
+                values = np.asarray(axis["values"], dtype=float).ravel()
+            else:
+                steps = int(axis.get("steps", 50))
+                if not 2 <= steps <= MAX_STEPS:
+                    raise ValueError(f"steps must be between 2 and {MAX_STEPS}")
+                values = np.linspace(float(axis["min"]), float(axis["max"]), steps)
+        except (KeyError, TypeError):
+            raise ValueError(f"Axis {field} needs min, max and steps, or values")
+        if not 1 <= values.size <= MAX_STEPS or not np.isfinite(values).all():
+            raise ValueError(f"An axis needs 1 to {MAX_STEPS} finite values")
+        parsed.append((field, values))
+    return parsed
+
+
+def sweep_points(base, axes):
+    """Every combination of the axes' values with the other numeric inputs
+    fixed at `base`, as an (n, 4) array in NUMERIC_COLUMNS order"""
+    mesh = np.meshgrid(*[values for _, values in axes], indexing="ij")
+    points = np.tile([float(base[field]) for field in NUMERIC_FIELDS], (mesh[0].size, 1))
+    for (field, _), grid in zip(axes, mesh):
+        points[:, NUMERIC_FIELDS.index(field)] = grid.ravel()
+    return points
+
+
+def score_points(results, data, categories, points, engine=None, classes=None):
+    """One batched predict per model over `points` for one category combination"""
+    frame = pd.DataFrame(points, columns=NUMERIC_COLUMNS)
+    for col, value in zip(CATEGORICAL_COLUMNS, categories):
+        frame[col] = value
+    return predict_frame(results, encode_features(frame, data, classes), engine)
+
+
+# =====================================================
+# PREDICTION GRID
+# =====================================================
+def grid_axes(data, points=GRID_POINTS):
+    """Grid coordinates per numeric input, spanning its input range
+    (NUMERIC_RANGES, which the dashboard sliders use) widened to the data's
+    own range where that is larger"""
+    axes = []
+    for col in NUMERIC_COLUMNS:
+        low, high = NUMERIC_RANGES[col]
+        axes.append(np.unique(np.linspace(min(low, data.X[col].min()), max(high, data.X[col].max()), points)))
+    return axes
+
+
+def grid_covers(axes, points):
+    return all(
+        axis[0] <= points[:, d].min() and points[:, d].max() <= axis[-1]
+        for d, axis in enumerate(axes)
+    )
+
+
+class PredictionGrid:
+    """Predictions for one category combination on a regular grid over
+    `axes` (see grid_axes).
+
+    Sweeps inside the grid are answered by multilinear interpolation
+    between the 16 surrounding grid points, so after the one-off build a
+    100x100 surface costs a few array gathers instead of 10,000 rows
+    through six models.
+    """
+
+    def __init__(self, axes, values):
+        self.axes = axes
+        self.shape = tuple(len(axis) for axis in axes)
+        self.names = list(values)
+        # Grid point -> one column per output, for one gather per corner
+        self.table = np.column_stack([values[name] for name in self.names])
+
+    @classmethod
+    def build(cls, results, data, categories, axes, classes=None):
+        mesh = np.meshgrid(*axes, indexing="ij")
+        grid_points = np.column_stack([m.ravel() for m in mesh])
+        return cls(axes, score_points(results, data, categories, grid_points, classes=classes))
+
+    def interpolate(self, points):
+        lower, weight = [], []
+        for d, axis in enumerate(self.axes):
+            if len(axis) == 1:
+                lower.append(np.zeros(len(points), dtype=int))
+                weight.append(np.zeros(len(points)))
+                continue
+            i = np.clip(np.searchsorted(axis, points[:, d], side="right") - 1, 0, len(axis) - 2)
+            lower.append(i)
+            weight.append((points[:, d] - axis[i]) / (axis[i + 1] - axis[i]))
+
+        out = np.zeros((len(points), self.table.shape[1]))
+        for corner in itertools.product((0, 1), repeat=len(self.axes)):
+            if any(bit and len(axis) == 1 for bit, axis in zip(corner, self.axes)):
+                continue
+            w = np.ones(len(points))
+            for d, bit in enumerate(corner):
+                w *= weight[d] if bit else 1 - weight[d]
+            index = np.ravel_multi_index([lower[d] + bit for d, bit in enumerate(corner)], self.shape)
+            out += w[:, None] * self.table[index]
+        return {name: out[:, k] for k, name in enumerate(self.names)}
+
+
+grid_cache = LRUCache(maxsize=GRID_CACHE_SIZE)
+_build_lock = threading.Lock()
+
+def prediction_grid(snapshot, results, data, categories, axes):
+    """The cached grid for these models and categories, built on first use"""
+    # The data's range only widens the grid when rows fall outside NUMERIC_RANGES
+    bounds = tuple((axis[0], axis[-1]) for axis in axes)
+    key = (snapshot.tag, tuple(results), tuple(categories), bounds)
+    grid = grid_cache.get(key)
+    if grid is None:
+        # One build per key, however many sweeps arrive at once
+        with _build_lock:
+            grid = grid_cache.get(key)
+            if grid is None:
+                grid = PredictionGrid.build(results, data, categories, axes, snapshot.classes)
+                grid_cache.put(key, grid)
+    return grid
+
+
+# =====================================================
+# WHAT-IF SURFACES
+# =====================================================
+def what_if(snapshot, results, data, base, axes, mode="grid", engine=None):
+    """Predictions over every combination of the axes' values, the other
+    inputs fixed at `base`.
+
+    Returns (source, {output: array shaped like the axes}). With mode
+    "grid" the surface is interpolated from the category's cached grid
+    (source "grid"), unless it reaches outside the grid; then, or with
+    mode "exact", all its points are scored in one batch. Coverage is
+    checked first, so such a sweep never pays for building a grid.
+    """
+    points = sweep_points(base, axes)
+    categories = [base[field] for field in CATEGORICAL_FIELDS]
+    shape = tuple(len(values) for _, values in axes)
+
+    source, surface = "exact", None
+    if mode == "grid":
+        coords = grid_axes(data)
+        if grid_covers(coords, points):
+            grid = prediction_grid(snapshot, results, data, categories, coords)
+            source, surface = "grid", grid.interpolate(points)
+    if surface is None:
+        surface = score_points(results, data, categories, points, engine, snapshot.classes)
+    return source, {name: values.reshape(shape) for name, values in surface.items()}